@@ -708,10 +708,23 @@ class Command(BaseCommand):
             assoc_pk = self._cad_map.get(_int(r.get("agente_cadastro_id")))
             manual_by_pk = self._user_map.get(_int(r.get("manual_by_user_id")))
             manual_status = _str(r.get("manual_status"))
+            referencia_month = _date(r.get("referencia_month")) or date.today()
+            existing_pk = (
+                PagamentoMensalidade.all_objects.filter(
+                    cpf_cnpj=_str(r.get("cpf_cnpj")),
+                    referencia_month=referencia_month,
+                )
+                .values_list("pk", flat=True)
+                .first()
+            )
+            if existing_pk:
+                # (cpf_cnpj, referencia_month) é único: reaproveita o registro.
+                self._pag_map[int(r["id"])] = existing_pk
+                continue
             obj = PagamentoMensalidade.objects.create(
                 created_by_id=created_by_pk,
                 import_uuid=_str(r.get("import_uuid")),
-                referencia_month=_date(r.get("referencia_month")) or date.today(),
+                referencia_month=referencia_month,
                 status_code=_str(r.get("status_code")),
                 matricula=_str(r.get("matricula")),
                 orgao_pagto=_str(r.get("orgao_pagto")),
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+
+from apps.accounts.management.commands.import_legacy_data import Command
+from apps.importacao.models import PagamentoMensalidade
+from apps.importacao.tests.base import ImportacaoBaseTestCase
+from apps.refinanciamento.models import Refinanciamento
+
+
+class ImportLegacyPagamentosRefinanciamentoTestCase(ImportacaoBaseTestCase):
+    def _command(self) -> Command:
+        command = Command()
+        command.stdout.write = lambda *_args, **_kwargs: None
+        command._user_map = {}
+        command._cad_map = {}
+        command._pag_map = {}
+        command._tes_pag_map = {}
+        command._refi_map = {}
+        return command
+
+    def test_importa_itens_de_refinanciamento_com_pagamento_reaproveitado(self):
+        associado, contrato, _ = self.create_associado_com_contrato(
+            cpf="23993596315", nome="Maria de Jesus Santana Costa"
+        )
+        refinanciamento = Refinanciamento.objects.create(
+            associado=associado,
+            contrato_origem=contrato,
+            solicitado_por=self.tesoureiro,
+            competencia_solicitada=date(2025, 5, 1),
+            status=Refinanciamento.Status.PENDENTE_APTO,
+            valor_refinanciamento=Decimal("1500.00"),
+            repasse_agente=Decimal("120.00"),
+        )
+        command = self._command()
+        command._refi_map = {7: refinanciamento.pk}
+        pagamento = {
+            "cpf_cnpj": "'23993596315'",
+            "referencia_month": "'2025-04-01'",
+            "import_uuid": "'uuid-legado'",
+            "status_code": "'1'",
+            "valor": "'30.00'",
+        }
+
+        # O segundo registro legado do mesmo (cpf, mês) reaproveita o primeiro.
+        command._import_pagamentos_mensalidades(
+            [{"id": "1", **pagamento}, {"id": "2", **pagamento}]
+        )
+        command._import_refi_itens(
+            [
+                {
+                    "refinanciamento_id": "7",
+                    "pagamento_mensalidade_id": "2",
+                    "referencia_month": "'2025-04-01'",
+                    "status_code": "'1'",
+                    "valor": "'30.00'",
+                },
+                {"refinanciamento_id": "7", "referencia_month": "NULL"},
+            ]
+        )
+
+        pagamento_importado = PagamentoMensalidade.objects.get()
+        self.assertEqual(command._pag_map, {1: pagamento_importado.pk, 2: pagamento_importado.pk})
+        itens = list(refinanciamento.itens.order_by("pk"))
+        self.assertEqual(
+            [(item.referencia_month, item.pagamento_mensalidade_id) for item in itens],
+            [(date(2025, 4, 1), pagamento_importado.pk), (date.today(), None)],
+        )
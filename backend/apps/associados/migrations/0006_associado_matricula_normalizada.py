@@ -0,0 +1,65 @@
+import re
+
+from django.db import migrations, models
+
+
+def _normalize(value):
+    return re.sub(r"[^0-9A-Za-z]", "", value or "").upper()
+
+
+def _digits(value):
+    return re.sub(r"\D", "", value or "")
+
+
+def preencher_matriculas_normalizadas(apps, schema_editor):
+    Associado = apps.get_model("associados", "Associado")
+    fields = [
+        "matricula_norm",
+        "matricula_digitos",
+        "matricula_orgao_norm",
+        "matricula_orgao_digitos",
+    ]
+    batch = []
+    for associado in Associado.objects.only("id", "matricula", "matricula_orgao").iterator(
+        chunk_size=2000
+    ):
+        associado.matricula_norm = _normalize(associado.matricula)
+        associado.matricula_digitos = _digits(associado.matricula)
+        associado.matricula_orgao_norm = _normalize(associado.matricula_orgao)
+        associado.matricula_orgao_digitos = _digits(associado.matricula_orgao)
+        batch.append(associado)
+        if len(batch) >= 2000:
+            Associado.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        Associado.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("associados", "0005_alter_endereco_numero_blank"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="associado",
+            name="matricula_norm",
+            field=models.CharField(blank=True, db_index=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name="associado",
+            name="matricula_digitos",
+            field=models.CharField(blank=True, db_index=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name="associado",
+            name="matricula_orgao_norm",
+            field=models.CharField(blank=True, db_index=True, max_length=60),
+        ),
+        migrations.AddField(
+            model_name="associado",
+            name="matricula_orgao_digitos",
+            field=models.CharField(blank=True, db_index=True, max_length=60),
+        ),
+        migrations.RunPython(preencher_matriculas_normalizadas, migrations.RunPython.noop),
+    ]
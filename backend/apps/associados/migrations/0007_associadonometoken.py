@@ -0,0 +1,70 @@
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _tokens(nome):
+    normalized = unicodedata.normalize("NFKD", nome or "")
+    folded = "".join(char for char in normalized if not unicodedata.combining(char)).lower()
+    return {token[:60] for token in re.findall(r"[0-9a-z]+", folded)}
+
+
+def preencher_tokens_nome(apps, schema_editor):
+    Associado = apps.get_model("associados", "Associado")
+    AssociadoNomeToken = apps.get_model("associados", "AssociadoNomeToken")
+    batch = []
+    for associado_id, nome in Associado.objects.values_list("id", "nome_completo").iterator(
+        chunk_size=2000
+    ):
+        batch.extend(
+            AssociadoNomeToken(associado_id=associado_id, token=token)
+            for token in sorted(_tokens(nome))
+        )
+        if len(batch) >= 5000:
+            AssociadoNomeToken.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        AssociadoNomeToken.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("associados", "0006_associado_matricula_normalizada"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AssociadoNomeToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(max_length=60)),
+                (
+                    "associado",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="nome_tokens",
+                        to="associados.associado",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("token", "associado"),
+                        name="associado_nome_token_unico",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(preencher_tokens_nome, migrations.RunPython.noop),
+    ]
@@ -5,13 +5,113 @@ import re
 from django.conf import settings
 from django.db import models
 
-from core.models import BaseModel
+from core.models import BaseModel, SoftDeleteManager
+from core.text import fold_text, fold_tokens, fold_words
 
 
 def only_digits(value: str) -> str:
     return re.sub(r"\D", "", value or "")
 
 
+def normalize_matricula(value: str) -> str:
+    return re.sub(r"[^0-9A-Za-z]", "", value or "").upper()
+
+
+MATRICULA_NORMALIZADA_FIELDS = {
+    "matricula": ("matricula_norm", "matricula_digitos"),
+    "matricula_orgao": ("matricula_orgao_norm", "matricula_orgao_digitos"),
+}
+
+
+class AssociadoManager(SoftDeleteManager):
+    """Mantém as colunas derivadas (matrículas e tokens do nome) nos caminhos em lote."""
+
+    PAGINA_BUSCA_NOME = 100
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.normalizar_matriculas()
+        created = super().bulk_create(objs, *args, **kwargs)
+        sem_pk = [obj for obj in created if obj.pk is None]
+        if sem_pk:
+            # MySQL não devolve as pks do bulk_create; cpf_cnpj é único.
+            pks = dict(
+                self.filter(cpf_cnpj__in=[obj.cpf_cnpj for obj in sem_pk]).values_list(
+                    "cpf_cnpj", "pk"
+                )
+            )
+            for obj in sem_pk:
+                obj.pk = pks.get(obj.cpf_cnpj)
+        AssociadoNomeToken.sincronizar([obj for obj in created if obj.pk is not None])
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.normalizar_matriculas()
+        result = super().bulk_update(
+            objs, Associado.expand_matricula_fields(fields), *args, **kwargs
+        )
+        if "nome_completo" in fields:
+            AssociadoNomeToken.sincronizar(objs)
+        return result
+
+    def buscar_por_nome(
+        self, nome: str, *, orgao: str = "", limite: int | None = None
+    ) -> list["Associado"]:
+        """Associados cujo nome tem as palavras de ``nome``, em sequência.
+
+        Casa por prefixo de palavra, ignorando acentos, caixa e pontuação: as
+        palavras da busca aparecem seguidas no nome, inteiras, exceto a última,
+        que pode ser só o começo de uma palavra. "MARIA DE JESUS SANT" acha
+        "Maria de Jesus Santana", mas "ARIA SILVA" não acha "Maria Silva"
+        (ver ``fold_words``). ``orgao``, quando dado, precisa estar contido no
+        órgão público. Para em ``limite`` resultados, em ordem de pk.
+
+        Os candidatos saem do índice de tokens (completos por igualdade, o
+        último por prefixo) e a sequência é confirmada em Python.
+        """
+        tokens = fold_tokens(nome)
+        if not tokens:
+            return []
+        *completos, ultimo = [token[: AssociadoNomeToken.TOKEN_MAX_LENGTH] for token in tokens]
+        queryset = self.all()
+        for token in dict.fromkeys(completos):
+            queryset = queryset.filter(
+                models.Exists(
+                    AssociadoNomeToken.objects.filter(
+                        associado=models.OuterRef("pk"), token=token
+                    )
+                )
+            )
+        queryset = queryset.filter(
+            models.Exists(
+                AssociadoNomeToken.objects.filter(
+                    associado=models.OuterRef("pk"), token__startswith=ultimo
+                )
+            )
+        )
+        alvo = fold_words(nome)
+        orgao_folded = fold_text(orgao)
+        encontrados: list[Associado] = []
+        queryset = queryset.order_by("pk")
+        inicio = 0
+        while True:
+            pagina = list(queryset[inicio : inicio + self.PAGINA_BUSCA_NOME])
+            for associado in pagina:
+                if alvo not in fold_words(associado.nome_completo):
+                    continue
+                if orgao_folded not in fold_text(associado.orgao_publico):
+                    continue
+                encontrados.append(associado)
+                if limite is not None and len(encontrados) >= limite:
+                    return encontrados
+            if len(pagina) < self.PAGINA_BUSCA_NOME:
+                return encontrados
+            inicio += self.PAGINA_BUSCA_NOME
+
+
 class Associado(BaseModel):
     class TipoDocumento(models.TextChoices):
         CPF = "CPF", "CPF"
@@ -49,6 +149,12 @@ class Associado(BaseModel):
     )
     orgao_publico = models.CharField(max_length=160, blank=True)
     matricula_orgao = models.CharField(max_length=60, blank=True)
+    matricula_norm = models.CharField(max_length=20, blank=True, db_index=True)
+    matricula_digitos = models.CharField(max_length=20, blank=True, db_index=True)
+    matricula_orgao_norm = models.CharField(max_length=60, blank=True, db_index=True)
+    matricula_orgao_digitos = models.CharField(
+        max_length=60, blank=True, db_index=True
+    )
     cargo = models.CharField(max_length=120, blank=True)
     status = models.CharField(
         max_length=20, choices=Status.choices, default=Status.CADASTRADO
@@ -65,6 +171,8 @@ class Associado(BaseModel):
     auxilio_status = models.CharField(max_length=80, blank=True)
     observacao = models.TextField(blank=True)
 
+    objects = AssociadoManager()
+
     class Meta:
         ordering = ["nome_completo"]
 
@@ -83,6 +191,21 @@ class Associado(BaseModel):
     def esteira(self):
         return getattr(self, "esteira_item", None)
 
+    @staticmethod
+    def expand_matricula_fields(fields):
+        """Inclui as colunas normalizadas das matrículas presentes em ``fields``."""
+        expanded = list(fields)
+        for field, derived in MATRICULA_NORMALIZADA_FIELDS.items():
+            if field in expanded:
+                expanded.extend(name for name in derived if name not in expanded)
+        return expanded
+
+    def normalizar_matriculas(self) -> None:
+        self.matricula_norm = normalize_matricula(self.matricula)
+        self.matricula_digitos = only_digits(self.matricula)
+        self.matricula_orgao_norm = normalize_matricula(self.matricula_orgao)
+        self.matricula_orgao_digitos = only_digits(self.matricula_orgao)
+
     def save(self, *args, **kwargs):
         self.cpf_cnpj = only_digits(self.cpf_cnpj)
         if self.cpf_cnpj:
@@ -91,11 +214,75 @@ class Associado(BaseModel):
                 if len(self.cpf_cnpj) == 14
                 else self.TipoDocumento.CPF
             )
+        self.normalizar_matriculas()
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = self.expand_matricula_fields(kwargs["update_fields"])
         creating = self.pk is None
         super().save(*args, **kwargs)
         if creating and not self.matricula:
             self.matricula = f"MAT-{self.pk:05d}"
-            super().save(update_fields=["matricula", "updated_at"])
+            self.normalizar_matriculas()
+            super().save(
+                update_fields=self.expand_matricula_fields(["matricula", "updated_at"])
+            )
+        # O índice de tokens só é reescrito quando o nome muda de fato.
+        update_fields = kwargs.get("update_fields")
+        if (update_fields is None or "nome_completo" in update_fields) and (
+            creating or self.nome_completo != getattr(self, "_nome_indexado", None)
+        ):
+            AssociadoNomeToken.sincronizar([self])
+        self._nome_indexado = self.nome_completo
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Nome já refletido em AssociadoNomeToken; ausente se o campo veio adiado.
+        instance._nome_indexado = instance.__dict__.get("nome_completo")
+        return instance
+
+
+class AssociadoNomeToken(models.Model):
+    """Índice de tokens do nome dobrado (sem acento, minúsculo) do associado.
+
+    Dado derivado de ``Associado.nome_completo``: sem soft delete, reescrito a
+    cada alteração do nome.
+    """
+
+    TOKEN_MAX_LENGTH = 60
+
+    associado = models.ForeignKey(
+        Associado, on_delete=models.CASCADE, related_name="nome_tokens"
+    )
+    token = models.CharField(max_length=TOKEN_MAX_LENGTH)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["token", "associado"], name="associado_nome_token_unico"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return self.token
+
+    @classmethod
+    def tokens_de(cls, nome: str) -> set[str]:
+        return {token[: cls.TOKEN_MAX_LENGTH] for token in fold_tokens(nome)}
+
+    @classmethod
+    def sincronizar(cls, associados) -> None:
+        associados = [associado for associado in associados if associado.pk is not None]
+        if not associados:
+            return
+        cls.objects.filter(associado_id__in=[associado.pk for associado in associados]).delete()
+        cls.objects.bulk_create(
+            [
+                cls(associado_id=associado.pk, token=token)
+                for associado in associados
+                for token in sorted(cls.tokens_de(associado.nome_completo))
+            ],
+            ignore_conflicts=True,
+        )
 
 
 class Endereco(BaseModel):
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+from uuid import uuid4
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .parsers import (
+    ENTRY_ITEM,
+    ETIPITxtRetornoParser,
+    ItemRetorno,
+    RetornoMeta,
+    StreamedRetorno,
+)
+
+logger = logging.getLogger(__name__)
+
+# Erros de leitura de um artefato truncado ou corrompido (JSONDecodeError é ValueError).
+ARTEFATO_INVALIDO = (OSError, EOFError, ValueError, LookupError, TypeError)
+
+
+def digest_file(arquivo_path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(arquivo_path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def gerar_artefato(
+    parser_class: type[ETIPITxtRetornoParser], arquivo_path: str, destino: str
+) -> None:
+    """Escreve o artefato de parse em ``destino``; roda nos processos do pool.
+
+    Só usa o parser e o sistema de arquivos local: nada de banco ou storage,
+    que ficam no processo principal.
+    """
+    with open(destino, "wb") as handle:
+        ParseArtifactStore(parser_class()).escrever(arquivo_path, handle)
+
+
+class DigestReader:
+    """Leitor que calcula o sha256 e conta os bytes à medida que o conteúdo passa.
+
+    Envolvido em ``django.core.files.File``, é lido pelo storage em chunks e o
+    digest fica pronto ao fim do ``save``, sem segunda leitura. Não é
+    posicionável: o storage não consegue voltar ao início e ler de novo.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.size = 0
+        self._digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.source.read(size)
+        self._digest.update(chunk)
+        self.size += len(chunk)
+        return chunk
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+class ParseArtifactStore:
+    """Cache do parse de arquivos retorno, endereçado pelo conteúdo do arquivo.
+
+    O artefato é um JSON lines comprimido com a meta na primeira linha e uma
+    entrada ``[tipo, payload]`` por linha; itens ``ItemRetorno`` vão na forma
+    compacta (a linha bruta), os demais payloads como objeto. A chave combina o
+    sha256 do arquivo com ``parser.VERSION``, então o parse só roda de novo
+    quando o parser muda.
+
+    A gravação é atômica: quem encontra o nome encontra o artefato inteiro.
+    Artefatos de versões antigas e de arquivos que já não existem só saem em
+    ``limpar``, fora do caminho de quem pode estar lendo.
+    """
+
+    prefix = "arquivos_retorno/parse"
+
+    def __init__(self, parser: ETIPITxtRetornoParser):
+        self.parser = parser
+
+    def artifact_name(self, digest: str) -> str:
+        return f"{self.prefix}/{digest}.v{self.parser.VERSION}.jsonl.gz"
+
+    def open_stream(self, arquivo_path: str, digest: str | None = None) -> StreamedRetorno:
+        """Abre o parse de ``arquivo_path``, do artefato quando existe.
+
+        Um artefato corrompido é apagado e o parse volta para o arquivo: no
+        cabeçalho, antes de devolver o stream; no meio das entradas, sem repetir
+        as que já foram entregues (ver ``_iter_entries``).
+        """
+        name = self.artifact_name(digest or digest_file(arquivo_path))
+        if default_storage.exists(name):
+            try:
+                return self._read(name, arquivo_path)
+            except ARTEFATO_INVALIDO as exc:
+                logger.warning("[RETORNO] artefato de parse inválido %s: %s", name, exc)
+                default_storage.delete(name)
+        return self._read(self._build(arquivo_path, name), arquivo_path)
+
+    def preparar(self, arquivos: Iterable[tuple[str, str]], processos: int) -> int:
+        """Gera em paralelo os artefatos que faltam para ``(arquivo_path, digest)``.
+
+        O parse roda em um pool de ``processos``; o processo principal só grava
+        os resultados no storage. Com um processo só, dentro de um processo
+        daemon (worker prefork do Celery não pode ter filhos) ou com um arquivo,
+        gera em série. Falhas são só registradas: ``open_stream`` tenta de novo
+        no processamento do arquivo. Devolve quantos artefatos foram gerados.
+        """
+        pendentes: dict[str, str] = {}
+        for arquivo_path, digest in arquivos:
+            name = self.artifact_name(digest)
+            if name not in pendentes and not default_storage.exists(name):
+                pendentes[name] = arquivo_path
+        if not pendentes:
+            return 0
+
+        processos = min(processos, len(pendentes))
+        if processos <= 1 or multiprocessing.current_process().daemon:
+            for name, arquivo_path in pendentes.items():
+                self._build(arquivo_path, name)
+            return len(pendentes)
+
+        gerados = 0
+        with tempfile.TemporaryDirectory() as diretorio, ProcessPoolExecutor(processos) as pool:
+            futuros = []
+            for indice, (name, arquivo_path) in enumerate(pendentes.items()):
+                destino = os.path.join(diretorio, f"{indice}.jsonl.gz")
+                futuro = pool.submit(gerar_artefato, type(self.parser), arquivo_path, destino)
+                futuros.append((name, destino, futuro))
+            for name, destino, futuro in futuros:
+                try:
+                    futuro.result()
+                except Exception as exc:
+                    logger.warning("[RETORNO] falha no parse paralelo de %s: %s", name, exc)
+                    continue
+                with open(destino, "rb") as handle:
+                    self._salvar(name, handle)
+                gerados += 1
+        return gerados
+
+    def limpar(self, digests: Iterable[str], idade_minima: timedelta = timedelta(days=1)) -> int:
+        """Apaga artefatos que não servem a nenhum dos ``digests`` na versão atual.
+
+        Cobre versões antigas do parser, temporários deixados por gravações
+        interrompidas e arquivos retorno que não existem mais. Artefatos
+        mais novos que ``idade_minima`` ficam, para não apagar um que acabou de
+        ser gerado para um upload ainda em curso. Devolve quantos foram apagados.
+        """
+        validos = {self.artifact_name(digest) for digest in digests if digest}
+        limite = timezone.now() - idade_minima
+        apagados = 0
+        for name in self._artefatos():
+            if name in validos or default_storage.get_modified_time(name) > limite:
+                continue
+            default_storage.delete(name)
+            apagados += 1
+        return apagados
+
+    def escrever(self, arquivo_path: str, destino) -> None:
+        """Escreve o artefato do parse de ``arquivo_path`` no binário ``destino``."""
+        stream = self.parser.iter_parse(arquivo_path)
+        with gzip.GzipFile(fileobj=destino, mode="wb") as gz_file:
+            writer = io.TextIOWrapper(gz_file, encoding="utf-8")
+            writer.write(
+                json.dumps(
+                    {
+                        "versao": self.parser.VERSION,
+                        "meta": asdict(stream.meta),
+                        "encoding": stream.encoding,
+                        "encoding_confidence": stream.encoding_confidence,
+                    }
+                )
+                + "\n"
+            )
+            for kind, payload in stream:
+                if isinstance(payload, ItemRetorno):
+                    payload = payload.compacto()
+                writer.write(json.dumps([kind, payload], cls=DjangoJSONEncoder) + "\n")
+            writer.flush()
+            writer.detach()
+
+    def _build(self, arquivo_path: str, name: str) -> str:
+        with tempfile.TemporaryFile() as temp_file:
+            self.escrever(arquivo_path, temp_file)
+            temp_file.seek(0)
+            return self._salvar(name, temp_file)
+
+    def _salvar(self, name: str, conteudo) -> str:
+        """Grava o artefato em ``name`` sem expor um arquivo pela metade.
+
+        O conteúdo vai para um temporário no mesmo diretório e só então é
+        renomeado para ``name`` (``os.replace``, atômico no mesmo sistema de
+        arquivos). Com dois processos gerando o mesmo artefato o conteúdo é o
+        mesmo, e o segundo rename só troca um artefato inteiro por outro.
+        """
+        if default_storage.exists(name):
+            return name
+        temporario = default_storage.save(
+            f"{name}.{uuid4().hex}.tmp", File(conteudo, name=name)
+        )
+        try:
+            os.replace(default_storage.path(temporario), default_storage.path(name))
+        except OSError:
+            default_storage.delete(temporario)
+            raise
+        return name
+
+    def _artefatos(self, inicio: str = "") -> Iterator[str]:
+        try:
+            _, arquivos = default_storage.listdir(self.prefix)
+        except FileNotFoundError:
+            return
+        for arquivo in arquivos:
+            if arquivo.startswith(inicio):
+                yield f"{self.prefix}/{arquivo}"
+
+    def _read(self, name: str, arquivo_path: str) -> StreamedRetorno:
+        handle = default_storage.open(name, "rb")
+        reader = io.TextIOWrapper(gzip.GzipFile(fileobj=handle), encoding="utf-8")
+        try:
+            header = json.loads(reader.readline())
+        except Exception:
+            reader.close()
+            raise
+        return StreamedRetorno(
+            meta=RetornoMeta(**header["meta"]),
+            entries=self._iter_entries(name, reader, arquivo_path),
+            encoding=header["encoding"],
+            encoding_confidence=header["encoding_confidence"],
+        )
+
+    def _iter_entries(
+        self, name: str, reader: io.TextIOWrapper, arquivo_path: str
+    ) -> Iterator[tuple[str, Mapping]]:
+        """Entradas do artefato; se ele se revela corrompido no meio, segue do arquivo.
+
+        O artefato tem as entradas na mesma ordem do parse, então a leitura
+        continua em ``iter_parse`` pulando as que já foram entregues.
+        """
+        entregues = 0
+        with reader:
+            while True:
+                try:
+                    line = reader.readline()
+                    if not line:
+                        return
+                    kind, payload = json.loads(line)
+                    if kind == ENTRY_ITEM:
+                        if isinstance(payload, list):
+                            payload = ItemRetorno.de_compacto(payload)
+                        else:
+                            payload["valor_descontado"] = Decimal(payload["valor_descontado"])
+                except ARTEFATO_INVALIDO as exc:
+                    logger.warning(
+                        "[RETORNO] artefato de parse corrompido %s na entrada %s: %s",
+                        name,
+                        entregues + 1,
+                        exc,
+                    )
+                    break
+                yield kind, payload
+                entregues += 1
+        default_storage.delete(name)
+        yield from islice(self.parser.iter_parse(arquivo_path), entregues, None)
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class FilaLocalProcessamento:
+    """Fila limitada, em processo, para quando o broker do Celery está fora.
+
+    O upload só enfileira o id e responde. Uma thread de fundo, com a própria
+    conexão ao banco, consome a fila em ordem: para cada arquivo tenta de novo
+    entregar ao Celery e só processa localmente se o broker continua fora, de
+    modo que a fila escoa para os workers assim que o broker volta.
+
+    A fila vive só na memória do processo: jobs perdidos num restart ficam com o
+    arquivo parado e voltam pela varredura de ``recuperar_parados``.
+    """
+
+    def __init__(self, tamanho_maximo: int):
+        self._fila: queue.Queue[int] = queue.Queue(maxsize=tamanho_maximo)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def enfileirar(self, arquivo_retorno_id: int) -> bool:
+        """Aceita o arquivo sem bloquear; False quando a fila está cheia."""
+        try:
+            self._fila.put_nowait(arquivo_retorno_id)
+        except queue.Full:
+            return False
+        self._garantir_consumidor()
+        return True
+
+    def aguardar(self) -> None:
+        self._fila.join()
+
+    def _garantir_consumidor(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._consumir, name="importacao-fila-local", daemon=True
+                )
+                self._thread.start()
+
+    def _consumir(self) -> None:
+        while True:
+            arquivo_retorno_id = self._fila.get()
+            try:
+                self._executar(arquivo_retorno_id)
+            except Exception:
+                # processar já registrou a falha no arquivo; a thread segue viva.
+                logger.exception(
+                    "[RETORNO] falha no processamento local do arquivo %s", arquivo_retorno_id
+                )
+            finally:
+                connection.close()
+                self._fila.task_done()
+
+    def _executar(self, arquivo_retorno_id: int) -> None:
+        from .services import ArquivoRetornoService
+        from .tasks import processar_arquivo_retorno
+
+        try:
+            processar_arquivo_retorno.apply_async((arquivo_retorno_id,), retry=False)
+        except Exception:
+            logger.warning(
+                "[RETORNO] broker indisponível; processando arquivo %s localmente",
+                arquivo_retorno_id,
+            )
+        else:
+            logger.info("[RETORNO] arquivo %s devolvido ao Celery", arquivo_retorno_id)
+            return
+
+        service = ArquivoRetornoService()
+        with self._fila.mutex:
+            service.aguardando = list(self._fila.queue)
+        service.processar(arquivo_retorno_id)
+
+
+@lru_cache(maxsize=1)
+def fila_local() -> FilaLocalProcessamento:
+    return FilaLocalProcessamento(settings.IMPORTACAO_FILA_LOCAL_TAMANHO)
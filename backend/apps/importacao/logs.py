@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from collections import Counter
+
+from django.conf import settings
+
+from .models import ArquivoRetorno, ImportacaoLog
+
+
+class ImportacaoLogBuffer:
+    """Acumula os logs de uma execução de importação e grava em lote.
+
+    As entradas vão para o banco via bulk_create ao atingir ``flush_size`` ou
+    quando o pipeline chama ``flush()`` ao fim de cada etapa. Cada par
+    (tipo, mensagem) grava no máximo ``limite_por_mensagem`` linhas; o excedente
+    vira um único log de resumo em ``fechar()``.
+    """
+
+    def __init__(
+        self,
+        arquivo_retorno: ArquivoRetorno,
+        *,
+        flush_size: int | None = None,
+        limite_por_mensagem: int | None = None,
+    ):
+        self.arquivo_retorno = arquivo_retorno
+        self.flush_size = flush_size or settings.IMPORTACAO_LOG_FLUSH_SIZE
+        self.limite_por_mensagem = (
+            limite_por_mensagem or settings.IMPORTACAO_LOG_LIMITE_POR_MENSAGEM
+        )
+        self._pendentes: list[ImportacaoLog] = []
+        self._gravados: Counter[tuple[str, str]] = Counter()
+        self._suprimidos: Counter[tuple[str, str]] = Counter()
+        self._linhas_suprimidas: dict[tuple[str, str], tuple[object, object]] = {}
+
+    def add(self, tipo: str, mensagem: str, dados: dict | None = None) -> None:
+        chave = (tipo, mensagem)
+        if self._gravados[chave] >= self.limite_por_mensagem:
+            self._suprimidos[chave] += 1
+            linha = (dados or {}).get("linha_numero")
+            if linha is not None:
+                primeira, _ = self._linhas_suprimidas.get(chave, (linha, None))
+                self._linhas_suprimidas[chave] = (primeira, linha)
+            return
+
+        self._gravados[chave] += 1
+        self._pendentes.append(
+            ImportacaoLog(
+                arquivo_retorno=self.arquivo_retorno,
+                tipo=tipo,
+                mensagem=mensagem,
+                dados=dados,
+            )
+        )
+        if len(self._pendentes) >= self.flush_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pendentes:
+            return
+        ImportacaoLog.objects.bulk_create(self._pendentes, batch_size=self.flush_size)
+        self._pendentes = []
+
+    def fechar(self) -> None:
+        """Grava os pendentes e um resumo por mensagem que excedeu o limite."""
+        for (tipo, mensagem), total in self._suprimidos.items():
+            primeira, ultima = self._linhas_suprimidas.get((tipo, mensagem), (None, None))
+            self._pendentes.append(
+                ImportacaoLog(
+                    arquivo_retorno=self.arquivo_retorno,
+                    tipo=tipo,
+                    mensagem=f"{mensagem} ({total} ocorrências adicionais omitidas)",
+                    dados={
+                        "mensagem_original": mensagem,
+                        "ocorrencias_omitidas": total,
+                        "limite_por_mensagem": self.limite_por_mensagem,
+                        "primeira_linha_omitida": primeira,
+                        "ultima_linha_omitida": ultima,
+                    },
+                )
+            )
+        self._suprimidos.clear()
+        self._linhas_suprimidas.clear()
+        self.flush()
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import json
+import tempfile
+from datetime import date
+from itertools import islice
+from pathlib import Path
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.associados.models import Associado, AssociadoNomeToken
+from apps.contratos.models import Ciclo, Contrato, Parcela
+from apps.importacao.logs import ImportacaoLogBuffer
+from apps.importacao.matching import AssociadoMatcher
+from apps.importacao.metricas import MedidorEtapas
+from apps.importacao.models import ArquivoRetorno
+from apps.importacao.reconciliacao import MotorReconciliacao, add_months, parse_competencia
+from apps.importacao.reconciliacao_lote import MotorReconciliacaoEmLote
+from apps.importacao.services import ArquivoRetornoService
+from apps.importacao.sintetico import (
+    VALOR_MENSALIDADE,
+    GeradorRetornoETIPI,
+    cpf_sintetico,
+    matricula_sintetica,
+    nome_sintetico,
+)
+
+LOTE_SEED = 5000
+
+
+class _Descartar(Exception):
+    """Desfaz a transação do benchmark depois de medir."""
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede parse, persistência dos itens, matching, reconciliação e upsert de "
+        "PagamentoMensalidade sobre um retorno ETIPI sintético e um banco semeado. "
+        "A saída é JSON, para comparar entre versões."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--itens", type=int, default=10_000)
+        parser.add_argument(
+            "--cobertura",
+            type=float,
+            default=0.9,
+            help="Fração das linhas do arquivo com associado e contrato semeados",
+        )
+        parser.add_argument("--competencia", default="05/2025")
+        parser.add_argument("--semente", type=int, default=0)
+        parser.add_argument(
+            "--motor",
+            choices=("lote", "item"),
+            default="lote" if settings.IMPORTACAO_RECONCILIACAO_EM_LOTE else "item",
+        )
+        parser.add_argument("--saida", help="Grava o JSON neste arquivo em vez do stdout")
+        parser.add_argument(
+            "--manter",
+            action="store_true",
+            help="Mantém no banco os dados semeados e importados (por padrão tudo é desfeito)",
+        )
+
+    def handle(self, *args, **options):
+        if not 0 <= options["cobertura"] <= 1:
+            raise CommandError("--cobertura deve estar entre 0 e 1.")
+
+        itens = options["itens"]
+        medidor = MedidorEtapas()
+        with tempfile.TemporaryDirectory() as diretorio:
+            caminho = Path(diretorio) / "retorno_sintetico.txt"
+            with medidor.medir("gerar_arquivo"):
+                GeradorRetornoETIPI(
+                    itens,
+                    competencia=options["competencia"],
+                    semente=options["semente"],
+                ).salvar(caminho)
+
+            with medidor.ativo():
+                try:
+                    with transaction.atomic():
+                        resumo = self._executar(str(caminho), medidor, options)
+                        if not options["manter"]:
+                            raise _Descartar
+                except _Descartar:
+                    pass
+
+        resultado = {
+            "itens": itens,
+            "cobertura": options["cobertura"],
+            "semente": options["semente"],
+            "motor": options["motor"],
+            "banco": connection.vendor,
+            "medido_em": timezone.now().isoformat(),
+            **medidor.como_dict(),
+            "resumo": resumo,
+        }
+        for etapa, medida in resultado["etapas"].items():
+            if etapa != "seed" and medida["segundos"]:
+                medida["itens_por_segundo"] = round(itens / medida["segundos"], 1)
+
+        saida = json.dumps(resultado, indent=2, default=str)
+        if options["saida"]:
+            Path(options["saida"]).write_text(saida + "\n", encoding="utf-8")
+        else:
+            self.stdout.write(saida)
+
+    def _executar(self, caminho: str, medidor: MedidorEtapas, options) -> dict:
+        service = ArquivoRetornoService()
+        competencia = parse_competencia(options["competencia"])
+        usuario = User.objects.create_user(email=f"benchmark-{uuid4().hex}@abase.local")
+
+        with medidor.medir("seed"):
+            cobertos = int(options["cobertura"] * 100)
+            self._semear(
+                (indice for indice in range(options["itens"]) if indice % 100 < cobertos),
+                competencia,
+                usuario,
+            )
+
+        arquivo_retorno = ArquivoRetorno.objects.create(
+            arquivo_nome=Path(caminho).name,
+            arquivo_url=caminho,
+            formato=ArquivoRetorno.Formato.TXT,
+            orgao_origem="ETIPI/iNETConsig",
+            competencia=competencia,
+            uploaded_by=usuario,
+        )
+        logs = ImportacaoLogBuffer(arquivo_retorno)
+
+        stream = service.parser.iter_parse(caminho)
+        for items, _ in medidor.iterar("parse", stream.chunks(service.chunk_size)):
+            with medidor.medir("persistir_itens"):
+                service._persistir_itens(arquivo_retorno, items, logs)
+
+        with medidor.medir("matching"):
+            matcher = AssociadoMatcher.carregar()
+            for cpf, matricula, nome, orgao_nome, orgao_codigo in (
+                arquivo_retorno.itens.values_list(
+                    "cpf_cnpj",
+                    "matricula_servidor",
+                    "nome_servidor",
+                    "orgao_pagto_nome",
+                    "orgao_pagto_codigo",
+                ).iterator(chunk_size=service.chunk_size)
+            ):
+                matcher.resolver(
+                    cpf=cpf,
+                    matricula=matricula,
+                    nome=nome,
+                    orgao=orgao_nome,
+                    orgao_alternativo=orgao_codigo,
+                )
+
+        motor_class = (
+            MotorReconciliacaoEmLote if options["motor"] == "lote" else MotorReconciliacao
+        )
+        motor = motor_class(arquivo_retorno, matcher=matcher, logs=logs)
+        motor.chunk_size = service.chunk_size
+        with medidor.medir("reconciliacao"):
+            resumo = motor.reconciliar()
+
+        with medidor.medir("pagamentos"):
+            resumo.update(
+                service._upsert_pagamentos_mensalidade(
+                    arquivo_retorno=arquivo_retorno,
+                    items=service.parser.iter_parse(caminho).iter_items(),
+                    import_uuid=str(uuid4()),
+                    user=usuario,
+                    matcher=matcher,
+                )
+            )
+        return resumo
+
+    def _semear(self, indices, competencia: date, usuario: User) -> None:
+        """Associado, contrato e um ciclo com a competência em aberto por índice."""
+        inicio_ciclo = add_months(competencia, -2)
+        restantes = iter(indices)
+        for lote in iter(lambda: list(islice(restantes, LOTE_SEED)), []):
+            associados = []
+            for indice in lote:
+                associado = Associado(
+                    nome_completo=nome_sintetico(indice),
+                    cpf_cnpj=cpf_sintetico(indice),
+                    tipo_documento=Associado.TipoDocumento.CPF,
+                    matricula=f"BENCH{indice:09d}",
+                    matricula_orgao=matricula_sintetica(indice),
+                    status=Associado.Status.ATIVO,
+                    agente_responsavel=usuario,
+                )
+                associado.normalizar_matriculas()
+                associados.append(associado)
+            Associado.objects.bulk_create(associados)
+            pks = dict(
+                Associado.objects.filter(
+                    cpf_cnpj__in=[associado.cpf_cnpj for associado in associados]
+                ).values_list("cpf_cnpj", "pk")
+            )
+            for associado in associados:
+                associado.pk = pks[associado.cpf_cnpj]
+            AssociadoNomeToken.sincronizar(associados)
+
+            contratos = Contrato.objects.bulk_create(
+                [
+                    Contrato(
+                        associado_id=associado.pk,
+                        agente=usuario,
+                        codigo=f"BENCH-{associado.matricula}",
+                        valor_bruto=VALOR_MENSALIDADE * 3,
+                        valor_liquido=VALOR_MENSALIDADE * 3,
+                        valor_mensalidade=VALOR_MENSALIDADE,
+                        prazo_meses=3,
+                        status=Contrato.Status.ATIVO,
+                        data_primeira_mensalidade=inicio_ciclo,
+                    )
+                    for associado in associados
+                ]
+            )
+            contrato_ids = list(
+                Contrato.objects.filter(
+                    codigo__in=[contrato.codigo for contrato in contratos]
+                ).values_list("pk", flat=True)
+            )
+            Ciclo.objects.bulk_create(
+                [
+                    Ciclo(
+                        contrato_id=contrato_id,
+                        numero=1,
+                        data_inicio=inicio_ciclo,
+                        data_fim=competencia,
+                        status=Ciclo.Status.ABERTO,
+                        valor_total=VALOR_MENSALIDADE * 3,
+                    )
+                    for contrato_id in contrato_ids
+                ]
+            )
+            Parcela.objects.bulk_create(
+                [
+                    Parcela(
+                        ciclo_id=ciclo_id,
+                        numero=numero + 1,
+                        referencia_mes=referencia,
+                        valor=VALOR_MENSALIDADE,
+                        data_vencimento=referencia,
+                        status=(
+                            Parcela.Status.EM_ABERTO
+                            if referencia == competencia
+                            else Parcela.Status.DESCONTADO
+                        ),
+                        data_pagamento=None if referencia == competencia else referencia,
+                    )
+                    for ciclo_id in Ciclo.objects.filter(
+                        contrato_id__in=contrato_ids
+                    ).values_list("pk", flat=True)
+                    for numero, referencia in enumerate(
+                        add_months(inicio_ciclo, mes) for mes in range(3)
+                    )
+                ]
+            )
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from apps.importacao.sintetico import GeradorRetornoETIPI
+
+
+class Command(BaseCommand):
+    help = "Gera um arquivo retorno ETIPI sintético (layout fixed-width) para testes de carga."
+
+    def add_arguments(self, parser):
+        parser.add_argument("saida", help="Caminho do arquivo .txt a gerar")
+        parser.add_argument(
+            "--itens",
+            type=int,
+            default=10_000,
+            help="Quantidade de linhas de detalhe (ex.: 10000, 100000, 1000000)",
+        )
+        parser.add_argument("--competencia", default="05/2025", help="Competência MM/YYYY")
+        parser.add_argument("--semente", type=int, default=0)
+        parser.add_argument("--encoding", default="latin-1")
+
+    def handle(self, *args, **options):
+        gerador = GeradorRetornoETIPI(
+            options["itens"],
+            competencia=options["competencia"],
+            semente=options["semente"],
+        )
+        total = gerador.salvar(options["saida"], encoding=options["encoding"])
+        self.stdout.write(
+            self.style.SUCCESS(f"{total} linhas de detalhe gravadas em {options['saida']}.")
+        )
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.importacao.services import ArquivoRetornoService
+
+
+class Command(BaseCommand):
+    help = (
+        "Despacha de novo arquivos retorno parados em PENDENTE/PROCESSANDO "
+        "(job perdido num restart ou deploy), retomando do último checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--minutos",
+            type=int,
+            default=None,
+            help="Idade mínima sem atualização (padrão: IMPORTACAO_RECUPERAR_APOS_MINUTOS)",
+        )
+
+    def handle(self, *args, **options):
+        minutos = options["minutos"]
+        recuperados = ArquivoRetornoService().recuperar_parados(
+            timedelta(minutes=minutos) if minutos is not None else None
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(recuperados)} arquivo(s) despachado(s) de novo.")
+        )
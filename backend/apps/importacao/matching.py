@@ -1,22 +1,16 @@
 from __future__ import annotations
 
-import re
+from bisect import bisect_right
+from dataclasses import dataclass
 
-from django.db.models import F, Q, Value
-from django.db.models.functions import Replace, Upper
+from django.db.models import Q
 
-from apps.associados.models import Associado, only_digits
+from apps.associados.models import Associado, normalize_matricula, only_digits
+from core.text import fold_text, fold_words
 
+from .models import ArquivoRetornoItem
 
-def normalize_matricula(value: str) -> str:
-    return re.sub(r"[^0-9A-Za-z]", "", (value or "")).upper()
-
-
-def _normalized_field(field_name: str):
-    expression = F(field_name)
-    for old in (".", "-", "/", " "):
-        expression = Replace(expression, Value(old), Value(""))
-    return Upper(expression)
+RegraCasamento = ArquivoRetornoItem.RegraCasamento
 
 
 def _build_orgao_candidates(orgao: str = "", *extras: str) -> list[str]:
@@ -28,6 +22,12 @@ def _build_orgao_candidates(orgao: str = "", *extras: str) -> list[str]:
     return candidatos
 
 
+@dataclass(slots=True)
+class MatchResult:
+    associado: Associado | None = None
+    regra: str = ""
+
+
 def find_associado(
     *,
     cpf: str = "",
@@ -39,54 +39,205 @@ def find_associado(
 ) -> Associado | None:
     """Replica a ordem de casamento do legado: CPF -> matrícula -> nome+órgão."""
 
+    return find_associado_match(
+        cpf=cpf,
+        matricula=matricula,
+        nome=nome,
+        orgao=orgao,
+        orgao_alternativo=orgao_alternativo,
+        orgao_codigo=orgao_codigo,
+    ).associado
+
+
+def find_associado_match(
+    *,
+    cpf: str = "",
+    matricula: str = "",
+    nome: str = "",
+    orgao: str = "",
+    orgao_alternativo: str = "",
+    orgao_codigo: str = "",
+) -> MatchResult:
+    """Como find_associado, informando também a regra que casou."""
+
     cpf_digits = only_digits(cpf)
     if cpf_digits:
         associado = Associado.objects.filter(cpf_cnpj=cpf_digits).first()
         if associado:
-            return associado
+            return MatchResult(associado, RegraCasamento.CPF)
 
     matricula_norm = normalize_matricula(matricula)
     if matricula_norm:
-        associados = (
-            Associado.objects.annotate(
-                matricula_orgao_norm=_normalized_field("matricula_orgao"),
-                matricula_norm=_normalized_field("matricula"),
-            )
-            .filter(
-                Q(matricula_orgao_norm=matricula_norm)
-                | Q(matricula_norm=matricula_norm)
+        associado = (
+            Associado.objects.filter(
+                Q(matricula_orgao_norm=matricula_norm) | Q(matricula_norm=matricula_norm)
             )
             .order_by("id")
+            .first()
         )
-        associado = associados.first()
         if associado:
-            return associado
+            return MatchResult(associado, RegraCasamento.MATRICULA)
 
         matricula_digits = only_digits(matricula)
         if matricula_digits:
             candidatos = list(
                 Associado.objects.filter(
-                    Q(matricula_orgao__icontains=matricula_digits)
-                    | Q(matricula__icontains=matricula_digits)
+                    Q(matricula_orgao_digitos=matricula_digits)
+                    | Q(matricula_digitos=matricula_digits)
                 )[:2]
             )
             if len(candidatos) == 1:
-                return candidatos[0]
+                return MatchResult(candidatos[0], RegraCasamento.MATRICULA_DIGITOS)
 
     nome = (nome or "").strip()
     if nome:
         candidatos_orgao = _build_orgao_candidates(orgao, orgao_alternativo, orgao_codigo)
         for candidato_orgao in candidatos_orgao:
-            candidatos = list(
-                Associado.objects.filter(nome_completo__icontains=nome).filter(
-                    orgao_publico__icontains=candidato_orgao
-                )[:2]
-            )
+            candidatos = Associado.objects.buscar_por_nome(nome, orgao=candidato_orgao, limite=2)
             if len(candidatos) == 1:
-                return candidatos[0]
+                return MatchResult(candidatos[0], RegraCasamento.NOME_ORGAO)
 
-        candidatos = list(Associado.objects.filter(nome_completo__icontains=nome)[:2])
+        candidatos = Associado.objects.buscar_por_nome(nome, limite=2)
         if len(candidatos) == 1:
-            return candidatos[0]
+            return MatchResult(candidatos[0], RegraCasamento.NOME)
+
+    return MatchResult()
+
+
+class _SubstringIndex:
+    """Busca por substring em muitos textos curtos com um único str.find em C.
+
+    Os textos são concatenados com um separador que nunca aparece nas buscas, e
+    a posição de cada ocorrência é mapeada de volta ao dono via bisect.
+    """
+
+    SEPARATOR = "\x00"
+
+    def __init__(self, entries: list[tuple[str, int]]):
+        self._starts: list[int] = []
+        self._owners: list[int] = []
+        parts: list[str] = []
+        offset = 0
+        for text, owner in entries:
+            if not text:
+                continue
+            self._starts.append(offset)
+            self._owners.append(owner)
+            parts.append(text)
+            offset += len(text) + len(self.SEPARATOR)
+        self._haystack = self.SEPARATOR.join(parts)
+
+    def find(self, needle: str) -> list[int]:
+        owners: list[int] = []
+        if not needle:
+            return owners
+        position = self._haystack.find(needle)
+        while position != -1:
+            index = bisect_right(self._starts, position) - 1
+            owner = self._owners[index]
+            if owner not in owners:
+                owners.append(owner)
+            # Avança para o próximo texto: cada dono conta uma única vez.
+            next_index = index + 1
+            if next_index >= len(self._starts):
+                break
+            position = self._haystack.find(needle, self._starts[next_index])
+        return owners
+
+
+class AssociadoMatcher:
+    """Índice de identidade carregado uma vez por arquivo retorno.
+
+    Resolve as linhas em memória com a mesma precedência de find_associado
+    (CPF -> matrícula -> dígitos da matrícula -> nome+órgão -> nome) e devolve
+    ids de associado junto com a regra que casou. O nome casa pela mesma regra
+    de ``buscar_por_nome``, prefixo de palavra sobre ``fold_words``.
+    """
+
+    def __init__(self, rows):
+        self._por_cpf: dict[str, int] = {}
+        self._por_matricula: dict[str, int] = {}
+        self._por_digitos: dict[str, set[int]] = {}
+        nomes: list[tuple[str, int]] = []
+        self._orgao_folded: dict[int, str] = {}
+
+        for (
+            associado_id,
+            cpf,
+            matricula_norm,
+            matricula_digitos,
+            matricula_orgao_norm,
+            matricula_orgao_digitos,
+            nome,
+            orgao,
+        ) in rows:
+            if cpf:
+                self._por_cpf.setdefault(cpf, associado_id)
+            for value in (matricula_orgao_norm, matricula_norm):
+                if value:
+                    self._por_matricula.setdefault(value, associado_id)
+            for value in (matricula_orgao_digitos, matricula_digitos):
+                if value:
+                    self._por_digitos.setdefault(value, set()).add(associado_id)
+            nomes.append((fold_words(nome), associado_id))
+            self._orgao_folded[associado_id] = fold_text(orgao)
+
+        self._nomes = _SubstringIndex(nomes)
+
+    @classmethod
+    def carregar(cls) -> AssociadoMatcher:
+        return cls(
+            Associado.objects.order_by("id").values_list(
+                "id",
+                "cpf_cnpj",
+                "matricula_norm",
+                "matricula_digitos",
+                "matricula_orgao_norm",
+                "matricula_orgao_digitos",
+                "nome_completo",
+                "orgao_publico",
+            ).iterator(chunk_size=5000)
+        )
 
-    return None
+    def resolver(
+        self,
+        *,
+        cpf: str = "",
+        matricula: str = "",
+        nome: str = "",
+        orgao: str = "",
+        orgao_alternativo: str = "",
+        orgao_codigo: str = "",
+    ) -> tuple[int | None, str]:
+        cpf_digits = only_digits(cpf)
+        if cpf_digits and cpf_digits in self._por_cpf:
+            return self._por_cpf[cpf_digits], RegraCasamento.CPF
+
+        matricula_norm = normalize_matricula(matricula)
+        if matricula_norm:
+            if matricula_norm in self._por_matricula:
+                return self._por_matricula[matricula_norm], RegraCasamento.MATRICULA
+
+            matricula_digits = only_digits(matricula)
+            if matricula_digits:
+                candidatos = self._por_digitos.get(matricula_digits, ())
+                if len(candidatos) == 1:
+                    return next(iter(candidatos)), RegraCasamento.MATRICULA_DIGITOS
+
+        nome = (nome or "").strip()
+        if nome:
+            candidatos_nome = self._nomes.find(fold_words(nome))
+            for candidato_orgao in _build_orgao_candidates(orgao, orgao_alternativo, orgao_codigo):
+                orgao_folded = fold_text(candidato_orgao)
+                candidatos = [
+                    associado_id
+                    for associado_id in candidatos_nome
+                    if orgao_folded in self._orgao_folded[associado_id]
+                ]
+                if len(candidatos) == 1:
+                    return candidatos[0], RegraCasamento.NOME_ORGAO
+
+            if len(candidatos_nome) == 1:
+                return candidatos_nome[0], RegraCasamento.NOME
+
+        return None, ""
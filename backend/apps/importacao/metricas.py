@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from time import perf_counter
+from typing import TypeVar
+
+from django.db import connection
+
+try:
+    import resource
+except ImportError:  # só existe em Unix
+    resource = None
+
+T = TypeVar("T")
+
+
+def memoria_pico_kb() -> int:
+    """Pico de RSS do processo até agora, em KB (ru_maxrss no Linux)."""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def somar_metricas(anterior: Mapping, atual: Mapping) -> dict[str, object]:
+    """Soma as medições de ``atual`` (``como_dict``) às já gravadas em ``anterior``.
+
+    Uma retomada ou cada task do pipeline em partições mede só o que rodou nela;
+    somadas, as métricas cobrem o processamento inteiro. Tempos e consultas
+    somam, a memória fica com o maior pico e ``execucoes`` conta as parcelas.
+    """
+    etapas = {etapa: dict(medida) for etapa, medida in anterior.get("etapas", {}).items()}
+    for etapa, medida in atual["etapas"].items():
+        _acumular(etapas.setdefault(etapa, {}), medida)
+    total = dict(anterior.get("total", {}))
+    _acumular(total, atual["total"])
+    return {
+        "total": _arredondar(total),
+        "etapas": {etapa: _arredondar(medida) for etapa, medida in etapas.items()},
+        "execucoes": anterior.get("execucoes", 0) + 1,
+    }
+
+
+def _acumular(acumulada: dict[str, float | int], medida: Mapping[str, float | int]) -> None:
+    for campo, valor in medida.items():
+        if campo == "memoria_pico_kb":
+            acumulada[campo] = max(acumulada.get(campo, 0), valor)
+        else:
+            acumulada[campo] = acumulada.get(campo, 0) + valor
+
+
+def _arredondar(medida: Mapping[str, float | int]) -> dict[str, float | int]:
+    return {
+        campo: round(valor, 4) if isinstance(valor, float) else valor
+        for campo, valor in medida.items()
+    }
+
+
+class MedidorEtapas:
+    """Tempo, consultas, tempo de banco e memória de cada etapa do processamento.
+
+    As consultas são contadas por um ``execute_wrapper`` na conexão padrão
+    enquanto ``ativo()`` está aberto, sem depender de DEBUG. A memória é o pico
+    de RSS do processo ao fim da etapa; como só cresce, mostra em que etapa o
+    pico foi atingido. Uma etapa medida várias vezes (trecho a trecho) acumula.
+    """
+
+    def __init__(self):
+        self.etapas: dict[str, dict[str, float | int]] = {}
+        self._consultas = 0
+        self._segundos_db = 0.0
+        self._inicio: tuple[float, int, float] | None = None
+
+    @contextmanager
+    def ativo(self) -> Iterator[MedidorEtapas]:
+        self._inicio = self._marco()
+        with connection.execute_wrapper(self._contar):
+            yield self
+
+    @contextmanager
+    def medir(self, etapa: str) -> Iterator[None]:
+        inicio = self._marco()
+        try:
+            yield
+        finally:
+            medida = self._medida(inicio)
+            acumulada = self.etapas.get(etapa)
+            if acumulada is None:
+                self.etapas[etapa] = medida
+            else:
+                _acumular(acumulada, medida)
+
+    def iterar(self, etapa: str, iteravel: Iterable[T]) -> Iterator[T]:
+        """Mede só o tempo gasto produzindo cada elemento de ``iteravel``."""
+        iterador = iter(iteravel)
+        while True:
+            with self.medir(etapa):
+                try:
+                    valor = next(iterador)
+                except StopIteration:
+                    return
+            yield valor
+
+    def como_dict(self) -> dict[str, object]:
+        total = self._medida(self._inicio or self._marco())
+        return {
+            "total": _arredondar(total),
+            "etapas": {etapa: _arredondar(medida) for etapa, medida in self.etapas.items()},
+        }
+
+    def _contar(self, execute, sql, params, many, context):
+        inicio = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self._consultas += 1
+            self._segundos_db += perf_counter() - inicio
+
+    def _marco(self) -> tuple[float, int, float]:
+        return perf_counter(), self._consultas, self._segundos_db
+
+    def _medida(self, inicio: tuple[float, int, float]) -> dict[str, float | int]:
+        segundos, consultas, segundos_db = inicio
+        return {
+            "segundos": perf_counter() - segundos,
+            "consultas": self._consultas - consultas,
+            "segundos_db": self._segundos_db - segundos_db,
+            "memoria_pico_kb": memoria_pico_kb(),
+        }
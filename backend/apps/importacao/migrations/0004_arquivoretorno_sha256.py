@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("importacao", "0003_pagamentomensalidade"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="arquivoretorno",
+            name="sha256",
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("importacao", "0004_arquivoretorno_sha256"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="arquivoretornoitem",
+            name="regra_casamento",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("cpf", "CPF"),
+                    ("matricula", "Matrícula"),
+                    ("matricula_digitos", "Dígitos da matrícula"),
+                    ("nome_orgao", "Nome e órgão"),
+                    ("nome", "Nome"),
+                ],
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,132 @@
+import json
+import logging
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
+
+# Registros descartados pela deduplicação, gravados antes do delete para auditoria
+# e para o reverse desta migração.
+ARQUIVO_DESCARTADOS = "importacao/migracoes/0006_pagamentos_descartados.json"
+CAMPOS_CONFLITO = ("valor", "status_code", "manual_status", "recebido_manual", "deleted_at")
+
+
+def deduplicar_pagamentos(apps, schema_editor):
+    """Mantém um registro por (cpf_cnpj, referencia_month) antes da constraint única.
+
+    Fica o registro ativo mais antigo; o vínculo com associado é herdado dos
+    descartados quando faltar, e os itens de refinanciamento são reapontados.
+    Os descartados vão inteiros para ``ARQUIVO_DESCARTADOS`` no storage, com os
+    campos em que divergiam do mantido, e cada divergência é logada.
+    """
+    PagamentoMensalidade = apps.get_model("importacao", "PagamentoMensalidade")
+    RefinanciamentoItem = apps.get_model("refinanciamento", "Item")
+    arquivados: list[dict] = []
+
+    grupos = (
+        PagamentoMensalidade.objects.values("cpf_cnpj", "referencia_month")
+        .annotate(total=Count("id"))
+        .filter(total__gt=1)
+    )
+    for grupo in grupos.iterator():
+        registros = list(
+            PagamentoMensalidade.objects.filter(
+                cpf_cnpj=grupo["cpf_cnpj"],
+                referencia_month=grupo["referencia_month"],
+            ).order_by(models.F("deleted_at").asc(nulls_first=True), "id")
+        )
+        mantido, descartados = registros[0], registros[1:]
+        if not mantido.associado_id:
+            mantido.associado_id = next(
+                (registro.associado_id for registro in descartados if registro.associado_id),
+                None,
+            )
+            mantido.save(update_fields=["associado"])
+        ids_descartados = [registro.id for registro in descartados]
+        for registro in PagamentoMensalidade.objects.filter(id__in=ids_descartados).values():
+            conflitos = [
+                campo
+                for campo in CAMPOS_CONFLITO
+                if registro[campo] != getattr(mantido, campo)
+            ]
+            if conflitos:
+                logger.warning(
+                    "Pagamento %s (cpf %s, %s) descartado com valores diferentes do "
+                    "mantido %s em %s",
+                    registro["id"],
+                    grupo["cpf_cnpj"],
+                    grupo["referencia_month"],
+                    mantido.id,
+                    ", ".join(conflitos),
+                )
+            arquivados.append(
+                {"mantido_id": mantido.id, "conflitos": conflitos, "registro": registro}
+            )
+        RefinanciamentoItem.objects.filter(
+            pagamento_mensalidade_id__in=ids_descartados
+        ).update(pagamento_mensalidade_id=mantido.id)
+        PagamentoMensalidade.objects.filter(id__in=ids_descartados).delete()
+
+    if arquivados:
+        nome = default_storage.save(
+            ARQUIVO_DESCARTADOS,
+            ContentFile(json.dumps(arquivados, cls=DjangoJSONEncoder, indent=2).encode()),
+        )
+        logger.warning("%s pagamentos duplicados descartados; cópia em %s", len(arquivados), nome)
+
+
+def restaurar_pagamentos(apps, schema_editor):
+    """Recria os registros descartados a partir de ``ARQUIVO_DESCARTADOS``.
+
+    Os itens de refinanciamento reapontados seguem no registro mantido; a cópia
+    é apagada depois, para que um novo forward grave no mesmo nome.
+    """
+    if not default_storage.exists(ARQUIVO_DESCARTADOS):
+        return
+    PagamentoMensalidade = apps.get_model("importacao", "PagamentoMensalidade")
+    with default_storage.open(ARQUIVO_DESCARTADOS, "rb") as arquivo:
+        arquivados = json.load(arquivo)
+    campos = {field.attname: field for field in PagamentoMensalidade._meta.concrete_fields}
+    registros = [
+        {
+            attname: campos[attname].to_python(valor)
+            for attname, valor in arquivado["registro"].items()
+            if attname in campos
+        }
+        for arquivado in arquivados
+    ]
+    PagamentoMensalidade.objects.bulk_create(
+        PagamentoMensalidade(**registro) for registro in registros
+    )
+    # bulk_create renova created_at/updated_at (auto_now); volta os originais.
+    for registro in registros:
+        PagamentoMensalidade.objects.filter(id=registro["id"]).update(
+            created_at=registro["created_at"], updated_at=registro["updated_at"]
+        )
+    default_storage.delete(ARQUIVO_DESCARTADOS)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("importacao", "0005_arquivoretornoitem_regra_casamento"),
+        ("refinanciamento", "0003_comprovante_agente_snapshot_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicar_pagamentos, restaurar_pagamentos),
+        migrations.RemoveIndex(
+            model_name="pagamentomensalidade",
+            name="importacao__cpf_cnp_c53f70_idx",
+        ),
+        migrations.AddConstraint(
+            model_name="pagamentomensalidade",
+            constraint=models.UniqueConstraint(
+                fields=("cpf_cnpj", "referencia_month"),
+                name="pagamento_mensalidade_cpf_referencia_unico",
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("importacao", "0006_pagamentomensalidade_cpf_referencia_unico"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="arquivoretorno",
+            name="etapa",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("itens", "Leitura dos itens"),
+                    ("reconciliacao", "Reconciliação"),
+                    ("pagamentos", "Pagamentos de mensalidade"),
+                    ("concluida", "Concluída"),
+                ],
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="arquivoretorno",
+            name="checkpoint_linha",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="arquivoretorno",
+            name="checkpoint_dados",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("importacao", "0007_arquivoretorno_checkpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="arquivoretorno",
+            name="etapa_iniciada_em",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="arquivoretorno",
+            name="etapa_processados_inicio",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
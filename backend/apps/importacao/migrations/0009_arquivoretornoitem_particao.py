@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("importacao", "0008_arquivoretorno_progresso"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="arquivoretornoitem",
+            name="particao",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="arquivoretornoitem",
+            index=models.Index(
+                fields=["arquivo_retorno", "particao", "linha_numero"],
+                name="importacao__arquivo_ea9499_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("importacao", "0009_arquivoretornoitem_particao"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="arquivoretorno",
+            name="metricas",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
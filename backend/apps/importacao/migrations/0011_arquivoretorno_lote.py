@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("importacao", "0010_arquivoretorno_metricas"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="arquivoretorno",
+            name="lote",
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="arquivoretorno",
+            name="lote_ordem",
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
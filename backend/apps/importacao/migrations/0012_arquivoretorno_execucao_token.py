@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("importacao", "0011_arquivoretorno_lote"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="arquivoretorno",
+            name="execucao_token",
+            field=models.CharField(blank=True, max_length=36),
+        ),
+    ]
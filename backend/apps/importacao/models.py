@@ -59,9 +59,14 @@ class PagamentoMensalidade(BaseModel):
     class Meta:
         ordering = ["-referencia_month", "cpf_cnpj"]
         indexes = [
-            models.Index(fields=["cpf_cnpj", "referencia_month"]),
             models.Index(fields=["import_uuid"]),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cpf_cnpj", "referencia_month"],
+                name="pagamento_mensalidade_cpf_referencia_unico",
+            )
+        ]
 
     def __str__(self) -> str:
         return f"PagMensalidade {self.cpf_cnpj} {self.referencia_month}"
@@ -79,8 +84,15 @@ class ArquivoRetorno(BaseModel):
         CONCLUIDO = "concluido", "Concluído"
         ERRO = "erro", "Erro"
 
+    class Etapa(models.TextChoices):
+        ITENS = "itens", "Leitura dos itens"
+        RECONCILIACAO = "reconciliacao", "Reconciliação"
+        PAGAMENTOS = "pagamentos", "Pagamentos de mensalidade"
+        CONCLUIDA = "concluida", "Concluída"
+
     arquivo_nome = models.CharField(max_length=255)
     arquivo_url = models.TextField()
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
     formato = models.CharField(max_length=4, choices=Formato.choices)
     orgao_origem = models.CharField(max_length=100)
     competencia = models.DateField()
@@ -98,6 +110,24 @@ class ArquivoRetorno(BaseModel):
         related_name="arquivos_retorno",
     )
     processado_em = models.DateTimeField(null=True, blank=True)
+    # Ponto de retomada do processamento: a etapa em curso, a última linha
+    # reconciliada já gravada e os totais acumulados das etapas anteriores.
+    etapa = models.CharField(max_length=20, choices=Etapa.choices, blank=True)
+    checkpoint_linha = models.PositiveIntegerField(default=0)
+    checkpoint_dados = models.JSONField(default=dict, blank=True)
+    # Base do cálculo de vazão: quando a etapa atual começou (ou foi retomada)
+    # e quantos itens já estavam processados naquele momento.
+    etapa_iniciada_em = models.DateTimeField(null=True, blank=True)
+    etapa_processados_inicio = models.PositiveIntegerField(default=0)
+    # Dono da execução em curso. O heartbeat só renova ``updated_at`` enquanto
+    # o token é o seu; a varredura de parados troca o token ao assumir o arquivo.
+    execucao_token = models.CharField(max_length=36, blank=True)
+    # Tempo, consultas e memória por etapa do processamento, somados entre
+    # retomadas e tasks de partição; zerados quando ele recomeça do início.
+    metricas = models.JSONField(default=dict, blank=True)
+    # Upload em lote: arquivos enviados juntos e a ordem de reconciliação no lote.
+    lote = models.UUIDField(null=True, blank=True, db_index=True)
+    lote_ordem = models.PositiveSmallIntegerField(null=True, blank=True)
 
     class Meta:
         ordering = ["-created_at"]
@@ -118,6 +148,13 @@ class ArquivoRetornoItem(BaseModel):
         ERRO = "erro", "Erro"
         CICLO_ABERTO = "ciclo_aberto", "Ciclo aberto"
 
+    class RegraCasamento(models.TextChoices):
+        CPF = "cpf", "CPF"
+        MATRICULA = "matricula", "Matrícula"
+        MATRICULA_DIGITOS = "matricula_digitos", "Dígitos da matrícula"
+        NOME_ORGAO = "nome_orgao", "Nome e órgão"
+        NOME = "nome", "Nome"
+
     arquivo_retorno = models.ForeignKey(
         ArquivoRetorno, on_delete=models.CASCADE, related_name="itens"
     )
@@ -158,12 +195,21 @@ class ArquivoRetornoItem(BaseModel):
         default=ResultadoProcessamento.CICLO_ABERTO,
     )
     observacao = models.TextField(blank=True)
+    regra_casamento = models.CharField(
+        max_length=20, choices=RegraCasamento.choices, blank=True
+    )
     payload_bruto = models.JSONField(default=dict, blank=True)
     gerou_encerramento = models.BooleanField(default=False)
     gerou_novo_ciclo = models.BooleanField(default=False)
+    # Fatia do arquivo no pipeline paralelo; itens de um mesmo associado caem
+    # sempre na mesma partição.
+    particao = models.PositiveSmallIntegerField(default=0)
 
     class Meta:
         ordering = ["linha_numero"]
+        indexes = [
+            models.Index(fields=["arquivo_retorno", "particao", "linha_numero"]),
+        ]
 
 
 class ImportacaoLog(BaseModel):
@@ -1,22 +1,37 @@
 from __future__ import annotations
 
 import re
-import unicodedata
 from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator, Mapping
 from dataclasses import dataclass, field
 from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
 
-
-def fold_text(value: str) -> str:
-    normalized = unicodedata.normalize("NFKD", value or "")
-    return "".join(char for char in normalized if not unicodedata.combining(char)).lower()
+from core.text import fold_text
 
 
 def normalize_lines(text: str) -> list[str]:
     return text.replace("\r\n", "\n").replace("\r", "\n").replace("\x0c", "\n").split("\n")
 
 
+def iter_file_lines(arquivo_path: str | Path, encoding: str) -> Iterator[str]:
+    """Versão incremental de normalize_lines: lê o arquivo sob demanda.
+
+    O modo universal newlines do TextIOWrapper já trata \\r\\n e \\r; o form feed
+    (quebra de página do relatório) é tratado aqui para manter a mesma numeração.
+    """
+    with open(arquivo_path, encoding=encoding, errors="replace", newline=None) as handle:
+        for line in handle:
+            if line.endswith("\n"):
+                line = line[:-1]
+            if "\x0c" in line:
+                yield from line.split("\x0c")
+            else:
+                yield line
+
+
 def parse_referencia_header(text: str) -> str | None:
     """Extrai 'YYYY-MM-01' do cabeçalho.
     Equivalente ao parseAbaseReferencia do PHP AdminController.
@@ -114,12 +129,308 @@ class RetornoMeta:
     sistema_origem: str = "ETIPI/iNETConsig"
 
 
+@dataclass(slots=True)
+class EncodingSniff:
+    encoding: str
+    confidence: float
+
+
 @dataclass(slots=True)
 class ParsedRetorno:
     meta: RetornoMeta
-    items: list[dict]
+    items: list[Mapping]
     warnings: list[dict] = field(default_factory=list)
     encoding: str = "latin-1"
+    encoding_confidence: float = 1.0
+
+
+ENTRY_ITEM = "item"
+ENTRY_WARNING = "warning"
+
+# Tipos de linha do relatório ETIPI, decididos por _classificar_linha.
+LINHA_DETALHE = "detalhe"
+LINHA_FRONTEIRA = "fronteira"
+LINHA_CABECALHO = "cabecalho"
+LINHA_LEGENDA = "legenda"
+LINHA_RUIDO = "ruido"
+LINHA_ORGAO = "orgao"
+LINHA_OUTRA = "outra"
+
+NAO_DIGITO = re.compile(r"\D")
+
+
+class _TabelaDobra(dict):
+    """Tabela de ``str.translate`` que dobra cada caractere uma única vez.
+
+    Serve só para classificar linhas: o resultado coincide com ``fold_text``
+    para o texto do relatório, sem refazer a normalização a cada linha.
+    """
+
+    def __missing__(self, codigo: int) -> str:
+        self[codigo] = dobrado = fold_text(chr(codigo))
+        return dobrado
+
+
+_DOBRA = _TabelaDobra()
+
+# Colunas da linha de detalhe e o título (já dobrado) de cada uma, na ordem em
+# que aparecem na linha "STATUS MATRICULA NOME ...".
+COLUNAS_ETIPI = (
+    ("status", "status"),
+    ("matricula", "matricula"),
+    ("nome", "nome"),
+    ("cargo", "cargo"),
+    ("fin", "fin"),
+    ("orgao", "orgao"),
+    ("lancamento", "lanc"),
+    ("total_pago", "total pago"),
+    ("valor", "valor"),
+    ("orgao_pagto", "orgao pagto"),
+    ("cpf", "cpf"),
+)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class LayoutColunas:
+    """Fatias das colunas da linha de detalhe.
+
+    Cada coluna vai do início do seu título até o início do título seguinte; a
+    última (CPF) vai até o fim da linha. Obtido por ``layout_de_inicios`` ou
+    ``layout_do_cabecalho``, que devolvem a mesma instância para as mesmas
+    posições: todos os itens de um arquivo compartilham o layout.
+    """
+
+    inicios: tuple[int, ...]
+    status: slice
+    matricula: slice
+    nome: slice
+    cargo: slice
+    fin: slice
+    orgao: slice
+    lancamento: slice
+    total_pago: slice
+    valor: slice
+    orgao_pagto: slice
+    cpf: slice
+
+
+@lru_cache(maxsize=64)
+def layout_de_inicios(inicios: tuple[int, ...]) -> LayoutColunas:
+    fins = (*inicios[1:], None)
+    return LayoutColunas(inicios, *(slice(inicio, fim) for inicio, fim in zip(inicios, fins)))
+
+
+@lru_cache(maxsize=64)
+def layout_do_cabecalho(linha: str) -> LayoutColunas | None:
+    """Layout lido da linha de títulos; None se faltar algum título."""
+    titulos = linha.translate(_DOBRA)
+    if len(titulos) != len(linha):
+        # Algum caractere mudou de tamanho ao dobrar: as posições não batem.
+        return None
+    inicios = []
+    cursor = 0
+    for _, titulo in COLUNAS_ETIPI:
+        posicao = titulos.find(titulo, cursor)
+        if posicao < 0:
+            return None
+        inicios.append(posicao)
+        cursor = posicao + len(titulo)
+    # O status vem alinhado à direita sob o título: a coluna começa na margem.
+    inicios[0] = 0
+    return layout_de_inicios(tuple(inicios))
+
+
+@dataclass(slots=True)
+class StreamedRetorno:
+    """Parse em modo streaming: meta resolvida e itens/warnings gerados sob demanda.
+
+    As entradas são pares ``(ENTRY_ITEM | ENTRY_WARNING, payload)`` e só podem ser
+    consumidas uma vez. Itens são ``ItemRetorno`` (ou dicts, no fallback
+    space-split); warnings são dicts.
+    """
+
+    meta: RetornoMeta
+    entries: Iterator[tuple[str, Mapping]]
+    encoding: str = "latin-1"
+    encoding_confidence: float = 1.0
+
+    def __iter__(self) -> Iterator[tuple[str, Mapping]]:
+        return self.entries
+
+    def iter_items(self) -> Iterator[Mapping]:
+        for kind, payload in self.entries:
+            if kind == ENTRY_ITEM:
+                yield payload
+
+    def chunks(self, size: int = 1000) -> Iterator[tuple[list[Mapping], list[dict]]]:
+        items: list[Mapping] = []
+        warnings: list[dict] = []
+        for kind, payload in self.entries:
+            if kind == ENTRY_ITEM:
+                items.append(payload)
+            else:
+                warnings.append(payload)
+            if len(items) + len(warnings) >= size:
+                yield items, warnings
+                items, warnings = [], []
+        if items or warnings:
+            yield items, warnings
+
+
+class ItemRetorno(Mapping):
+    """Linha de detalhe ETIPI guardada como o texto bruto da linha.
+
+    Os campos de ``ArquivoRetornoItem`` são recortados da linha quando lidos e o
+    ``payload_bruto`` só é montado na persistência, em vez de um dict por linha
+    com cada campo duplicado no payload. Lê como um dict: ``item["cpf_cnpj"]``,
+    ``item.get(...)`` e ``ArquivoRetornoItem(**item)`` continuam valendo.
+    ``colunas`` é o ``LayoutColunas`` do trecho do arquivo de onde a linha veio.
+    """
+
+    __slots__ = (
+        "colunas",
+        "linha_numero",
+        "linha",
+        "competencia",
+        "orgao_pagto_bloco",
+    )
+
+    CAMPOS = (
+        "linha_numero",
+        "cpf_cnpj",
+        "matricula_servidor",
+        "nome_servidor",
+        "cargo",
+        "competencia",
+        "valor_descontado",
+        "status_codigo",
+        "status_desconto",
+        "status_descricao",
+        "motivo_rejeicao",
+        "orgao_codigo",
+        "orgao_pagto_codigo",
+        "orgao_pagto_nome",
+        "payload_bruto",
+    )
+    _CAMPOS = frozenset(CAMPOS)
+
+    def __init__(
+        self,
+        colunas: LayoutColunas,
+        linha_numero: int,
+        linha: str,
+        competencia: str,
+        orgao_pagto_bloco: dict[str, str] | None = None,
+    ):
+        self.colunas = colunas
+        self.linha_numero = linha_numero
+        self.linha = linha
+        self.competencia = competencia
+        self.orgao_pagto_bloco = orgao_pagto_bloco
+
+    def __getitem__(self, campo: str):
+        if campo not in self._CAMPOS:
+            raise KeyError(campo)
+        return getattr(self, campo)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.CAMPOS)
+
+    def __len__(self) -> int:
+        return len(self.CAMPOS)
+
+    def __repr__(self) -> str:
+        return f"ItemRetorno(linha_numero={self.linha_numero}, linha={self.linha!r})"
+
+    def compacto(self) -> list:
+        """Forma serializável em JSON, desfeita por ``de_compacto``."""
+        return [
+            self.linha_numero,
+            self.linha,
+            self.competencia,
+            self.orgao_pagto_bloco,
+            self.colunas.inicios,
+        ]
+
+    @classmethod
+    def de_compacto(cls, dados: list) -> ItemRetorno:
+        linha_numero, linha, competencia, bloco, inicios = dados
+        return cls(layout_de_inicios(tuple(inicios)), linha_numero, linha, competencia, bloco)
+
+    def _coluna(self, fatia: slice) -> str:
+        return self.linha[fatia].strip()
+
+    @property
+    def cpf_cnpj(self) -> str:
+        return NAO_DIGITO.sub("", self._coluna(self.colunas.cpf))
+
+    @property
+    def matricula_servidor(self) -> str:
+        return self._coluna(self.colunas.matricula)
+
+    @property
+    def nome_servidor(self) -> str:
+        return self._coluna(self.colunas.nome).upper()
+
+    @property
+    def cargo(self) -> str:
+        return self._coluna(self.colunas.cargo) or "-"
+
+    @property
+    def valor_descontado(self) -> Decimal:
+        # Já validado no parse (_parse_detail_line).
+        return ETIPITxtRetornoParser._parse_decimal(self._coluna(self.colunas.valor))
+
+    @property
+    def status_codigo(self) -> str:
+        return self._coluna(self.colunas.status).upper()
+
+    @property
+    def status_desconto(self) -> str:
+        return ETIPITxtRetornoParser.STATUS_MAP[self.status_codigo][0]
+
+    @property
+    def status_descricao(self) -> str:
+        return ETIPITxtRetornoParser.STATUS_MAP[self.status_codigo][1]
+
+    @property
+    def motivo_rejeicao(self) -> str | None:
+        status_desconto, status_descricao = ETIPITxtRetornoParser.STATUS_MAP[self.status_codigo]
+        return status_descricao if status_desconto == "rejeitado" else None
+
+    @property
+    def orgao_codigo(self) -> str:
+        return self._coluna(self.colunas.orgao)
+
+    @property
+    def orgao_pagto_codigo(self) -> str:
+        if self.orgao_pagto_bloco:
+            return self.orgao_pagto_bloco["codigo"]
+        return self._coluna(self.colunas.orgao_pagto)
+
+    @property
+    def orgao_pagto_nome(self) -> str:
+        return self.orgao_pagto_bloco["nome"] if self.orgao_pagto_bloco else ""
+
+    @property
+    def payload_bruto(self) -> dict:
+        colunas = self.colunas
+        payload = {
+            "status_codigo": self.status_codigo,
+            "matricula": self.matricula_servidor,
+            "nome": self.linha[colunas.nome].rstrip(),
+            "cargo": self.linha[colunas.cargo].rstrip(),
+            "financiador": self._coluna(colunas.fin),
+            "orgao_codigo": self.orgao_codigo,
+            "lancamento": self._coluna(colunas.lancamento),
+            "total_pago": self._coluna(colunas.total_pago),
+            "valor": self._coluna(colunas.valor),
+            "orgao_pagto_codigo": self._coluna(colunas.orgao_pagto),
+            "cpf": self.cpf_cnpj,
+        }
+        if self.orgao_pagto_bloco:
+            payload["orgao_pagto_bloco"] = self.orgao_pagto_bloco
+        return payload
 
 
 class ParseStrategy(ABC):
@@ -129,6 +440,9 @@ class ParseStrategy(ABC):
 
 
 class ETIPITxtRetornoParser(ParseStrategy):
+    # Incrementar sempre que a saída do parse mudar: invalida os artefatos em cache.
+    VERSION = "5"
+
     STATUS_MAP = {
         "1": ("efetivado", "Lançado e Efetivado"),
         "2": ("rejeitado", "Não Lançado por Falta de Margem Temporariamente"),
@@ -149,37 +463,103 @@ class ETIPITxtRetornoParser(ParseStrategy):
         re.IGNORECASE,
     )
 
-    STATUS_SLICE = slice(0, 7)
-    MATRICULA_SLICE = slice(7, 17)
-    NOME_SLICE = slice(17, 48)
-    CARGO_SLICE = slice(48, 79)
-    FIN_SLICE = slice(79, 84)
-    ORGAO_SLICE = slice(84, 90)
-    LANCAMENTO_SLICE = slice(90, 97)
-    TOTAL_PAGO_SLICE = slice(97, 109)
-    VALOR_SLICE = slice(109, 122)
-    ORGAO_PAGTO_SLICE = slice(122, 134)
-    CPF_SLICE = slice(134, None)
+    # Layout do relatório ETIPI padrão, usado enquanto nenhuma linha de títulos
+    # legível foi lida no arquivo.
+    LAYOUT_PADRAO = layout_de_inicios((0, 7, 17, 48, 79, 84, 90, 97, 109, 122, 134))
+
+    # Prefixo inspecionado para escolher o encoding e linhas varridas em busca do
+    # cabeçalho (entidade, referência e linha de colunas ficam sempre no topo).
+    # Um cabeçalho abaixo da linha META_SCAN_LINES não é encontrado: o upload é
+    # recusado por cabeçalho inválido.
+    SNIFF_BYTES = 64 * 1024
+    META_SCAN_LINES = 40
+    HEADER_KEYWORDS = ("entidade:", "referencia:", "status matricula")
+
+    # Prefixos (já dobrados) usados por _classificar_linha. Cabeçalhos de página
+    # fecham o bloco aberto; os demais ruídos são só ignorados.
+    FRONTEIRA_PREFIXOS = ("total do status:", "-" * 81)
+    CABECALHO_PREFIXOS = ("governo do estado", "entidade:", "status matricula")
+    RUIDO_PREFIXOS = (
+        "empresa de tecnologia",
+        "relatorio dos lancamentos",
+        "1 - lancado",
+        "2 - nao lancado",
+        "3 - nao lancado",
+        "4 - lancado",
+        "5 - nao lancado",
+        "6 - lancamento",
+        "s - nao lancado",
+    )
 
     @classmethod
-    def decode_bytes(cls, raw_bytes: bytes) -> tuple[str, str]:
-        fallback: tuple[str, str] | None = None
+    def sniff_encoding(cls, raw_bytes: bytes) -> EncodingSniff:
+        """Escolhe o encoding olhando só um prefixo limitado do arquivo.
+
+        Mantém a ordem de preferência de ENCODINGS: vence o primeiro que decodifica
+        o prefixo e expõe as palavras-chave do cabeçalho. A confiança é 1.0 quando
+        o cabeçalho acentuado confirmou o encoding, 0.6 quando o prefixo é ASCII
+        puro (qualquer candidato serviria), 0.3 quando nenhum candidato revelou o
+        cabeçalho e 0.0 quando nenhum decodificou sem erros.
+        """
+        head = raw_bytes[: cls.SNIFF_BYTES]
+        if len(raw_bytes) > cls.SNIFF_BYTES:
+            # Corta na última quebra de linha para não partir um caractere multibyte.
+            head = head[: head.rfind(b"\n") + 1] or head
+
+        fallback: str | None = None
         for encoding in cls.ENCODINGS:
             try:
-                decoded = raw_bytes.decode(encoding)
+                decoded = head.decode(encoding)
             except UnicodeDecodeError:
                 continue
             if fallback is None:
-                fallback = (decoded, encoding)
-            folded = fold_text(decoded)
-            if "entidade:" in folded and "referencia:" in folded and "status matricula" in folded:
-                return decoded, encoding
+                fallback = encoding
+            header = fold_text("\n".join(normalize_lines(decoded)[: cls.META_SCAN_LINES]))
+            if all(keyword in header for keyword in cls.HEADER_KEYWORDS):
+                return EncodingSniff(encoding, 1.0 if not head.isascii() else 0.6)
         if fallback is not None:
-            return fallback
-        return raw_bytes.decode("latin-1", errors="replace"), "latin-1"
+            return EncodingSniff(fallback, 0.3)
+        return EncodingSniff("latin-1", 0.0)
+
+    @classmethod
+    def decode_with_sniff(cls, raw_bytes: bytes) -> tuple[str, EncodingSniff]:
+        sniff = cls.sniff_encoding(raw_bytes)
+        try:
+            return raw_bytes.decode(sniff.encoding), sniff
+        except UnicodeDecodeError:
+            # O prefixo era válido mas o restante não: decodifica uma única vez com
+            # substituição em vez de recomeçar pelos demais encodings.
+            return (
+                raw_bytes.decode(sniff.encoding, errors="replace"),
+                EncodingSniff(sniff.encoding, sniff.confidence / 2),
+            )
+
+    @classmethod
+    def read_header(cls, head: bytes) -> tuple[list[str], EncodingSniff]:
+        """Decodifica só o início do arquivo (até SNIFF_BYTES + 1 bytes).
+
+        Devolve as primeiras META_SCAN_LINES linhas, suficientes para validar o
+        cabeçalho e extrair a meta sem ler o arquivo inteiro.
+        """
+        sniff = cls.sniff_encoding(head)
+        if len(head) > cls.SNIFF_BYTES:
+            head = head[: cls.SNIFF_BYTES]
+            head = head[: head.rfind(b"\n") + 1] or head
+        text = head.decode(sniff.encoding, errors="replace")
+        return normalize_lines(text)[: cls.META_SCAN_LINES], sniff
+
+    @classmethod
+    def decode_bytes(cls, raw_bytes: bytes) -> tuple[str, str]:
+        text, sniff = cls.decode_with_sniff(raw_bytes)
+        return text, sniff.encoding
 
     @classmethod
     def extract_meta(cls, lines: list[str]) -> RetornoMeta:
+        """Competência, data de geração e entidade do cabeçalho.
+
+        Só as primeiras ``META_SCAN_LINES`` linhas são examinadas; sem data de
+        geração no cabeçalho, ``data_geracao`` fica vazia.
+        """
         # Tentativa 1: padrão completo ETIPI (entidade + referência + data na mesma linha)
         for line in lines:
             match = cls.HEADER_PATTERN.search(line)
@@ -191,8 +571,8 @@ class ETIPITxtRetornoParser(ParseStrategy):
                 )
 
         # Tentativa 2: regex flexível estilo PHP parseAbaseReferencia
-        # Varre as primeiras 40 linhas em busca de "Referência: MM/YYYY"
-        header_text = "\n".join(lines[:40])
+        # Varre as primeiras META_SCAN_LINES linhas em busca de "Referência: MM/YYYY"
+        header_text = "\n".join(lines[: cls.META_SCAN_LINES])
         ref_ymd = parse_referencia_header(header_text)
         if ref_ymd:
             # Extrai mês/ano no formato MM/YYYY para competência
@@ -201,7 +581,7 @@ class ETIPITxtRetornoParser(ParseStrategy):
 
             # Tenta extrair entidade separadamente
             entidade = ""
-            for line in lines[:40]:
+            for line in lines[: cls.META_SCAN_LINES]:
                 m = re.search(r"Entidade:\s*(.+)", line, re.IGNORECASE)
                 if m:
                     entidade = m.group(1).strip()
@@ -209,7 +589,7 @@ class ETIPITxtRetornoParser(ParseStrategy):
 
             # Tenta extrair data de geração
             data_geracao = ""
-            for line in lines[:40]:
+            for line in lines[: cls.META_SCAN_LINES]:
                 m = re.search(r"Data da Gera[^\d]*(\d{2}/\d{2}/\d{4})", line, re.IGNORECASE)
                 if m:
                     data_geracao = m.group(1)
@@ -224,61 +604,127 @@ class ETIPITxtRetornoParser(ParseStrategy):
         raise ValueError("Cabeçalho ETIPI com entidade e referência não encontrado.")
 
     def parse(self, arquivo_path: str) -> ParsedRetorno:
-        raw_bytes = Path(arquivo_path).read_bytes()
-        text, encoding = self.decode_bytes(raw_bytes)
-        lines = normalize_lines(text)
-        meta = self.extract_meta(lines)
-
-        items: list[dict] = []
+        stream = self.iter_parse(arquivo_path)
+        items: list[Mapping] = []
         warnings: list[dict] = []
-        bloco_atual: list[dict] = []
+        for kind, payload in stream:
+            if kind == ENTRY_ITEM:
+                items.append(payload)
+            else:
+                warnings.append(payload)
+        return ParsedRetorno(
+            meta=stream.meta,
+            items=items,
+            warnings=warnings,
+            encoding=stream.encoding,
+            encoding_confidence=stream.encoding_confidence,
+        )
+
+    def iter_parse(self, arquivo_path: str) -> StreamedRetorno:
+        """Parse com memória constante: o arquivo é decodificado incrementalmente
+        e cada item é entregue assim que o bloco do órgão pagador é fechado.
+        """
+        with open(arquivo_path, "rb") as handle:
+            # Um byte a mais sinaliza ao sniff que o prefixo foi truncado.
+            sniff = self.sniff_encoding(handle.read(self.SNIFF_BYTES + 1))
+        encoding = sniff.encoding
+        head = list(islice(iter_file_lines(arquivo_path, encoding), self.META_SCAN_LINES))
+        meta = self.extract_meta(head)
+        return StreamedRetorno(
+            meta=meta,
+            entries=self._iter_entries(arquivo_path, encoding, meta.competencia),
+            encoding=encoding,
+            encoding_confidence=sniff.confidence,
+        )
+
+    def _iter_entries(
+        self, arquivo_path: str, encoding: str, competencia: str
+    ) -> Iterator[tuple[str, Mapping]]:
+        encontrou_itens = False
+        for entry in self._iter_fixed_width(iter_file_lines(arquivo_path, encoding), competencia):
+            if entry[0] == ENTRY_ITEM:
+                encontrou_itens = True
+            yield entry
+
+        # Fallback: se o parser fixed-width não encontrou itens, tenta space-split (estilo PHP)
+        if not encontrou_itens:
+            yield from self._iter_spacesplit_fallback(
+                iter_file_lines(arquivo_path, encoding), competencia
+            )
+
+    def _iter_fixed_width(
+        self, lines: Iterable[str], competencia: str
+    ) -> Iterator[tuple[str, Mapping]]:
+        """Colunas fixas pelo layout da linha de títulos vigente.
+
+        Cada linha de títulos (uma por página) redefine o layout, então páginas
+        com colunas deslocadas não derrubam o arquivo. O layout só depende do
+        próprio arquivo: antes da primeira linha de títulos legível vale o padrão.
+
+        Bytes inválidos para o encoding escolhido viram U+FFFD na leitura; a
+        primeira linha com substituição gera um warning, para que um encoding mal
+        detectado não corrompa nomes em silêncio.
+        """
+        layout = self.LAYOUT_PADRAO
+        bloco_atual: list[ItemRetorno] = []
         in_legend = False
+        avisou_substituicao = False
 
         for linha_numero, line in enumerate(lines, start=1):
             stripped = line.rstrip()
-            folded = fold_text(stripped).strip()
-
             if not stripped:
                 continue
 
-            if self._is_block_boundary(folded):
+            if not avisou_substituicao and "\ufffd" in stripped:
+                avisou_substituicao = True
+                yield (
+                    ENTRY_WARNING,
+                    {
+                        "linha_numero": linha_numero,
+                        "erro": (
+                            "Caracteres inválidos para o encoding detectado; "
+                            "textos do arquivo podem estar corrompidos."
+                        ),
+                        "conteudo": stripped,
+                    },
+                )
+
+            tipo, folded = self._classificar_linha(stripped, layout)
+
+            if tipo == LINHA_FRONTEIRA:
                 if bloco_atual:
-                    items.extend(bloco_atual)
+                    yield from ((ENTRY_ITEM, item) for item in bloco_atual)
                     bloco_atual = []
                 continue
 
-            if bloco_atual and (
-                folded.startswith("governo do estado")
-                or folded.startswith("entidade:")
-                or folded.startswith("status matricula")
-            ):
-                items.extend(bloco_atual)
-                bloco_atual = []
-
-            if "legenda do status" in folded:
+            if tipo == LINHA_CABECALHO:
                 if bloco_atual:
-                    items.extend(bloco_atual)
+                    yield from ((ENTRY_ITEM, item) for item in bloco_atual)
                     bloco_atual = []
-                in_legend = True
+                if folded.startswith("status matricula"):
+                    layout = layout_do_cabecalho(stripped) or layout
                 continue
 
-            if in_legend:
+            if tipo == LINHA_LEGENDA:
+                if bloco_atual:
+                    yield from ((ENTRY_ITEM, item) for item in bloco_atual)
+                    bloco_atual = []
+                in_legend = True
                 continue
 
-            if self._is_noise_line(stripped, folded):
+            if in_legend or tipo == LINHA_RUIDO:
                 continue
 
-            orgao_info = self._parse_orgao_pagamento(stripped)
-            if orgao_info:
-                for item in bloco_atual:
-                    item["orgao_pagto_codigo"] = orgao_info["codigo"]
-                    item["orgao_pagto_nome"] = orgao_info["nome"]
-                    item["payload_bruto"]["orgao_pagto_bloco"] = orgao_info
-                items.extend(bloco_atual)
-                bloco_atual = []
+            if tipo == LINHA_ORGAO:
+                orgao_info = self._parse_orgao_pagamento(stripped, folded)
+                if orgao_info:
+                    for item in bloco_atual:
+                        item.orgao_pagto_bloco = orgao_info
+                    yield from ((ENTRY_ITEM, item) for item in bloco_atual)
+                    bloco_atual = []
                 continue
 
-            if not self._is_detail_line(stripped):
+            if tipo != LINHA_DETALHE:
                 continue
 
             try:
@@ -286,101 +732,106 @@ class ETIPITxtRetornoParser(ParseStrategy):
                     self._parse_detail_line(
                         line=stripped,
                         linha_numero=linha_numero,
-                        competencia=meta.competencia,
+                        competencia=competencia,
+                        layout=layout,
                     )
                 )
             except ValueError as exc:
-                warnings.append(
+                yield (
+                    ENTRY_WARNING,
                     {
                         "linha_numero": linha_numero,
                         "erro": str(exc),
                         "conteudo": stripped,
-                    }
+                    },
                 )
 
         if bloco_atual:
-            items.extend(bloco_atual)
-
-        # Fallback: se o parser fixed-width não encontrou itens, tenta space-split (estilo PHP)
-        if not items:
-            items, warnings = self._parse_spacesplit_fallback(lines, meta.competencia, warnings)
-
-        return ParsedRetorno(meta=meta, items=items, warnings=warnings, encoding=encoding)
+            yield from ((ENTRY_ITEM, item) for item in bloco_atual)
 
-    def _parse_spacesplit_fallback(
-        self, lines: list[str], competencia: str, warnings: list[dict]
-    ) -> tuple[list[dict], list[dict]]:
+    def _iter_spacesplit_fallback(
+        self, lines: Iterable[str], competencia: str
+    ) -> Iterator[tuple[str, Mapping]]:
         """Fallback que usa parse_linha_spacesplit (estilo PHP parseAbaseLinha).
         Ativado quando o parser fixed-width ETIPI não encontra nenhum item.
         """
-        items: list[dict] = []
         for linha_numero, line in enumerate(lines, start=1):
             row = parse_linha_spacesplit(line)
             if not row:
                 continue
             try:
-                status_desconto, status_descricao = self.STATUS_MAP.get(
-                    row["status_code"], ("pendente", "Status desconhecido")
-                )
-                valor = row["valor"]
-                items.append({
-                    "linha_numero": linha_numero,
-                    "cpf_cnpj": row["cpf"],
-                    "matricula_servidor": row["matricula"],
-                    "nome_servidor": row["nome"].upper(),
-                    "cargo": "-",
-                    "competencia": competencia,
-                    "valor_descontado": valor,
-                    "status_codigo": row["status_code"],
-                    "status_desconto": status_desconto,
-                    "status_descricao": status_descricao,
-                    "motivo_rejeicao": status_descricao if status_desconto == "rejeitado" else None,
-                    "orgao_codigo": "",
-                    "orgao_pagto_codigo": row["orgao_pagto"],
-                    "orgao_pagto_nome": "",
-                    "payload_bruto": {
-                        "status_codigo": row["status_code"],
-                        "matricula": row["matricula"],
-                        "nome": row["nome"],
-                        "valor": str(valor),
-                        "orgao_pagto": row["orgao_pagto"],
-                        "cpf": row["cpf"],
-                        "_parser": "spacesplit",
-                    },
-                })
+                yield ENTRY_ITEM, self._item_spacesplit(row, linha_numero, competencia)
             except Exception as exc:
-                warnings.append({
+                yield ENTRY_WARNING, {
                     "linha_numero": linha_numero,
                     "erro": str(exc),
                     "conteudo": line.rstrip(),
-                })
-        return items, warnings
-
-    def _is_noise_line(self, line: str, folded: str) -> bool:
-        return any(
-            (
-                folded.startswith("governo do estado"),
-                folded.startswith("empresa de tecnologia"),
-                folded.startswith("relatorio dos lancamentos"),
-                folded.startswith("entidade:"),
-                folded.startswith("status matricula"),
-                set(line.strip()) == {"="},
-                folded.startswith("1 - lancado"),
-                folded.startswith("2 - nao lancado"),
-                folded.startswith("3 - nao lancado"),
-                folded.startswith("4 - lancado"),
-                folded.startswith("5 - nao lancado"),
-                folded.startswith("6 - lancamento"),
-                folded.startswith("s - nao lancado"),
-                "pag:" in folded,
-            )
+                }
+
+    def _item_spacesplit(self, row: dict, linha_numero: int, competencia: str) -> dict:
+        """Item de uma linha lida por parse_linha_spacesplit (estilo PHP parseAbaseLinha)."""
+        status_desconto, status_descricao = self.STATUS_MAP.get(
+            row["status_code"], ("pendente", "Status desconhecido")
         )
+        valor = row["valor"]
+        return {
+            "linha_numero": linha_numero,
+            "cpf_cnpj": row["cpf"],
+            "matricula_servidor": row["matricula"],
+            "nome_servidor": row["nome"].upper(),
+            "cargo": "-",
+            "competencia": competencia,
+            "valor_descontado": valor,
+            "status_codigo": row["status_code"],
+            "status_desconto": status_desconto,
+            "status_descricao": status_descricao,
+            "motivo_rejeicao": status_descricao if status_desconto == "rejeitado" else None,
+            "orgao_codigo": "",
+            "orgao_pagto_codigo": row["orgao_pagto"],
+            "orgao_pagto_nome": "",
+            "payload_bruto": {
+                "status_codigo": row["status_code"],
+                "matricula": row["matricula"],
+                "nome": row["nome"],
+                "valor": str(valor),
+                "orgao_pagto": row["orgao_pagto"],
+                "cpf": row["cpf"],
+                "_parser": "spacesplit",
+            },
+        }
 
-    def _is_block_boundary(self, folded: str) -> bool:
-        return folded.startswith("total do status:") or folded.startswith("---------------------------------------------------------------------------------")
+    def _classificar_linha(
+        self, line: str, layout: LayoutColunas | None = None
+    ) -> tuple[str, str]:
+        """Tipo da linha (``LINHA_*``) e, fora do caminho rápido, o texto dobrado.
 
-    def _parse_orgao_pagamento(self, line: str) -> dict[str, str] | None:
-        folded = fold_text(line)
+        Linhas de detalhe são a quase totalidade do arquivo e se reconhecem pelas
+        colunas brutas de status e CPF, sem dobrar acentos. Só as demais (cabeçalhos,
+        totais, órgão pagador, legenda) passam por ``fold_text``.
+        """
+        if self._is_detail_line(line, layout or self.LAYOUT_PADRAO):
+            return LINHA_DETALHE, ""
+
+        folded = (line.lower() if line.isascii() else line.translate(_DOBRA)).strip()
+        if folded.startswith(self.FRONTEIRA_PREFIXOS):
+            return LINHA_FRONTEIRA, folded
+        if folded.startswith(self.CABECALHO_PREFIXOS):
+            return LINHA_CABECALHO, folded
+        if "legenda do status" in folded:
+            return LINHA_LEGENDA, folded
+        if (
+            folded.startswith(self.RUIDO_PREFIXOS)
+            or "pag:" in folded
+            or set(line.strip()) == {"="}
+        ):
+            return LINHA_RUIDO, folded
+        if "orgao pagamento:" in folded:
+            return LINHA_ORGAO, folded
+        return LINHA_OUTRA, folded
+
+    def _parse_orgao_pagamento(self, line: str, folded: str | None = None) -> dict[str, str] | None:
+        if folded is None:
+            folded = fold_text(line)
         if "orgao pagamento:" not in folded:
             return None
         try:
@@ -397,58 +848,28 @@ class ETIPITxtRetornoParser(ParseStrategy):
 
         return {"codigo": codigo.strip(), "nome": nome.strip()}
 
-    def _is_detail_line(self, line: str) -> bool:
-        status_code = line[self.STATUS_SLICE].strip().upper()
-        cpf = re.sub(r"\D", "", line[self.CPF_SLICE].strip())
-        return status_code in self.STATUS_MAP and len(cpf) == 11
-
-    def _parse_detail_line(self, line: str, linha_numero: int, competencia: str) -> dict:
-        padded = line.ljust(self.CPF_SLICE.start)
-        status_codigo = padded[self.STATUS_SLICE].strip().upper()
+    def _is_detail_line(self, line: str, layout: LayoutColunas) -> bool:
+        if line[layout.status].strip().upper() not in self.STATUS_MAP:
+            return False
+        cpf = line[layout.cpf].strip()
+        if not cpf.isdecimal():
+            cpf = NAO_DIGITO.sub("", cpf)
+        return len(cpf) == 11
+
+    def _parse_detail_line(
+        self, line: str, linha_numero: int, competencia: str, layout: LayoutColunas
+    ) -> ItemRetorno:
+        status_codigo = line[layout.status].strip().upper()
         if status_codigo not in self.STATUS_MAP:
             raise ValueError(f"Status ETIPI inválido: {status_codigo!r}")
 
-        valor_raw = padded[self.VALOR_SLICE].strip()
+        valor_raw = line[layout.valor].strip()
         try:
-            valor = self._parse_decimal(valor_raw)
+            self._parse_decimal(valor_raw)
         except InvalidOperation as exc:
             raise ValueError(f"Valor inválido na linha {linha_numero}: {valor_raw!r}") from exc
 
-        status_desconto, status_descricao = self.STATUS_MAP[status_codigo]
-        cpf = re.sub(r"\D", "", padded[self.CPF_SLICE].strip())
-        orgao_pagto_codigo = padded[self.ORGAO_PAGTO_SLICE].strip()
-
-        payload = {
-            "status_codigo": status_codigo,
-            "matricula": padded[self.MATRICULA_SLICE].strip(),
-            "nome": padded[self.NOME_SLICE].rstrip(),
-            "cargo": padded[self.CARGO_SLICE].rstrip(),
-            "financiador": padded[self.FIN_SLICE].strip(),
-            "orgao_codigo": padded[self.ORGAO_SLICE].strip(),
-            "lancamento": padded[self.LANCAMENTO_SLICE].strip(),
-            "total_pago": padded[self.TOTAL_PAGO_SLICE].strip(),
-            "valor": valor_raw,
-            "orgao_pagto_codigo": orgao_pagto_codigo,
-            "cpf": cpf,
-        }
-
-        return {
-            "linha_numero": linha_numero,
-            "cpf_cnpj": cpf,
-            "matricula_servidor": payload["matricula"],
-            "nome_servidor": payload["nome"].strip().upper(),
-            "cargo": payload["cargo"].strip() or "-",
-            "competencia": competencia,
-            "valor_descontado": valor,
-            "status_codigo": status_codigo,
-            "status_desconto": status_desconto,
-            "status_descricao": status_descricao,
-            "motivo_rejeicao": status_descricao if status_desconto == "rejeitado" else None,
-            "orgao_codigo": payload["orgao_codigo"],
-            "orgao_pagto_codigo": orgao_pagto_codigo,
-            "orgao_pagto_nome": "",
-            "payload_bruto": payload,
-        }
+        return ItemRetorno(layout, linha_numero, line, competencia)
 
     @staticmethod
     def _parse_decimal(value: str) -> Decimal:
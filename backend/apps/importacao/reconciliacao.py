@@ -1,19 +1,100 @@
 from __future__ import annotations
 
 from calendar import monthrange
+from collections.abc import Iterable
+from dataclasses import dataclass, field
 from datetime import date, datetime
 from decimal import Decimal
 
 from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
 from django.utils import timezone
 
 from apps.associados.models import Associado, only_digits
 from apps.contratos.models import Ciclo, Parcela
 
-from .matching import find_associado
+from .matching import AssociadoMatcher, MatchResult, find_associado_match
+from .logs import ImportacaoLogBuffer
 from .models import ArquivoRetorno, ArquivoRetornoItem, ImportacaoLog
 
 
+# Ordem em que as parcelas da competência são escolhidas para um item.
+PRIORIDADE_STATUS_PARCELA = (
+    Parcela.Status.EM_ABERTO,
+    Parcela.Status.NAO_DESCONTADO,
+    Parcela.Status.FUTURO,
+    Parcela.Status.DESCONTADO,
+)
+
+
+class SeletorParcela:
+    """Escolhe a parcela da competência para um item.
+
+    Vale a primeira por status em PRIORIDADE_STATUS_PARCELA, depois por número
+    do ciclo e da parcela. A mesma ordem existe como expressão SQL (uma consulta
+    travada, para um ou muitos associados) e como chave Python (para quem já
+    tem as parcelas em memória).
+    """
+
+    _posicao = {status: indice for indice, status in enumerate(PRIORIDADE_STATUS_PARCELA)}
+
+    @classmethod
+    def prioridade(cls) -> Case:
+        return Case(
+            *(When(status=status, then=Value(indice)) for status, indice in cls._posicao.items()),
+            output_field=IntegerField(),
+        )
+
+    @classmethod
+    def queryset(cls, associados: Iterable, competencias: Iterable[date], *, travar: bool = True):
+        queryset = (
+            Parcela.objects.select_related(
+                "ciclo",
+                "ciclo__contrato",
+                "ciclo__contrato__associado",
+            )
+            .filter(
+                ciclo__contrato__associado__in=list(associados),
+                referencia_mes__in=list(competencias),
+                status__in=PRIORIDADE_STATUS_PARCELA,
+            )
+            .annotate(prioridade=cls.prioridade())
+            .order_by("prioridade", "ciclo__numero", "numero")
+        )
+        return queryset.select_for_update() if travar else queryset
+
+    @classmethod
+    def escolher(cls, associado: Associado, competencia: date) -> Parcela | None:
+        return cls.queryset([associado], [competencia]).first()
+
+    @classmethod
+    def escolher_muitos(
+        cls, associados: Iterable, competencias: Iterable[date], *, travar: bool = True
+    ) -> dict[tuple[int, date], Parcela]:
+        """Parcela escolhida por (associado_id, competência), em uma única consulta."""
+        escolhidas: dict[tuple[int, date], Parcela] = {}
+        for parcela in cls.queryset(associados, competencias, travar=travar):
+            chave = (parcela.ciclo.contrato.associado_id, parcela.referencia_mes)
+            escolhidas.setdefault(chave, parcela)
+        return escolhidas
+
+    @classmethod
+    def elegivel(cls, parcela: Parcela) -> bool:
+        return parcela.status in cls._posicao
+
+    @classmethod
+    def chave(cls, parcela: Parcela) -> tuple:
+        return (cls._posicao[parcela.status], parcela.ciclo.numero, parcela.numero, parcela.pk or 0)
+
+
+@dataclass(slots=True)
+class _PlanoEncerramento:
+    ciclos: list[Ciclo] = field(default_factory=list)
+    parcelas: list[Parcela] = field(default_factory=list)
+    novos_ciclos: list[Ciclo] = field(default_factory=list)
+    novas_parcelas: list[Parcela] = field(default_factory=list)
+
+
 def parse_competencia(value: str) -> date:
     return datetime.strptime(value, "%m/%Y").date().replace(day=1)
 
@@ -26,13 +107,103 @@ def add_months(base_date: date, months: int) -> date:
     return date(year, month, day)
 
 
+ITEM_FLAGS_ENCERRAMENTO = ["gerou_encerramento", "gerou_novo_ciclo", "updated_at"]
+
+
 class MotorReconciliacao:
-    def __init__(self, arquivo_retorno: ArquivoRetorno):
+    """Reconcilia os itens de um arquivo retorno com as parcelas dos contratos.
+
+    Cada item é resolvido na hora; o encerramento e a renovação dos ciclos que
+    receberam baixa ficam para uma passada única no fim (``_encerrar_ciclos``),
+    que marca ``gerou_encerramento``/``gerou_novo_ciclo`` no item que completou
+    cada ciclo.
+    """
+
+    chunk_size = 1000
+    # Parcelas carregadas para o encerramento são travadas até o fim da transação.
+    travar_parcelas = True
+
+    def __init__(
+        self,
+        arquivo_retorno: ArquivoRetorno,
+        matcher: AssociadoMatcher | None = None,
+        logs: ImportacaoLogBuffer | None = None,
+        particao: int | None = None,
+    ):
         self.arquivo_retorno = arquivo_retorno
+        self.matcher = matcher
+        # Com partição, o motor só enxerga os itens dela (pipeline paralelo).
+        self.particao = particao
+        # Fora de uma importação (uso avulso) cada log é gravado na hora.
+        self.logs = logs or ImportacaoLogBuffer(arquivo_retorno, flush_size=1)
         self.today = timezone.localdate()
+        self._baixas: dict[int, tuple[Ciclo, ArquivoRetornoItem, bool]] = {}
+        self._ciclos: dict[int, Ciclo] = {}
+        self._ciclos_por_contrato: dict[int, dict[int, Ciclo]] = {}
+        self._parcelas_por_ciclo: dict[int, list[Parcela]] = {}
 
+    @transaction.atomic
     def reconciliar(self) -> dict[str, int]:
-        resumo = {
+        itens = self.reconciliar_trecho()
+        while itens:
+            itens = self.reconciliar_trecho(apos_linha=itens[-1].linha_numero)
+
+        self.logs.flush()
+        return self.resumir()
+
+    def reconciliar_trecho(
+        self, *, apos_linha: int = 0, limite: int | None = None
+    ) -> list[ArquivoRetornoItem]:
+        """Reconcilia o próximo trecho de itens pendentes depois de ``apos_linha``.
+
+        O encerramento dos ciclos tocados pelo trecho roda no fim dele. Devolve os
+        itens tratados, em ordem de linha (vazio quando não há mais pendentes).
+        A transação fica a cargo de quem chama.
+        """
+        pendentes = self.arquivo_retorno.itens.filter(
+            processado=False, linha_numero__gt=apos_linha
+        )
+        if self.particao is not None:
+            pendentes = pendentes.filter(particao=self.particao)
+        itens = list(pendentes.order_by("linha_numero")[: limite or self.chunk_size])
+        if itens:
+            self._reconciliar_itens(itens)
+        return itens
+
+    def _reconciliar_itens(self, itens: list[ArquivoRetornoItem]) -> None:
+        for item in itens:
+            self._reconciliar_item(item)
+        gatilhos = self._encerrar_ciclos()
+        ArquivoRetornoItem.objects.bulk_update(
+            gatilhos, ITEM_FLAGS_ENCERRAMENTO, batch_size=self.chunk_size
+        )
+
+    def resumir(self) -> dict[str, int]:
+        """Resumo do arquivo a partir do que já está gravado nos itens processados."""
+        return self.resumir_resultados(
+            self.arquivo_retorno.itens.filter(processado=True)
+            .values_list("resultado_processamento", "gerou_encerramento", "gerou_novo_ciclo")
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+    @classmethod
+    def resumir_resultados(cls, resultados: Iterable[tuple[str, bool, bool]]) -> dict[str, int]:
+        """Resumo de ``(resultado, gerou_encerramento, gerou_novo_ciclo)`` de cada item."""
+        resumo = cls._novo_resumo()
+        for resultado, gerou_encerramento, gerou_novo_ciclo in resultados:
+            cls._acumular_resumo(
+                resumo,
+                {
+                    "resultado": resultado,
+                    "gerou_encerramento": gerou_encerramento,
+                    "gerou_novo_ciclo": gerou_novo_ciclo,
+                },
+            )
+        return resumo
+
+    @staticmethod
+    def _novo_resumo() -> dict[str, int]:
+        return {
             "baixa_efetuada": 0,
             "nao_descontado": 0,
             "pendencias_manuais": 0,
@@ -45,70 +216,58 @@ class MotorReconciliacao:
             "nao_descontados": 0,
         }
 
-        itens = (
-            self.arquivo_retorno.itens.select_related("associado", "parcela")
-            .order_by("linha_numero")
-        )
-        for item in itens:
-            if item.processado:
-                outcome = self._outcome_from_item(item)
-            else:
-                outcome = self.reconciliar_item(item)
-            resultado = outcome["resultado"]
-            if resultado == ArquivoRetornoItem.ResultadoProcessamento.PENDENCIA_MANUAL:
-                resumo["pendencias_manuais"] += 1
-            else:
-                resumo[resultado] += 1
-            if outcome["resultado"] == ArquivoRetornoItem.ResultadoProcessamento.BAIXA_EFETUADA:
-                resumo["efetivados"] += 1
-            if outcome["resultado"] == ArquivoRetornoItem.ResultadoProcessamento.NAO_DESCONTADO:
-                resumo["nao_descontados"] += 1
-            if outcome["gerou_encerramento"]:
-                resumo["encerramentos"] += 1
-            if outcome["gerou_novo_ciclo"]:
-                resumo["novos_ciclos"] += 1
-
-        return resumo
-
-    def _outcome_from_item(self, item: ArquivoRetornoItem) -> dict[str, object]:
-        return {
-            "resultado": item.resultado_processamento,
-            "gerou_encerramento": item.gerou_encerramento,
-            "gerou_novo_ciclo": item.gerou_novo_ciclo,
-        }
+    @staticmethod
+    def _acumular_resumo(resumo: dict[str, int], outcome: dict[str, object]) -> None:
+        resultado = outcome["resultado"]
+        if resultado == ArquivoRetornoItem.ResultadoProcessamento.PENDENCIA_MANUAL:
+            resumo["pendencias_manuais"] += 1
+        else:
+            resumo[resultado] += 1
+        if outcome["resultado"] == ArquivoRetornoItem.ResultadoProcessamento.BAIXA_EFETUADA:
+            resumo["efetivados"] += 1
+        if outcome["resultado"] == ArquivoRetornoItem.ResultadoProcessamento.NAO_DESCONTADO:
+            resumo["nao_descontados"] += 1
+        if outcome["gerou_encerramento"]:
+            resumo["encerramentos"] += 1
+        if outcome["gerou_novo_ciclo"]:
+            resumo["novos_ciclos"] += 1
 
     @transaction.atomic
     def reconciliar_item(self, item: ArquivoRetornoItem) -> dict[str, object]:
+        outcome = self._reconciliar_item(item)
+        if self._encerrar_ciclos():
+            self._salvar(item, ITEM_FLAGS_ENCERRAMENTO)
+        outcome["gerou_encerramento"] = item.gerou_encerramento
+        outcome["gerou_novo_ciclo"] = item.gerou_novo_ciclo
+        return outcome
+
+    def _reconciliar_item(self, item: ArquivoRetornoItem) -> dict[str, object]:
         cpf = only_digits(item.cpf_cnpj)
-        associado = find_associado(
-            cpf=cpf,
-            matricula=item.matricula_servidor,
-            nome=item.nome_servidor,
-            orgao=item.orgao_pagto_nome,
-            orgao_alternativo=item.orgao_pagto_codigo,
-            orgao_codigo=item.orgao_codigo,
-        )
+        match = self._resolver_associado(item, cpf)
+        associado = match.associado
+        item.regra_casamento = match.regra
         if not associado:
             item.associado = None
             item.parcela = None
             item.processado = True
             item.resultado_processamento = ArquivoRetornoItem.ResultadoProcessamento.NAO_ENCONTRADO
             item.observacao = "Associado não encontrado por CPF, matrícula ou nome/órgão."
-            item.save(
-                update_fields=[
+            self._salvar(
+                item,
+                [
                     "associado",
                     "parcela",
                     "processado",
                     "resultado_processamento",
                     "observacao",
+                    "regra_casamento",
                     "updated_at",
-                ]
+                ],
             )
-            ImportacaoLog.objects.create(
-                arquivo_retorno=self.arquivo_retorno,
-                tipo=ImportacaoLog.Tipo.RECONCILIACAO,
-                mensagem="Associado não encontrado durante a reconciliação.",
-                dados={
+            self.logs.add(
+                ImportacaoLog.Tipo.RECONCILIACAO,
+                "Associado não encontrado durante a reconciliação.",
+                {
                     "linha_numero": item.linha_numero,
                     "cpf_cnpj": cpf,
                     "matricula": item.matricula_servidor,
@@ -129,21 +288,22 @@ class MotorReconciliacao:
             item.processado = True
             item.resultado_processamento = ArquivoRetornoItem.ResultadoProcessamento.CICLO_ABERTO
             item.observacao = "Nenhuma parcela elegível foi encontrada para a competência."
-            item.save(
-                update_fields=[
+            self._salvar(
+                item,
+                [
                     "associado",
                     "parcela",
                     "processado",
                     "resultado_processamento",
                     "observacao",
+                    "regra_casamento",
                     "updated_at",
-                ]
+                ],
             )
-            ImportacaoLog.objects.create(
-                arquivo_retorno=self.arquivo_retorno,
-                tipo=ImportacaoLog.Tipo.RECONCILIACAO,
-                mensagem="Item sem parcela em aberto para a competência.",
-                dados={"linha_numero": item.linha_numero, "cpf_cnpj": cpf},
+            self.logs.add(
+                ImportacaoLog.Tipo.RECONCILIACAO,
+                "Item sem parcela em aberto para a competência.",
+                {"linha_numero": item.linha_numero, "cpf_cnpj": cpf},
             )
             return {
                 "resultado": ArquivoRetornoItem.ResultadoProcessamento.CICLO_ABERTO,
@@ -168,29 +328,32 @@ class MotorReconciliacao:
             outcome = self._processar_erro(item, f"Status ETIPI desconhecido: {item.status_codigo}")
 
         item.processado = True
-        item.save()
+        self._salvar(item)
         return outcome
 
-    def _buscar_parcela(self, associado: Associado, competencia: date) -> Parcela | None:
-        queryset = Parcela.objects.select_for_update().select_related(
-            "ciclo",
-            "ciclo__contrato",
-            "ciclo__contrato__associado",
-        ).filter(
-            ciclo__contrato__associado=associado,
-            referencia_mes=competencia,
-        )
+    def _salvar(self, obj, update_fields: list[str] | None = None) -> None:
+        obj.save(update_fields=update_fields)
+
+    def _resolver_associado(self, item: ArquivoRetornoItem, cpf: str) -> MatchResult:
+        criterios = {
+            "cpf": cpf,
+            "matricula": item.matricula_servidor,
+            "nome": item.nome_servidor,
+            "orgao": item.orgao_pagto_nome,
+            "orgao_alternativo": item.orgao_pagto_codigo,
+            "orgao_codigo": item.orgao_codigo,
+        }
+        if self.matcher is None:
+            return find_associado_match(**criterios)
 
-        for status in (
-            Parcela.Status.EM_ABERTO,
-            Parcela.Status.NAO_DESCONTADO,
-            Parcela.Status.FUTURO,
-            Parcela.Status.DESCONTADO,
-        ):
-            parcela = queryset.filter(status=status).order_by("ciclo__numero", "numero").first()
-            if parcela:
-                return parcela
-        return None
+        associado_id, regra = self.matcher.resolver(**criterios)
+        if associado_id is None:
+            return MatchResult()
+        associado = Associado.objects.filter(pk=associado_id).first()
+        return MatchResult(associado, regra if associado else "")
+
+    def _buscar_parcela(self, associado: Associado, competencia: date) -> Parcela | None:
+        return SeletorParcela.escolher(associado, competencia)
 
     def _processar_efetivado(
         self,
@@ -203,11 +366,10 @@ class MotorReconciliacao:
             item.observacao = (
                 "Divergência de valor entre arquivo retorno e parcela. Revisão manual necessária."
             )
-            ImportacaoLog.objects.create(
-                arquivo_retorno=self.arquivo_retorno,
-                tipo=ImportacaoLog.Tipo.RECONCILIACAO,
-                mensagem="Divergência de valor detectada.",
-                dados={
+            self.logs.add(
+                ImportacaoLog.Tipo.RECONCILIACAO,
+                "Divergência de valor detectada.",
+                {
                     "linha_numero": item.linha_numero,
                     "valor_arquivo": str(item.valor_descontado),
                     "valor_parcela": str(parcela.valor),
@@ -219,6 +381,7 @@ class MotorReconciliacao:
                 "gerou_novo_ciclo": False,
             }
 
+        status_anterior = parcela.status
         if parcela.status != Parcela.Status.DESCONTADO:
             parcela.status = Parcela.Status.DESCONTADO
             if not parcela.data_pagamento:
@@ -230,7 +393,7 @@ class MotorReconciliacao:
                     f"Valor da parcela: {parcela.valor}."
                 )
             parcela.observacao = self._append_note(parcela.observacao, nota)
-            parcela.save(update_fields=["status", "data_pagamento", "observacao", "updated_at"])
+            self._salvar(parcela, ["status", "data_pagamento", "observacao", "updated_at"])
 
         item.resultado_processamento = ArquivoRetornoItem.ResultadoProcessamento.BAIXA_EFETUADA
         if permitir_diferenca:
@@ -238,13 +401,11 @@ class MotorReconciliacao:
         else:
             item.observacao = "Parcela baixada automaticamente."
 
-        post_result = self._pos_processar_ciclo(parcela.ciclo)
-        item.gerou_encerramento = post_result["gerou_encerramento"]
-        item.gerou_novo_ciclo = post_result["gerou_novo_ciclo"]
-
+        self._registrar_baixa(parcela.ciclo, item, baixou=status_anterior != parcela.status)
         return {
             "resultado": ArquivoRetornoItem.ResultadoProcessamento.BAIXA_EFETUADA,
-            **post_result,
+            "gerou_encerramento": False,
+            "gerou_novo_ciclo": False,
         }
 
     def _processar_rejeitado(
@@ -256,12 +417,12 @@ class MotorReconciliacao:
         if parcela.status != Parcela.Status.NAO_DESCONTADO:
             parcela.status = Parcela.Status.NAO_DESCONTADO
             parcela.observacao = self._append_note(parcela.observacao, item.status_descricao)
-            parcela.save(update_fields=["status", "observacao", "updated_at"])
+            self._salvar(parcela, ["status", "observacao", "updated_at"])
 
         if associado.status != Associado.Status.INADIMPLENTE:
             associado.status = Associado.Status.INADIMPLENTE
             associado.observacao = self._append_note(associado.observacao, item.status_descricao)
-            associado.save(update_fields=["status", "observacao", "updated_at"])
+            self._salvar(associado, ["status", "observacao", "updated_at"])
 
         item.motivo_rejeicao = item.status_descricao
         item.resultado_processamento = ArquivoRetornoItem.ResultadoProcessamento.NAO_DESCONTADO
@@ -277,15 +438,14 @@ class MotorReconciliacao:
     ) -> dict[str, object]:
         if parcela.status == Parcela.Status.FUTURO:
             parcela.status = Parcela.Status.EM_ABERTO
-            parcela.save(update_fields=["status", "updated_at"])
+            self._salvar(parcela, ["status", "updated_at"])
 
         item.resultado_processamento = ArquivoRetornoItem.ResultadoProcessamento.PENDENCIA_MANUAL
         item.observacao = item.status_descricao
-        ImportacaoLog.objects.create(
-            arquivo_retorno=self.arquivo_retorno,
-            tipo=ImportacaoLog.Tipo.RECONCILIACAO,
-            mensagem="Pendência manual criada pelo arquivo retorno.",
-            dados={"linha_numero": item.linha_numero, "status_codigo": item.status_codigo},
+        self.logs.add(
+            ImportacaoLog.Tipo.RECONCILIACAO,
+            "Pendência manual criada pelo arquivo retorno.",
+            {"linha_numero": item.linha_numero, "status_codigo": item.status_codigo},
         )
         return {
             "resultado": ArquivoRetornoItem.ResultadoProcessamento.PENDENCIA_MANUAL,
@@ -298,11 +458,10 @@ class MotorReconciliacao:
     ) -> dict[str, object]:
         item.resultado_processamento = ArquivoRetornoItem.ResultadoProcessamento.ERRO
         item.observacao = mensagem
-        ImportacaoLog.objects.create(
-            arquivo_retorno=self.arquivo_retorno,
-            tipo=ImportacaoLog.Tipo.ERRO,
-            mensagem=mensagem,
-            dados={"linha_numero": item.linha_numero},
+        self.logs.add(
+            ImportacaoLog.Tipo.ERRO,
+            mensagem,
+            {"linha_numero": item.linha_numero},
         )
         return {
             "resultado": ArquivoRetornoItem.ResultadoProcessamento.ERRO,
@@ -310,35 +469,100 @@ class MotorReconciliacao:
             "gerou_novo_ciclo": False,
         }
 
-    def _pos_processar_ciclo(self, ciclo: Ciclo) -> dict[str, bool]:
-        ciclo = (
-            Ciclo.objects.select_related("contrato")
-            .prefetch_related("parcelas", "contrato__ciclos__parcelas")
-            .get(pk=ciclo.pk)
+    def _registrar_baixa(
+        self, ciclo: Ciclo, item: ArquivoRetornoItem, *, baixou: bool
+    ) -> None:
+        """Guarda o ciclo para o encerramento, junto do item que o completou.
+
+        É o último item que de fato baixou uma parcela do ciclo; se nenhum
+        baixou (parcelas já descontadas), o primeiro que passou por ele.
+        """
+        registrado = self._baixas.get(ciclo.pk)
+        if registrado is None or baixou:
+            self._baixas[ciclo.pk] = (ciclo, item, baixou)
+
+    def _encerrar_ciclos(self) -> list[ArquivoRetornoItem]:
+        """Encerra e renova, de uma vez, os ciclos que receberam baixa.
+
+        Devolve os itens cujas flags ``gerou_*`` foram ligadas; gravá-los fica
+        a cargo de quem chama.
+        """
+        baixas = sorted(
+            self._baixas.values(), key=lambda baixa: (baixa[0].contrato_id, baixa[0].numero)
         )
-        if ciclo.parcelas.exclude(status=Parcela.Status.DESCONTADO).exists():
-            return {"gerou_encerramento": False, "gerou_novo_ciclo": False}
+        self._baixas = {}
+        if not baixas:
+            return []
+
+        self._preparar_encerramento({ciclo.contrato_id for ciclo, _, _ in baixas})
+        plano = _PlanoEncerramento()
+        gatilhos: list[ArquivoRetornoItem] = []
+        for ciclo, item, _ in baixas:
+            gerou_encerramento, gerou_novo_ciclo = self._fechar_ciclo(
+                self._ciclos.get(ciclo.pk, ciclo), plano
+            )
+            if gerou_encerramento or gerou_novo_ciclo:
+                item.gerou_encerramento = gerou_encerramento
+                item.gerou_novo_ciclo = gerou_novo_ciclo
+                gatilhos.append(item)
+
+        self._gravar_encerramentos(plano)
+        return gatilhos
+
+    def _preparar_encerramento(self, contrato_ids: set[int]) -> None:
+        self._ciclos = {}
+        self._ciclos_por_contrato = {}
+        self._parcelas_por_ciclo = {}
+        self._carregar_ciclos(contrato_ids)
+
+    def _carregar_ciclos(self, contrato_ids) -> None:
+        for ciclo in Ciclo.objects.select_related("contrato").filter(
+            contrato_id__in=list(contrato_ids)
+        ):
+            self._ciclos[ciclo.pk] = ciclo
+            self._ciclos_por_contrato.setdefault(ciclo.contrato_id, {})[ciclo.numero] = ciclo
+
+        parcelas = (
+            Parcela.objects.select_related("ciclo__contrato")
+            .filter(ciclo__contrato_id__in=list(contrato_ids))
+            .order_by("ciclo_id", "numero")
+        )
+        if self.travar_parcelas:
+            parcelas = parcelas.select_for_update()
+        for parcela in parcelas:
+            parcela.ciclo = self._ciclos.get(parcela.ciclo_id, parcela.ciclo)
+            self._indexar_parcela(parcela)
+
+    def _indexar_parcela(self, parcela: Parcela) -> None:
+        self._parcelas_por_ciclo.setdefault(id(parcela.ciclo), []).append(parcela)
+
+    def _fechar_ciclo(self, ciclo: Ciclo, plano: _PlanoEncerramento) -> tuple[bool, bool]:
+        parcelas = self._parcelas_por_ciclo.get(id(ciclo), [])
+        if any(parcela.status != Parcela.Status.DESCONTADO for parcela in parcelas):
+            return False, False
 
         gerou_encerramento = False
         gerou_novo_ciclo = False
 
         if ciclo.status != Ciclo.Status.CICLO_RENOVADO:
             ciclo.status = Ciclo.Status.CICLO_RENOVADO
-            ciclo.save(update_fields=["status", "updated_at"])
+            plano.ciclos.append(ciclo)
             gerou_encerramento = True
 
-        proximo_ciclo = ciclo.contrato.ciclos.filter(numero=ciclo.numero + 1).first()
+        ciclos_contrato = self._ciclos_por_contrato.setdefault(ciclo.contrato_id, {})
+        proximo_ciclo = ciclos_contrato.get(ciclo.numero + 1)
         if proximo_ciclo:
             if proximo_ciclo.status == Ciclo.Status.FUTURO:
                 proximo_ciclo.status = Ciclo.Status.ABERTO
-                proximo_ciclo.save(update_fields=["status", "updated_at"])
-                proximo_ciclo.parcelas.filter(status=Parcela.Status.FUTURO).update(
-                    status=Parcela.Status.EM_ABERTO
-                )
+                plano.ciclos.append(proximo_ciclo)
+                for parcela in self._parcelas_por_ciclo.get(id(proximo_ciclo), []):
+                    if parcela.status == Parcela.Status.FUTURO:
+                        parcela.status = Parcela.Status.EM_ABERTO
+                        plano.parcelas.append(parcela)
                 gerou_novo_ciclo = True
         else:
             competencia_inicial = add_months(ciclo.data_fim.replace(day=1), 1)
-            proximo_ciclo = Ciclo.objects.create(
+            proximo_ciclo = Ciclo(
                 contrato=ciclo.contrato,
                 numero=ciclo.numero + 1,
                 data_inicio=competencia_inicial,
@@ -348,26 +572,56 @@ class MotorReconciliacao:
                     Decimal("0.01")
                 ),
             )
-            novas_parcelas = []
+            ciclos_contrato[proximo_ciclo.numero] = proximo_ciclo
+            plano.novos_ciclos.append(proximo_ciclo)
             for numero in range(3):
                 referencia = add_months(competencia_inicial, numero)
-                novas_parcelas.append(
-                    Parcela(
-                        ciclo=proximo_ciclo,
-                        numero=numero + 1,
-                        referencia_mes=referencia,
-                        valor=ciclo.contrato.valor_mensalidade,
-                        data_vencimento=referencia,
-                        status=Parcela.Status.EM_ABERTO,
-                    )
+                parcela = Parcela(
+                    ciclo=proximo_ciclo,
+                    numero=numero + 1,
+                    referencia_mes=referencia,
+                    valor=ciclo.contrato.valor_mensalidade,
+                    data_vencimento=referencia,
+                    status=Parcela.Status.EM_ABERTO,
                 )
-            Parcela.objects.bulk_create(novas_parcelas)
+                plano.novas_parcelas.append(parcela)
+                self._indexar_parcela(parcela)
             gerou_novo_ciclo = True
 
-        return {
-            "gerou_encerramento": gerou_encerramento,
-            "gerou_novo_ciclo": gerou_novo_ciclo,
+        return gerou_encerramento, gerou_novo_ciclo
+
+    def _gravar_encerramentos(self, plano: _PlanoEncerramento) -> None:
+        agora = timezone.now()
+        # Um ciclo aberto por outro pode ser encerrado logo depois na mesma passada.
+        ciclos = list({id(ciclo): ciclo for ciclo in plano.ciclos}.values())
+        for obj in (*ciclos, *plano.parcelas):
+            obj.updated_at = agora
+        if ciclos:
+            Ciclo.objects.bulk_update(ciclos, ["status", "updated_at"], batch_size=self.chunk_size)
+        if plano.parcelas:
+            Parcela.objects.bulk_update(
+                plano.parcelas, ["status", "updated_at"], batch_size=self.chunk_size
+            )
+        if plano.novos_ciclos:
+            Ciclo.objects.bulk_create(plano.novos_ciclos, batch_size=self.chunk_size)
+            self._garantir_pks(Ciclo, plano.novos_ciclos, "contrato_id", "numero")
+            Parcela.objects.bulk_create(plano.novas_parcelas, batch_size=self.chunk_size)
+            self._garantir_pks(Parcela, plano.novas_parcelas, "ciclo_id", "numero")
+
+    @staticmethod
+    def _garantir_pks(model, objetos: list, campo_grupo: str, campo_chave: str) -> None:
+        """Preenche pks após bulk_create em bancos que não as devolvem (MySQL)."""
+        sem_pk = [obj for obj in objetos if obj.pk is None]
+        if not sem_pk:
+            return
+        pks = {
+            (grupo, chave): pk
+            for pk, grupo, chave in model.objects.filter(
+                **{f"{campo_grupo}__in": {getattr(obj, campo_grupo) for obj in sem_pk}}
+            ).values_list("pk", campo_grupo, campo_chave)
         }
+        for obj in sem_pk:
+            obj.pk = pks[(getattr(obj, campo_grupo), getattr(obj, campo_chave))]
 
     @staticmethod
     def _append_note(base: str, note: str) -> str:
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from datetime import date
+
+from django.utils import timezone
+
+from apps.associados.models import Associado, only_digits
+from apps.contratos.models import Contrato, Parcela
+
+from .matching import AssociadoMatcher, MatchResult
+from .models import ArquivoRetornoItem
+from .reconciliacao import MotorReconciliacao, SeletorParcela
+
+ITEM_UPDATE_FIELDS = [
+    "associado",
+    "parcela",
+    "processado",
+    "resultado_processamento",
+    "observacao",
+    "regra_casamento",
+    "motivo_rejeicao",
+    "gerou_encerramento",
+    "gerou_novo_ciclo",
+    "updated_at",
+]
+
+
+class MotorReconciliacaoEmLote(MotorReconciliacao):
+    """Reconciliação de cada trecho do arquivo sobre um retrato em memória.
+
+    Associados, contratos, ciclos e parcelas envolvidos no trecho são carregados
+    em poucas consultas; os itens passam pelas mesmas regras de
+    ``MotorReconciliacao``, em ordem de linha, alterando apenas os objetos em
+    memória. Ao final do trecho tudo é gravado com bulk_create/bulk_update. O
+    resumo e o estado final dos itens são os mesmos do caminho item a item.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._matches: dict[int, MatchResult] = {}
+        self._candidatas: dict[tuple[int, date], list[Parcela]] = {}
+        self._alterados: dict[type, dict[int, tuple[object, set[str]]]] = {}
+
+    def _reconciliar_itens(self, itens: list[ArquivoRetornoItem]) -> None:
+        self._carregar(itens)
+        for item in itens:
+            self._reconciliar_item(item)
+        self._encerrar_ciclos()
+        self._gravar(itens)
+
+    def _carregar(self, itens: list[ArquivoRetornoItem]) -> None:
+        # Cada trecho parte de um retrato novo: o anterior já foi gravado.
+        self._candidatas = {}
+        self._alterados = {}
+        self._ciclos = {}
+        self._ciclos_por_contrato = {}
+        self._parcelas_por_ciclo = {}
+        self._carregar_ciclos(self._contratos_de(self._resolver_matches(itens)))
+
+    def _resolver_matches(self, itens: list[ArquivoRetornoItem]) -> dict[int, Associado]:
+        """Resolve os associados do trecho; os matches ficam por item (``id``)."""
+        matcher = self.matcher or AssociadoMatcher.carregar()
+        ids_por_item: dict[int, tuple[int | None, str]] = {}
+        for item in itens:
+            ids_por_item[id(item)] = matcher.resolver(
+                cpf=only_digits(item.cpf_cnpj),
+                matricula=item.matricula_servidor,
+                nome=item.nome_servidor,
+                orgao=item.orgao_pagto_nome,
+                orgao_alternativo=item.orgao_pagto_codigo,
+                orgao_codigo=item.orgao_codigo,
+            )
+
+        associados = Associado.objects.in_bulk(
+            {associado_id for associado_id, _ in ids_por_item.values() if associado_id}
+        )
+        self._matches = {}
+        for item_id, (associado_id, regra) in ids_por_item.items():
+            associado = associados.get(associado_id)
+            self._matches[item_id] = MatchResult(associado, regra if associado else "")
+        return associados
+
+    @staticmethod
+    def _contratos_de(associados: dict[int, Associado]) -> list[int]:
+        # O filtro por associado atravessa o contrato sem olhar soft delete,
+        # como ``ciclo__contrato__associado`` no caminho item a item.
+        return list(
+            Contrato.all_objects.filter(associado_id__in=list(associados)).values_list(
+                "id", flat=True
+            )
+        )
+
+    def _preparar_encerramento(self, contrato_ids: set[int]) -> None:
+        # Ciclos e parcelas já estão em memória desde _carregar, com as baixas aplicadas.
+        pass
+
+    def _indexar_parcela(self, parcela: Parcela) -> None:
+        super()._indexar_parcela(parcela)
+        chave = (parcela.ciclo.contrato.associado_id, parcela.referencia_mes)
+        self._candidatas.setdefault(chave, []).append(parcela)
+
+    def _resolver_associado(self, item: ArquivoRetornoItem, cpf: str) -> MatchResult:
+        return self._matches[id(item)]
+
+    def _buscar_parcela(self, associado: Associado, competencia: date) -> Parcela | None:
+        elegiveis = [
+            parcela
+            for parcela in self._candidatas.get((associado.pk, competencia), ())
+            if SeletorParcela.elegivel(parcela)
+        ]
+        return min(elegiveis, key=SeletorParcela.chave, default=None)
+
+    def _salvar(self, obj, update_fields: list[str] | None = None) -> None:
+        # Itens são gravados todos juntos no fim, em _gravar.
+        if isinstance(obj, ArquivoRetornoItem):
+            return
+        # bulk_update só grava os campos declarados: sem eles nada além de
+        # updated_at seria persistido.
+        if not update_fields:
+            raise ValueError(
+                f"_salvar em lote exige update_fields para {type(obj).__name__}."
+            )
+        alterados = self._alterados.setdefault(type(obj), {})
+        _, campos = alterados.setdefault(id(obj), (obj, set()))
+        campos.update(update_fields)
+
+    def _gravar(self, itens: list[ArquivoRetornoItem]) -> None:
+        agora = timezone.now()
+        for model, alterados in self._alterados.items():
+            objetos = [obj for obj, _ in alterados.values()]
+            campos = set().union(*(campos for _, campos in alterados.values()))
+            campos.discard("updated_at")
+            for obj in objetos:
+                obj.updated_at = agora
+            model.objects.bulk_update(
+                objetos, [*sorted(campos), "updated_at"], batch_size=self.chunk_size
+            )
+
+        for item in itens:
+            item.updated_at = agora
+        ArquivoRetornoItem.objects.bulk_update(
+            itens, ITEM_UPDATE_FIELDS, batch_size=self.chunk_size
+        )
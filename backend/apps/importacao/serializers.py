@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from django.utils import timezone
 from rest_framework import serializers
 
 from .models import ArquivoRetorno, ArquivoRetornoItem
@@ -28,6 +29,20 @@ class ArquivoRetornoResumoSerializer(serializers.Serializer):
 
 class ArquivoRetornoUploadSerializer(serializers.Serializer):
     arquivo = serializers.FileField()
+    force = serializers.BooleanField(required=False, default=False)
+
+
+class ArquivoRetornoUploadLoteSerializer(serializers.Serializer):
+    arquivos = serializers.ListField(child=serializers.FileField(), allow_empty=False)
+    force = serializers.BooleanField(required=False, default=False)
+
+
+class ArquivoRetornoSimularSerializer(serializers.Serializer):
+    arquivo = serializers.FileField()
+
+
+class ArquivoRetornoReprocessarSerializer(serializers.Serializer):
+    incremental = serializers.BooleanField(required=False, default=False)
 
 
 class ArquivoRetornoItemSerializer(serializers.ModelSerializer):
@@ -54,6 +69,7 @@ class ArquivoRetornoItemSerializer(serializers.ModelSerializer):
             "orgao_pagto_nome",
             "resultado_processamento",
             "observacao",
+            "regra_casamento",
             "gerou_encerramento",
             "gerou_novo_ciclo",
             "associado_nome",
@@ -61,6 +77,20 @@ class ArquivoRetornoItemSerializer(serializers.ModelSerializer):
         ]
 
 
+class ArquivoRetornoSimulacaoItemSerializer(ArquivoRetornoItemSerializer):
+    class Meta(ArquivoRetornoItemSerializer.Meta):
+        # Itens simulados não são gravados e não têm id.
+        fields = [field for field in ArquivoRetornoItemSerializer.Meta.fields if field != "id"]
+
+
+class ArquivoRetornoSimulacaoSerializer(serializers.Serializer):
+    arquivo_nome = serializers.CharField()
+    total_registros = serializers.IntegerField()
+    erros = serializers.IntegerField()
+    resumo = ArquivoRetornoResumoSerializer()
+    itens = ArquivoRetornoSimulacaoItemSerializer(many=True)
+
+
 class ArquivoRetornoListSerializer(serializers.ModelSerializer):
     competencia_display = serializers.SerializerMethodField()
     sistema_origem = serializers.CharField(source="orgao_origem", read_only=True)
@@ -96,4 +126,84 @@ class ArquivoRetornoListSerializer(serializers.ModelSerializer):
 
 class ArquivoRetornoDetailSerializer(ArquivoRetornoListSerializer):
     class Meta(ArquivoRetornoListSerializer.Meta):
-        fields = ArquivoRetornoListSerializer.Meta.fields + ["arquivo_url"]
+        fields = ArquivoRetornoListSerializer.Meta.fields + ["arquivo_url", "metricas"]
+
+
+class ArquivoRetornoProgressoSerializer(serializers.ModelSerializer):
+    """Progresso leve para polling/SSE, calculado só com colunas de ArquivoRetorno."""
+
+    CAMPOS_MODELO = (
+        "id",
+        "status",
+        "etapa",
+        "total_registros",
+        "processados",
+        "etapa_iniciada_em",
+        "etapa_processados_inicio",
+        "updated_at",
+    )
+
+    percentual = serializers.SerializerMethodField()
+    itens_por_segundo = serializers.SerializerMethodField()
+    eta_segundos = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArquivoRetorno
+        fields = [
+            "id",
+            "status",
+            "etapa",
+            "total_registros",
+            "processados",
+            "percentual",
+            "itens_por_segundo",
+            "eta_segundos",
+            "etapa_iniciada_em",
+            "updated_at",
+        ]
+
+    def get_percentual(self, obj: ArquivoRetorno) -> float | None:
+        if obj.status == ArquivoRetorno.Status.CONCLUIDO:
+            return 100.0
+        if not obj.total_registros:
+            return None
+        return round(min(obj.processados / obj.total_registros, 1) * 100, 1)
+
+    def get_itens_por_segundo(self, obj: ArquivoRetorno) -> float | None:
+        if obj.etapa != ArquivoRetorno.Etapa.RECONCILIACAO or not obj.etapa_iniciada_em:
+            return None
+        feitos = obj.processados - obj.etapa_processados_inicio
+        # Vazão até o último checkpoint gravado, não até agora: não cai entre trechos.
+        decorrido = (obj.updated_at - obj.etapa_iniciada_em).total_seconds()
+        if feitos <= 0 or decorrido <= 0:
+            return None
+        return round(feitos / decorrido, 1)
+
+    def get_eta_segundos(self, obj: ArquivoRetorno) -> int | None:
+        vazao = self.get_itens_por_segundo(obj)
+        if not vazao or obj.status != ArquivoRetorno.Status.PROCESSANDO:
+            return None
+        restante = max(obj.total_registros - obj.processados, 0) / vazao
+        decorrido_desde_checkpoint = (timezone.now() - obj.updated_at).total_seconds()
+        return max(round(restante - decorrido_desde_checkpoint), 0)
+
+
+class ArquivoRetornoLoteDuplicadoSerializer(serializers.Serializer):
+    arquivo_nome = serializers.CharField()
+    duplicado_de = serializers.CharField()
+
+
+class ArquivoRetornoLoteRejeitadoSerializer(serializers.Serializer):
+    arquivo_nome = serializers.CharField()
+    erros = serializers.JSONField()
+
+
+class ArquivoRetornoLoteSerializer(serializers.Serializer):
+    lote = serializers.UUIDField()
+    status = serializers.ChoiceField(choices=ArquivoRetorno.Status.choices)
+    total_arquivos = serializers.IntegerField()
+    totais = serializers.DictField(child=serializers.IntegerField())
+    arquivos = ArquivoRetornoDetailSerializer(many=True)
+    # Só na resposta do upload: o que ficou fora do lote.
+    duplicados = ArquivoRetornoLoteDuplicadoSerializer(many=True, required=False)
+    rejeitados = ArquivoRetornoLoteRejeitadoSerializer(many=True, required=False)
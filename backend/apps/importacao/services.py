@@ -1,66 +1,763 @@
 from __future__ import annotations
 
+import json
 import logging
 import re
-from collections import Counter
-from datetime import datetime
+import tempfile
+import zipfile
+from collections import defaultdict
+from collections.abc import Iterable, Iterator, Mapping
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta
+from itertools import islice
 from pathlib import Path
 from uuid import uuid4
 
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.files.base import File
 from django.core.files.storage import default_storage
-from django.db import transaction
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
 from django.utils import timezone
 from django.utils.text import get_valid_filename
 from rest_framework.exceptions import ValidationError
 
-from .matching import find_associado
+from .artifacts import DigestReader, ParseArtifactStore, digest_file
+from .logs import ImportacaoLogBuffer
+from .matching import AssociadoMatcher
+from .metricas import MedidorEtapas, somar_metricas
 from .models import ArquivoRetorno, ArquivoRetornoItem, ImportacaoLog, PagamentoMensalidade
-from .parsers import ETIPITxtRetornoParser, normalize_lines
+from .parsers import EncodingSniff, ETIPITxtRetornoParser, RetornoMeta
 from .reconciliacao import MotorReconciliacao
+from .reconciliacao_lote import MotorReconciliacaoEmLote
+from .simulacao import MotorSimulacao
 from .validators import ArquivoRetornoValidator
 
 logger = logging.getLogger(__name__)
 
+OBSERVACAO_CPF_DUPLICADO = (
+    "CPF duplicado no mesmo arquivo retorno. "
+    "As linhas foram isoladas da baixa automática para revisão manual."
+)
+
+class ProcessamentoAssumido(Exception):
+    """A varredura de parados assumiu o arquivo; esta execução não é mais a dona."""
+
+
+RESULTADOS_REPROCESSAVEIS = (
+    ArquivoRetornoItem.ResultadoProcessamento.NAO_ENCONTRADO,
+    ArquivoRetornoItem.ResultadoProcessamento.ERRO,
+    ArquivoRetornoItem.ResultadoProcessamento.CICLO_ABERTO,
+    ArquivoRetornoItem.ResultadoProcessamento.PENDENCIA_MANUAL,
+)
+
 
 def competencia_to_date(value: str):
     return datetime.strptime(value, "%m/%Y").date().replace(day=1)
 
 
+def data_geracao_to_date(value: str) -> date:
+    """Data de geração do cabeçalho; ausente ou ilegível ordena antes de todas."""
+    try:
+        return datetime.strptime(value, "%d/%m/%Y").date()
+    except (TypeError, ValueError):
+        return date.min
+
+
 class ArquivoRetornoService:
     parser_class = ETIPITxtRetornoParser
+    chunk_size = 1000
 
     def __init__(self):
         self.parser = self.parser_class()
+        self.artifacts = ParseArtifactStore(self.parser)
+        # Substituído a cada processar(); fora dele as medições não são gravadas.
+        self.medidor = MedidorEtapas()
+        # Arquivos que esperam atrás do atual (resto do lote, fila local): o
+        # heartbeat da execução renova o updated_at deles também.
+        self.aguardando: list[int] = []
 
-    def upload(self, arquivo, user) -> ArquivoRetorno:
-        ArquivoRetornoValidator.validar_tamanho(arquivo)
-        formato = ArquivoRetornoValidator.validar_formato(getattr(arquivo, "name", ""))
+    def upload(self, arquivo, user, *, force: bool = False) -> ArquivoRetorno:
+        """Registra o upload e dispara o processamento.
 
-        raw_bytes = arquivo.read()
-        if not raw_bytes:
-            raise ValidationError({"arquivo": "O arquivo enviado está vazio."})
+        Um arquivo idêntico (mesmo sha256) já concluído para a mesma competência
+        não é processado de novo: o ArquivoRetorno existente é devolvido com
+        ``reaproveitado = True``. ``force`` ignora esse atalho, mas o conteúdo
+        continua armazenado uma única vez.
+        """
+        formato, meta, sniff = self._validar_envio(arquivo)
+        safe_name, storage_name, digest = self._armazenar(arquivo)
+        arquivo_retorno = self._registrar_upload(
+            user,
+            safe_name=safe_name,
+            storage_name=storage_name,
+            digest=digest,
+            formato=formato,
+            meta=meta,
+            sniff=sniff,
+            force=force,
+        )
+        if arquivo_retorno.reaproveitado:
+            return arquivo_retorno
 
-        text, _encoding = self.parser.decode_bytes(raw_bytes)
-        lines = normalize_lines(text)
-        ArquivoRetornoValidator.validar_cabecalho(lines)
-        meta = self.parser.extract_meta(lines)
+        self._dispatch_processamento(arquivo_retorno.id)
+        arquivo_retorno.refresh_from_db()
+        arquivo_retorno.reaproveitado = False
+        return arquivo_retorno
+
+    def upload_lote(self, arquivos, user, *, force: bool = False) -> dict[str, object]:
+        """Registra vários arquivos retorno, soltos ou dentro de ZIPs, em um lote.
 
+        Cada arquivo válido vira um ArquivoRetorno com o mesmo ``lote`` e um
+        ``lote_ordem``, que é a ordem de reconciliação: competência, entidade,
+        data de geração e nome, de modo que uma correção reenviada entra depois
+        do original. Arquivos inválidos e conteúdos repetidos no envio só são
+        relatados; um conteúdo já concluído é reaproveitado como em ``upload``.
+        O processamento do lote roda em ``processar_lote``.
+        """
+        lote = uuid4()
+        rejeitados: list[dict] = []
+        duplicados: list[dict] = []
+        registrados: list[ArquivoRetorno] = []
+        with ExitStack() as pilha:
+            envios = []
+            for nome, arquivo in self._expandir_lote(arquivos, pilha, rejeitados):
+                try:
+                    formato, meta, sniff = self._validar_envio(arquivo)
+                except ValidationError as exc:
+                    rejeitados.append({"arquivo_nome": nome, "erros": exc.detail})
+                    continue
+                envios.append((nome, arquivo, formato, meta, sniff))
+            if not envios:
+                raise ValidationError(
+                    {
+                        "arquivos": "Nenhum arquivo retorno válido no envio.",
+                        "rejeitados": rejeitados,
+                    }
+                )
+
+            envios.sort(
+                key=lambda envio: (
+                    competencia_to_date(envio[3].competencia),
+                    envio[3].entidade,
+                    data_geracao_to_date(envio[3].data_geracao),
+                    envio[0],
+                )
+            )
+            vistos: dict[str, str] = {}
+            for nome, arquivo, formato, meta, sniff in envios:
+                safe_name, storage_name, digest = self._armazenar(arquivo)
+                if digest in vistos:
+                    default_storage.delete(storage_name)
+                    duplicados.append({"arquivo_nome": safe_name, "duplicado_de": vistos[digest]})
+                    continue
+                vistos[digest] = safe_name
+                registrados.append(
+                    self._registrar_upload(
+                        user,
+                        safe_name=safe_name,
+                        storage_name=storage_name,
+                        digest=digest,
+                        formato=formato,
+                        meta=meta,
+                        sniff=sniff,
+                        force=force,
+                        lote=lote,
+                        lote_ordem=len(registrados) + 1,
+                    )
+                )
+
+        novos = [arquivo.id for arquivo in registrados if not arquivo.reaproveitado]
+        self._dispatch_lote(novos)
+        for arquivo in registrados:
+            if not arquivo.reaproveitado:
+                arquivo.refresh_from_db()
+        return {
+            **self._resumir_lote(lote, registrados),
+            "duplicados": duplicados,
+            "rejeitados": rejeitados,
+        }
+
+    def processar_lote(self, arquivo_retorno_ids: list[int]) -> list[int]:
+        """Parse paralelo dos arquivos do lote e reconciliação um por vez, em ordem.
+
+        Os artefatos de parse são gerados antes, em um pool de processos, e cada
+        ``processar`` os encontra prontos. A reconciliação segue a ordem
+        recebida (``lote_ordem``), sem repartir em partições, para que as baixas
+        de um arquivo valham para o seguinte. A falha de um arquivo fica
+        registrada nele e o lote segue para o próximo.
+        """
+        arquivos = ArquivoRetorno.objects.in_bulk(arquivo_retorno_ids)
+        self.artifacts.preparar(
+            (
+                (self._arquivo_path(arquivo), arquivo.sha256)
+                for arquivo in arquivos.values()
+                if arquivo.sha256
+            ),
+            settings.IMPORTACAO_LOTE_PROCESSOS,
+        )
+        processados = []
+        for posicao, arquivo_retorno_id in enumerate(arquivo_retorno_ids):
+            self.aguardando = arquivo_retorno_ids[posicao + 1 :]
+            try:
+                self.processar(arquivo_retorno_id)
+            except Exception:
+                logger.exception(
+                    "[RETORNO] falha no arquivo %s do lote; seguindo para o próximo",
+                    arquivo_retorno_id,
+                )
+                continue
+            processados.append(arquivo_retorno_id)
+        return processados
+
+    def resumo_lote(self, lote) -> dict[str, object] | None:
+        arquivos = list(
+            ArquivoRetorno.objects.filter(lote=lote)
+            .select_related("uploaded_by")
+            .order_by("lote_ordem")
+        )
+        if not arquivos:
+            return None
+        return self._resumir_lote(lote, arquivos)
+
+    def simular(self, arquivo) -> dict[str, object]:
+        """Prévia do processamento de um arquivo enviado, sem gravar nada.
+
+        Roda parser, matcher e as regras de reconciliação em memória sobre o
+        estado atual dos contratos e devolve o mesmo resumo de ``processar``
+        (sem os contadores ``pm_*`` de pagamentos) e o resultado de cada linha.
+        """
+        _, meta, _ = self._validar_envio(arquivo)
         safe_name = get_valid_filename(Path(getattr(arquivo, "name", "retorno.txt")).name)
+        arquivo_retorno = ArquivoRetorno(
+            arquivo_nome=safe_name,
+            competencia=competencia_to_date(meta.competencia),
+            orgao_origem=meta.sistema_origem,
+        )
+
+        itens: list[ArquivoRetornoItem] = []
+        total_warnings = 0
+        linhas_por_cpf: dict[str, list[int]] = defaultdict(list)
+        with tempfile.NamedTemporaryFile(suffix=".txt") as temp_file:
+            arquivo.seek(0)
+            for chunk in arquivo.chunks():
+                temp_file.write(chunk)
+            temp_file.flush()
+            stream = self.parser.iter_parse(temp_file.name)
+            for items, warnings in stream.chunks(self.chunk_size):
+                for item in items:
+                    try:
+                        ArquivoRetornoValidator.validar_item(item)
+                    except ValidationError:
+                        # Como em _persistir_itens: a linha inválida não vira item.
+                        continue
+                    itens.append(ArquivoRetornoItem(arquivo_retorno=arquivo_retorno, **item))
+                    cpf = re.sub(r"\D", "", str(item.get("cpf_cnpj", "")))
+                    if cpf:
+                        linhas_por_cpf[cpf].append(item.get("linha_numero"))
+                total_warnings += len(warnings)
+        itens.sort(key=lambda item: item.linha_numero)
+
+        duplicate_cpfs = self._detect_duplicate_cpfs(linhas_por_cpf)
+        conciliaveis = []
+        for item in itens:
+            if re.sub(r"\D", "", item.cpf_cnpj) in duplicate_cpfs:
+                item.processado = True
+                item.resultado_processamento = (
+                    ArquivoRetornoItem.ResultadoProcessamento.PENDENCIA_MANUAL
+                )
+                item.observacao = OBSERVACAO_CPF_DUPLICADO
+            else:
+                conciliaveis.append(item)
+
+        motor = MotorSimulacao(arquivo_retorno, matcher=AssociadoMatcher.carregar())
+        motor.chunk_size = self.chunk_size
+        motor.simular(conciliaveis)
+
+        resumo = MotorSimulacao.resumir_resultados(
+            (item.resultado_processamento, item.gerou_encerramento, item.gerou_novo_ciclo)
+            for item in itens
+        )
+        resumo.update(
+            {
+                "competencia": meta.competencia,
+                "data_geracao": meta.data_geracao,
+                "entidade": meta.entidade,
+                "sistema_origem": meta.sistema_origem,
+                "cpfs_duplicados_arquivo": len(duplicate_cpfs),
+                "linhas_duplicadas_ignoradas": sum(
+                    len(linhas) for linhas in duplicate_cpfs.values()
+                ),
+            }
+        )
+        return {
+            "arquivo_nome": safe_name,
+            "total_registros": len(itens),
+            "erros": resumo["erro"] + total_warnings,
+            "resumo": resumo,
+            "itens": itens,
+        }
+
+    def reprocessar(
+        self, arquivo_retorno_id: int, *, incremental: bool = False
+    ) -> ArquivoRetorno:
+        """Dispara de novo o processamento do arquivo.
+
+        Por padrão recomeça do zero: os itens são apagados e o arquivo é lido
+        outra vez. Com ``incremental`` só os itens sem baixa (não encontrados,
+        com erro, em ciclo aberto ou em pendência manual) voltam para a
+        reconciliação; baixas e não descontados já gravados ficam intactos. Um
+        arquivo processado antes do checkpoint por etapas não tem os dados para
+        isso e cai no reprocessamento completo.
+        """
+        with transaction.atomic():
+            arquivo_retorno = ArquivoRetorno.objects.select_for_update().get(
+                pk=arquivo_retorno_id
+            )
+            if arquivo_retorno.status == ArquivoRetorno.Status.PROCESSANDO:
+                raise ValidationError("O arquivo já está em processamento.")
+            incremental = incremental and self._aceita_reprocessamento_incremental(
+                arquivo_retorno
+            )
+            arquivo_retorno.status = ArquivoRetorno.Status.PENDENTE
+            arquivo_retorno.processado_em = None
+            dados = {"incremental": incremental}
+            if incremental:
+                dados["itens_reabertos"] = self._reabrir_itens(arquivo_retorno)
+                # processar() retoma daqui como de um checkpoint.
+                arquivo_retorno.etapa = ArquivoRetorno.Etapa.RECONCILIACAO
+                arquivo_retorno.checkpoint_linha = 0
+                arquivo_retorno.processados = arquivo_retorno.itens.filter(
+                    processado=True
+                ).count()
+            else:
+                # Sem incremental recomeça do zero; só o retry após falha retoma do checkpoint.
+                arquivo_retorno.etapa = ""
+            arquivo_retorno.save(
+                update_fields=[
+                    "status",
+                    "processado_em",
+                    "etapa",
+                    "checkpoint_linha",
+                    "processados",
+                    "updated_at",
+                ]
+            )
+            ImportacaoLog.objects.create(
+                arquivo_retorno=arquivo_retorno,
+                tipo=ImportacaoLog.Tipo.UPLOAD,
+                mensagem=(
+                    "Reprocessamento incremental solicitado manualmente."
+                    if incremental
+                    else "Reprocessamento solicitado manualmente."
+                ),
+                dados=dados,
+            )
+        self._dispatch_processamento(arquivo_retorno.id)
+        return arquivo_retorno
+
+    def recuperar_parados(self, idade: timedelta | None = None) -> list[int]:
+        """Despacha de novo arquivos parados em PENDENTE ou PROCESSANDO.
+
+        O job de um arquivo some sem registro quando a fila local é perdida num
+        restart ou o worker cai no meio do processamento. Toda execução renova
+        ``updated_at`` a cada trecho (``_pulsar``), e quem aguarda atrás dela no
+        lote ou na fila local também; um arquivo sem heartbeat há mais de
+        ``idade`` não tem mais dono. Linhas travadas por uma etapa em andamento
+        ficam de fora (``skip_locked``).
+
+        Os parados voltam para PENDENTE com um novo ``execucao_token``, mantendo
+        ``etapa`` e ``checkpoint_linha``, e são despachados de novo: ``processar``
+        retoma do último checkpoint. Se a execução antiga ainda estiver viva, o
+        próximo heartbeat dela encontra outro token e ela para. Arquivos de um
+        lote voltam juntos, em ``lote_ordem``.
+        """
+        if idade is None:
+            idade = timedelta(minutes=settings.IMPORTACAO_RECUPERAR_APOS_MINUTOS)
+        token = str(uuid4())
+        with transaction.atomic():
+            parados = list(
+                ArquivoRetorno.objects.select_for_update(skip_locked=True)
+                .filter(
+                    status__in=[ArquivoRetorno.Status.PENDENTE, ArquivoRetorno.Status.PROCESSANDO],
+                    updated_at__lt=timezone.now() - idade,
+                )
+                .order_by("lote", "lote_ordem", "pk")
+            )
+            if not parados:
+                return []
+            ArquivoRetorno.objects.filter(pk__in=[arquivo.pk for arquivo in parados]).update(
+                status=ArquivoRetorno.Status.PENDENTE,
+                execucao_token=token,
+                updated_at=timezone.now(),
+            )
+            ImportacaoLog.objects.bulk_create(
+                ImportacaoLog(
+                    arquivo_retorno=arquivo,
+                    tipo=ImportacaoLog.Tipo.UPLOAD,
+                    mensagem="Processamento parado sem atualização; arquivo despachado de novo.",
+                    dados={
+                        "status_anterior": arquivo.status,
+                        "etapa": arquivo.etapa,
+                        "checkpoint_linha": arquivo.checkpoint_linha,
+                        "execucao_anterior": arquivo.execucao_token,
+                    },
+                )
+                for arquivo in parados
+            )
+
+        lotes: dict[object, list[int]] = defaultdict(list)
+        for arquivo in parados:
+            if arquivo.lote:
+                lotes[arquivo.lote].append(arquivo.pk)
+            else:
+                self._dispatch_processamento(arquivo.pk)
+        for arquivo_retorno_ids in lotes.values():
+            self._dispatch_lote(arquivo_retorno_ids)
+        return [arquivo.pk for arquivo in parados]
+
+    def limpar_artefatos(self) -> int:
+        """Apaga artefatos de parse sem ArquivoRetorno ou de versões antigas do parser."""
+        return self.artifacts.limpar(
+            ArquivoRetorno.objects.exclude(sha256="").values_list("sha256", flat=True).distinct()
+        )
+
+    def processar(self, arquivo_retorno_id: int) -> ArquivoRetorno:
+        """Processa o arquivo em etapas, cada uma (ou cada trecho) na própria transação.
+
+        O avanço fica gravado em ``etapa``, ``checkpoint_linha`` e
+        ``checkpoint_dados``: uma nova tentativa após falha (o retry da task)
+        retoma da etapa ou do trecho em que parou. A reconciliação avança em
+        trechos de ``chunk_size`` linhas, então as travas em parcelas e
+        associados duram um trecho, independente do tamanho do arquivo.
+        """
+        self.medidor = MedidorEtapas()
+        with self.medidor.ativo():
+            arquivo_retorno = self._iniciar_processamento(arquivo_retorno_id)
+            try:
+                self._executar_etapas(arquivo_retorno)
+            except ProcessamentoAssumido:
+                # Outra execução já foi despachada; esta sai sem marcar falha.
+                logger.warning(
+                    "[RETORNO] arquivo %s assumido pela varredura de parados", arquivo_retorno.pk
+                )
+            except Exception as exc:
+                self._registrar_falha(arquivo_retorno, exc)
+                raise
+            finally:
+                # Grava o que foi medido mesmo em falha: a etapa lenta é a pista.
+                self._registrar_metricas(arquivo_retorno)
+
+        return arquivo_retorno
+
+    def _executar_etapas(self, arquivo_retorno: ArquivoRetorno) -> None:
+        arquivo_path = self._arquivo_path(arquivo_retorno)
+        digest = arquivo_retorno.sha256 or digest_file(arquivo_path)
+        logs = ImportacaoLogBuffer(arquivo_retorno)
+
+        if arquivo_retorno.etapa == ArquivoRetorno.Etapa.ITENS:
+            self._etapa_itens(arquivo_retorno, arquivo_path, digest, logs)
+
+        # Índice de identidade carregado uma única vez e compartilhado pela
+        # reconciliação e pelo upsert de PagamentoMensalidade.
+        with self.medidor.medir("matcher"):
+            matcher = AssociadoMatcher.carregar()
+        motor = self._criar_motor(arquivo_retorno, matcher, logs)
+
+        if arquivo_retorno.etapa == ArquivoRetorno.Etapa.RECONCILIACAO:
+            with self.medidor.medir("reconciliacao"):
+                self._etapa_reconciliacao(arquivo_retorno, motor, logs)
+        if arquivo_retorno.etapa == ArquivoRetorno.Etapa.PAGAMENTOS:
+            with self.medidor.medir("pagamentos"):
+                self._etapa_pagamentos(arquivo_retorno, arquivo_path, digest, matcher)
+        with self.medidor.medir("conclusao"):
+            self._concluir_processamento(arquivo_retorno, motor, logs)
+
+    def _registrar_metricas(self, arquivo_retorno: ArquivoRetorno) -> None:
+        """Soma o que esta execução mediu às métricas já gravadas no arquivo.
+
+        Uma retomada e cada task do pipeline em partições medem só a sua parte;
+        ``_iniciar_processamento`` zera as métricas quando o processamento
+        recomeça do início. A linha fica travada entre a leitura e a escrita,
+        porque as partições gravam em paralelo.
+        """
+        with transaction.atomic():
+            anteriores = (
+                ArquivoRetorno.objects.select_for_update()
+                .values_list("metricas", flat=True)
+                .get(pk=arquivo_retorno.pk)
+            )
+            arquivo_retorno.metricas = {
+                **somar_metricas(anteriores, self.medidor.como_dict()),
+                "status": arquivo_retorno.status,
+                "total_registros": arquivo_retorno.total_registros,
+                "medido_em": timezone.now().isoformat(),
+            }
+            # update() direto: não mexe em updated_at, base da vazão do progresso.
+            ArquivoRetorno.objects.filter(pk=arquivo_retorno.pk).update(
+                metricas=arquivo_retorno.metricas
+            )
+        logger.info(
+            "[RETORNO] métricas do processamento arquivo=%s %s",
+            arquivo_retorno.pk,
+            json.dumps(arquivo_retorno.metricas),
+            extra={
+                "arquivo_retorno_id": arquivo_retorno.pk,
+                "metricas": arquivo_retorno.metricas,
+            },
+        )
+
+    def preparar_particoes(self, arquivo_retorno_id: int, particoes: int) -> list[int]:
+        """Início do pipeline paralelo: grava os itens e reparte os pendentes.
+
+        A partição sai do associado casado (``associado_id % particoes``), então
+        duas partições nunca disputam as mesmas parcelas ou ciclos. Devolve as
+        partições com itens a reconciliar; vazio quando uma retomada já passou
+        da reconciliação.
+        """
+        self.medidor = MedidorEtapas()
+        with self.medidor.ativo():
+            arquivo_retorno = self._iniciar_processamento(arquivo_retorno_id)
+            try:
+                if arquivo_retorno.etapa == ArquivoRetorno.Etapa.ITENS:
+                    arquivo_path = self._arquivo_path(arquivo_retorno)
+                    self._etapa_itens(
+                        arquivo_retorno,
+                        arquivo_path,
+                        arquivo_retorno.sha256 or digest_file(arquivo_path),
+                        ImportacaoLogBuffer(arquivo_retorno),
+                    )
+                if arquivo_retorno.etapa != ArquivoRetorno.Etapa.RECONCILIACAO:
+                    return []
+                with self.medidor.medir("matcher"):
+                    matcher = AssociadoMatcher.carregar()
+                with self.medidor.medir("particionar"):
+                    return self._particionar(arquivo_retorno, matcher, particoes)
+            except ProcessamentoAssumido:
+                return []
+            except Exception as exc:
+                self._registrar_falha(arquivo_retorno, exc)
+                raise
+            finally:
+                self._registrar_metricas(arquivo_retorno)
+
+    def reconciliar_particao(self, arquivo_retorno_id: int, particao: int) -> int:
+        """Reconcilia uma partição em trechos commitados; devolve quantos itens tratou.
+
+        Roda em paralelo com as demais: o progresso é somado com F() e a retomada
+        vem de ``processado``, já que o checkpoint de linha é do arquivo inteiro.
+        """
+        self.medidor = MedidorEtapas()
+        with self.medidor.ativo():
+            arquivo_retorno = ArquivoRetorno.objects.get(pk=arquivo_retorno_id)
+            logs = ImportacaoLogBuffer(arquivo_retorno)
+            total = 0
+            apos_linha = 0
+            try:
+                with self.medidor.medir("matcher"):
+                    matcher = AssociadoMatcher.carregar()
+                motor = self._criar_motor(arquivo_retorno, matcher, logs, particao=particao)
+                with self.medidor.medir("reconciliacao"):
+                    while True:
+                        with transaction.atomic():
+                            itens = motor.reconciliar_trecho(
+                                apos_linha=apos_linha, limite=self.chunk_size
+                            )
+                            logs.flush()
+                            if itens:
+                                # Ao fim do trecho: a trava na linha do arquivo dura só
+                                # até o commit e as partições não se serializam nela.
+                                self._pulsar(
+                                    arquivo_retorno, processados=F("processados") + len(itens)
+                                )
+                        if not itens:
+                            return total
+                        apos_linha = itens[-1].linha_numero
+                        total += len(itens)
+            except ProcessamentoAssumido:
+                return total
+            except Exception as exc:
+                self._registrar_falha(arquivo_retorno, exc)
+                raise
+            finally:
+                logs.fechar()
+                self._registrar_metricas(arquivo_retorno)
+
+    def concluir_particoes(
+        self, arquivo_retorno_id: int, itens_por_particao: list[int]
+    ) -> ArquivoRetorno:
+        """Fecho do pipeline paralelo (callback do chord): pagamentos e resumo."""
+        self.medidor = MedidorEtapas()
+        with self.medidor.ativo():
+            arquivo_retorno = ArquivoRetorno.objects.get(pk=arquivo_retorno_id)
+            try:
+                self._pulsar(arquivo_retorno)
+                arquivo_path = self._arquivo_path(arquivo_retorno)
+                digest = arquivo_retorno.sha256 or digest_file(arquivo_path)
+                logs = ImportacaoLogBuffer(arquivo_retorno)
+                with self.medidor.medir("matcher"):
+                    matcher = AssociadoMatcher.carregar()
+                motor = self._criar_motor(arquivo_retorno, matcher, logs)
+
+                arquivo_retorno.checkpoint_dados = {
+                    **arquivo_retorno.checkpoint_dados,
+                    "itens_por_particao": itens_por_particao,
+                }
+                if arquivo_retorno.etapa == ArquivoRetorno.Etapa.RECONCILIACAO:
+                    # Normalmente não sobra nada; cobre itens que chegaram sem partição.
+                    with self.medidor.medir("reconciliacao"):
+                        self._etapa_reconciliacao(arquivo_retorno, motor, logs)
+                if arquivo_retorno.etapa == ArquivoRetorno.Etapa.PAGAMENTOS:
+                    with self.medidor.medir("pagamentos"):
+                        self._etapa_pagamentos(arquivo_retorno, arquivo_path, digest, matcher)
+                with self.medidor.medir("conclusao"):
+                    self._concluir_processamento(arquivo_retorno, motor, logs)
+            except ProcessamentoAssumido:
+                pass
+            except Exception as exc:
+                self._registrar_falha(arquivo_retorno, exc)
+                raise
+            finally:
+                self._registrar_metricas(arquivo_retorno)
+
+        return arquivo_retorno
+
+    def _particionar(
+        self, arquivo_retorno: ArquivoRetorno, matcher: AssociadoMatcher, particoes: int
+    ) -> list[int]:
+        ids_por_particao: dict[int, list[int]] = defaultdict(list)
+        pendentes = arquivo_retorno.itens.filter(processado=False).values_list(
+            "id",
+            "cpf_cnpj",
+            "matricula_servidor",
+            "nome_servidor",
+            "orgao_pagto_nome",
+            "orgao_pagto_codigo",
+            "orgao_codigo",
+        )
+        for item_id, cpf, matricula, nome, orgao, orgao_pagto_codigo, orgao_codigo in (
+            pendentes.iterator(chunk_size=self.chunk_size)
+        ):
+            associado_id, _regra = matcher.resolver(
+                cpf=cpf,
+                matricula=matricula,
+                nome=nome,
+                orgao=orgao,
+                orgao_alternativo=orgao_pagto_codigo,
+                orgao_codigo=orgao_codigo,
+            )
+            # Sem associado o item não toca parcelas: qualquer partição serve.
+            chave = associado_id if associado_id is not None else item_id
+            ids_por_particao[chave % particoes].append(item_id)
+
+        for particao, ids in ids_por_particao.items():
+            lotes = iter(ids)
+            for lote in iter(lambda: list(islice(lotes, self.chunk_size)), []):
+                ArquivoRetornoItem.objects.filter(pk__in=lote).update(particao=particao)
+        return sorted(ids_por_particao)
+
+    def _criar_motor(
+        self,
+        arquivo_retorno: ArquivoRetorno,
+        matcher: AssociadoMatcher,
+        logs: ImportacaoLogBuffer,
+        particao: int | None = None,
+    ) -> MotorReconciliacao:
+        motor_class = (
+            MotorReconciliacaoEmLote
+            if settings.IMPORTACAO_RECONCILIACAO_EM_LOTE
+            else MotorReconciliacao
+        )
+        return motor_class(arquivo_retorno, matcher=matcher, logs=logs, particao=particao)
+
+    def _registrar_falha(self, arquivo_retorno: ArquivoRetorno, exc: Exception) -> None:
+        arquivo_retorno.status = ArquivoRetorno.Status.ERRO
+        arquivo_retorno.processado_em = timezone.now()
+        arquivo_retorno.resultado_resumo = {
+            **arquivo_retorno.resultado_resumo,
+            "erro": arquivo_retorno.resultado_resumo.get("erro", 0) + 1,
+            "mensagem": str(exc),
+        }
+        arquivo_retorno.save(
+            update_fields=["status", "processado_em", "resultado_resumo", "updated_at"]
+        )
+        ImportacaoLog.objects.create(
+            arquivo_retorno=arquivo_retorno,
+            tipo=ImportacaoLog.Tipo.ERRO,
+            mensagem="Falha ao processar o arquivo retorno.",
+            dados={
+                "erro": str(exc),
+                "etapa": arquivo_retorno.etapa,
+                "checkpoint_linha": arquivo_retorno.checkpoint_linha,
+            },
+        )
+
+    def _armazenar(self, arquivo) -> tuple[str, str, str]:
+        """Grava o envio no storage em chunks; devolve nome seguro, nome no storage e sha256."""
+        safe_name = get_valid_filename(Path(getattr(arquivo, "name", "retorno.txt")).name)
+        arquivo.seek(0)
+        leitor = DigestReader(arquivo)
         storage_name = default_storage.save(
-            f"arquivos_retorno/{uuid4().hex}_{safe_name}",
-            ContentFile(raw_bytes),
+            f"arquivos_retorno/{uuid4().hex}_{safe_name}", File(leitor)
+        )
+        return safe_name, storage_name, leitor.hexdigest()
+
+    def _registrar_upload(
+        self,
+        user,
+        *,
+        safe_name: str,
+        storage_name: str,
+        digest: str,
+        formato: str,
+        meta: RetornoMeta,
+        sniff: EncodingSniff,
+        force: bool,
+        lote=None,
+        lote_ordem: int | None = None,
+    ) -> ArquivoRetorno:
+        competencia = competencia_to_date(meta.competencia)
+        identicos = ArquivoRetorno.objects.filter(sha256=digest).order_by("-created_at")
+        if not force:
+            concluido = identicos.filter(
+                competencia=competencia,
+                status=ArquivoRetorno.Status.CONCLUIDO,
+            ).first()
+            if concluido:
+                default_storage.delete(storage_name)
+                ImportacaoLog.objects.create(
+                    arquivo_retorno=concluido,
+                    tipo=ImportacaoLog.Tipo.UPLOAD,
+                    mensagem="Upload idêntico a arquivo já processado; resultado reaproveitado.",
+                    dados={"arquivo_nome": safe_name, "sha256": digest},
+                )
+                concluido.reaproveitado = True
+                return concluido
+
+        armazenado = next(
+            (
+                existente.arquivo_url
+                for existente in identicos.only("arquivo_url")
+                if default_storage.exists(existente.arquivo_url)
+            ),
+            None,
         )
+        if armazenado:
+            # Conteúdo já guardado por outro upload: mantém uma única cópia.
+            default_storage.delete(storage_name)
+            storage_name = armazenado
 
         arquivo_retorno = ArquivoRetorno.objects.create(
             arquivo_nome=safe_name,
             arquivo_url=storage_name,
+            sha256=digest,
             formato=formato,
             orgao_origem=meta.sistema_origem,
-            competencia=competencia_to_date(meta.competencia),
+            competencia=competencia,
             status=ArquivoRetorno.Status.PENDENTE,
             uploaded_by=user,
+            lote=lote,
+            lote_ordem=lote_ordem,
             resultado_resumo={
                 "competencia": meta.competencia,
                 "data_geracao": meta.data_geracao,
@@ -78,144 +775,438 @@ class ArquivoRetornoService:
                 "nao_descontados": 0,
             },
         )
+        dados = {
+            "arquivo_nome": safe_name,
+            "competencia": meta.competencia,
+            "encoding": sniff.encoding,
+            "encoding_confianca": sniff.confidence,
+            "sha256": digest,
+            "forcado": force,
+        }
+        if lote:
+            dados.update(lote=str(lote), lote_ordem=lote_ordem)
         ImportacaoLog.objects.create(
             arquivo_retorno=arquivo_retorno,
             tipo=ImportacaoLog.Tipo.UPLOAD,
             mensagem="Upload de arquivo retorno recebido.",
-            dados={"arquivo_nome": safe_name, "competencia": meta.competencia},
+            dados=dados,
         )
-        self._dispatch_processamento(arquivo_retorno.id)
-        arquivo_retorno.refresh_from_db()
+        arquivo_retorno.reaproveitado = False
         return arquivo_retorno
 
-    def reprocessar(self, arquivo_retorno_id: int) -> ArquivoRetorno:
-        arquivo_retorno = ArquivoRetorno.objects.get(pk=arquivo_retorno_id)
-        if arquivo_retorno.status == ArquivoRetorno.Status.PROCESSANDO:
-            raise ValidationError("O arquivo já está em processamento.")
-        arquivo_retorno.status = ArquivoRetorno.Status.PENDENTE
-        arquivo_retorno.processado_em = None
-        arquivo_retorno.save(update_fields=["status", "processado_em", "updated_at"])
-        ImportacaoLog.objects.create(
-            arquivo_retorno=arquivo_retorno,
-            tipo=ImportacaoLog.Tipo.UPLOAD,
-            mensagem="Reprocessamento solicitado manualmente.",
+    def _expandir_lote(
+        self, arquivos, pilha: ExitStack, rejeitados: list[dict]
+    ) -> Iterator[tuple[str, object]]:
+        """Cada arquivo do envio, com os membros de ZIPs abertos em arquivos temporários.
+
+        O tamanho de cada membro é limitado na leitura, sem confiar no cabeçalho
+        do ZIP; ZIPs ilegíveis e membros grandes demais vão para ``rejeitados``.
+        """
+        limite_mb = settings.IMPORTACAO_UPLOAD_LIMITE_MB
+        limite = limite_mb * 1024 * 1024
+        maximo = settings.IMPORTACAO_LOTE_MAX_ARQUIVOS
+        total = 0
+
+        def contar() -> None:
+            nonlocal total
+            total += 1
+            if total > maximo:
+                raise ValidationError(
+                    {"arquivos": f"O envio excede o limite de {maximo} arquivos por lote."}
+                )
+
+        for arquivo in arquivos:
+            nome = get_valid_filename(Path(getattr(arquivo, "name", "retorno.txt")).name)
+            if Path(nome).suffix.lower() != ".zip":
+                contar()
+                yield nome, arquivo
+                continue
+
+            try:
+                pacote = pilha.enter_context(zipfile.ZipFile(arquivo))
+                membros = pacote.infolist()
+            except zipfile.BadZipFile:
+                rejeitados.append({"arquivo_nome": nome, "erros": {"arquivo": "ZIP inválido."}})
+                continue
+            for membro in membros:
+                membro_nome = Path(membro.filename).name
+                if membro.is_dir() or membro_nome.startswith(".") or "__MACOSX" in membro.filename:
+                    continue
+                contar()
+                conteudo = pilha.enter_context(tempfile.SpooledTemporaryFile(max_size=1024 * 1024))
+                with pacote.open(membro) as origem:
+                    for bloco in iter(lambda: origem.read(1024 * 1024), b""):
+                        conteudo.write(bloco)
+                        if conteudo.tell() > limite:
+                            break
+                if conteudo.tell() > limite:
+                    rejeitados.append(
+                        {
+                            "arquivo_nome": membro_nome,
+                            "erros": {"arquivo": f"O arquivo excede o limite de {limite_mb} MB."},
+                        }
+                    )
+                    continue
+                conteudo.seek(0)
+                yield membro_nome, File(conteudo, name=membro_nome)
+
+    @staticmethod
+    def _resumir_lote(lote, arquivos: list[ArquivoRetorno]) -> dict[str, object]:
+        """Status e totais do lote somados dos resumos de cada arquivo."""
+        status = {arquivo.status for arquivo in arquivos}
+        if status & {ArquivoRetorno.Status.PENDENTE, ArquivoRetorno.Status.PROCESSANDO}:
+            status_lote = ArquivoRetorno.Status.PROCESSANDO
+        elif ArquivoRetorno.Status.ERRO in status:
+            status_lote = ArquivoRetorno.Status.ERRO
+        else:
+            status_lote = ArquivoRetorno.Status.CONCLUIDO
+
+        totais: dict[str, int] = defaultdict(int)
+        for arquivo in arquivos:
+            totais["total_registros"] += arquivo.total_registros
+            totais["processados"] += arquivo.processados
+            for chave, valor in arquivo.resultado_resumo.items():
+                if isinstance(valor, int) and not isinstance(valor, bool):
+                    totais[chave] += valor
+        return {
+            "lote": lote,
+            "status": status_lote,
+            "total_arquivos": len(arquivos),
+            "totais": dict(totais),
+            "arquivos": arquivos,
+        }
+
+    def _validar_envio(self, arquivo) -> tuple[str, RetornoMeta, EncodingSniff]:
+        ArquivoRetornoValidator.validar_tamanho(
+            arquivo, max_mb=settings.IMPORTACAO_UPLOAD_LIMITE_MB
+        )
+        formato = ArquivoRetornoValidator.validar_formato(getattr(arquivo, "name", ""))
+
+        # Só o início do arquivo é decodificado: cabeçalho e meta ficam no topo.
+        arquivo.seek(0)
+        head = arquivo.read(self.parser.SNIFF_BYTES + 1)
+        if not head:
+            raise ValidationError({"arquivo": "O arquivo enviado está vazio."})
+        lines, sniff = self.parser.read_header(head)
+        ArquivoRetornoValidator.validar_cabecalho(lines)
+        return formato, self.parser.extract_meta(lines), sniff
+
+    @staticmethod
+    def _aceita_reprocessamento_incremental(arquivo_retorno: ArquivoRetorno) -> bool:
+        dados = arquivo_retorno.checkpoint_dados
+        return (
+            arquivo_retorno.status == ArquivoRetorno.Status.CONCLUIDO
+            and {"meta", "total_itens", "total_warnings", "cpfs_duplicados"} <= dados.keys()
+        )
+
+    def _reabrir_itens(self, arquivo_retorno: ArquivoRetorno) -> int:
+        """Devolve à reconciliação os itens que ainda não geraram baixa."""
+        return (
+            arquivo_retorno.itens.filter(
+                processado=True,
+                resultado_processamento__in=RESULTADOS_REPROCESSAVEIS,
+            )
+            # CPFs duplicados seguem isolados; a etapa de itens não roda de novo.
+            .exclude(cpf_cnpj__in=list(arquivo_retorno.checkpoint_dados["cpfs_duplicados"]))
+            .update(
+                processado=False,
+                associado=None,
+                parcela=None,
+                observacao="",
+                regra_casamento="",
+                motivo_rejeicao=None,
+                gerou_encerramento=False,
+                gerou_novo_ciclo=False,
+                updated_at=timezone.now(),
+            )
         )
-        self._dispatch_processamento(arquivo_retorno.id)
-        return arquivo_retorno
 
     @transaction.atomic
-    def processar(self, arquivo_retorno_id: int) -> ArquivoRetorno:
+    def _iniciar_processamento(self, arquivo_retorno_id: int) -> ArquivoRetorno:
         arquivo_retorno = ArquivoRetorno.objects.select_for_update().get(pk=arquivo_retorno_id)
         if arquivo_retorno.status == ArquivoRetorno.Status.PROCESSANDO:
             raise ValidationError("O arquivo já está em processamento.")
 
+        retomada = bool(arquivo_retorno.etapa) and (
+            arquivo_retorno.status != ArquivoRetorno.Status.CONCLUIDO
+        )
+        if not retomada:
+            arquivo_retorno.checkpoint_linha = 0
+            arquivo_retorno.checkpoint_dados = {}
+            arquivo_retorno.total_registros = 0
+            arquivo_retorno.processados = 0
+            arquivo_retorno.metricas = {}
+
         arquivo_retorno.status = ArquivoRetorno.Status.PROCESSANDO
         arquivo_retorno.processado_em = None
-        arquivo_retorno.save(update_fields=["status", "processado_em", "updated_at"])
+        arquivo_retorno.execucao_token = str(uuid4())
+        self._iniciar_etapa(
+            arquivo_retorno,
+            arquivo_retorno.etapa if retomada else ArquivoRetorno.Etapa.ITENS,
+        )
+        arquivo_retorno.save(
+            update_fields=[
+                "status",
+                "processado_em",
+                "etapa",
+                "etapa_iniciada_em",
+                "etapa_processados_inicio",
+                "checkpoint_linha",
+                "checkpoint_dados",
+                "total_registros",
+                "processados",
+                "metricas",
+                "execucao_token",
+                "updated_at",
+            ]
+        )
+        if retomada:
+            ImportacaoLog.objects.create(
+                arquivo_retorno=arquivo_retorno,
+                tipo=ImportacaoLog.Tipo.UPLOAD,
+                mensagem="Processamento retomado a partir do último checkpoint.",
+                dados={
+                    "etapa": arquivo_retorno.etapa,
+                    "checkpoint_linha": arquivo_retorno.checkpoint_linha,
+                },
+            )
+        return arquivo_retorno
 
-        try:
-            if arquivo_retorno.itens.exists():
-                arquivo_retorno.itens.all().delete()
+    @staticmethod
+    def _iniciar_etapa(arquivo_retorno: ArquivoRetorno, etapa: str) -> None:
+        arquivo_retorno.etapa = etapa
+        arquivo_retorno.etapa_iniciada_em = timezone.now()
+        arquivo_retorno.etapa_processados_inicio = arquivo_retorno.processados
 
-            import_uuid = str(uuid4())
+    def _pulsar(self, arquivo_retorno: ArquivoRetorno, **campos) -> None:
+        """Heartbeat da execução: renova ``updated_at`` e grava ``campos`` junto.
 
-            parsed = self.parser.parse(self._arquivo_path(arquivo_retorno))
-            self._persistir_itens(arquivo_retorno, parsed.items)
-            duplicate_cpfs = self._detect_duplicate_cpfs(parsed.items)
-            if duplicate_cpfs:
-                self._marcar_cpfs_duplicados(arquivo_retorno, duplicate_cpfs)
+        Só vale enquanto ``execucao_token`` é o desta execução; se a varredura de
+        parados já assumiu o arquivo, levanta ProcessamentoAssumido. Numa etapa
+        em transação única o UPDATE trava a linha até o commit, e a varredura,
+        que usa ``skip_locked``, passa por ela.
+        """
+        agora = timezone.now()
+        if not ArquivoRetorno.objects.filter(
+            pk=arquivo_retorno.pk, execucao_token=arquivo_retorno.execucao_token
+        ).update(updated_at=agora, **campos):
+            raise ProcessamentoAssumido(arquivo_retorno.pk)
+        arquivo_retorno.updated_at = agora
+        if self.aguardando:
+            ArquivoRetorno.objects.filter(
+                pk__in=self.aguardando, status=ArquivoRetorno.Status.PENDENTE
+            ).update(updated_at=agora)
 
-            for warning in parsed.warnings:
-                ImportacaoLog.objects.create(
-                    arquivo_retorno=arquivo_retorno,
-                    tipo=ImportacaoLog.Tipo.PARSE,
-                    mensagem="Linha malformada ignorada durante o parse.",
-                    dados=warning,
+    def _pulsando(self, arquivo_retorno: ArquivoRetorno, items: Iterable) -> Iterator:
+        """Repassa ``items`` com um heartbeat a cada ``chunk_size``."""
+        for posicao, item in enumerate(items, 1):
+            if posicao % self.chunk_size == 0:
+                self._pulsar(arquivo_retorno)
+            yield item
+
+    @transaction.atomic
+    def _etapa_itens(
+        self,
+        arquivo_retorno: ArquivoRetorno,
+        arquivo_path: str,
+        digest: str,
+        logs: ImportacaoLogBuffer,
+    ) -> None:
+        """Lê o arquivo e grava os itens; só insere linhas, sem travar parcelas."""
+        self._pulsar(arquivo_retorno)
+        if arquivo_retorno.itens.exists():
+            arquivo_retorno.itens.all().delete()
+
+        with self.medidor.medir("parse"):
+            stream = self.artifacts.open_stream(arquivo_path, digest)
+        total_itens = 0
+        total_warnings = 0
+        linhas_por_cpf: dict[str, list[int]] = defaultdict(list)
+        for items, warnings in self.medidor.iterar("parse", stream.chunks(self.chunk_size)):
+            self._pulsar(arquivo_retorno)
+            with self.medidor.medir("persistir_itens"):
+                self._persistir_itens(arquivo_retorno, items, logs)
+            for item in items:
+                cpf = re.sub(r"\D", "", str(item.get("cpf_cnpj", "")))
+                if cpf:
+                    linhas_por_cpf[cpf].append(item.get("linha_numero"))
+            total_itens += len(items)
+
+            for warning in warnings:
+                logs.add(
+                    ImportacaoLog.Tipo.PARSE,
+                    "Linha malformada ignorada durante o parse.",
+                    warning,
                 )
+            total_warnings += len(warnings)
+        logs.flush()
 
-            resumo = MotorReconciliacao(arquivo_retorno).reconciliar()
-            resumo.update(
-                {
-                    "competencia": parsed.meta.competencia,
-                    "data_geracao": parsed.meta.data_geracao,
-                    "entidade": parsed.meta.entidade,
-                    "sistema_origem": parsed.meta.sistema_origem,
-                }
-            )
-            resumo["cpfs_duplicados_arquivo"] = len(duplicate_cpfs)
-            resumo["linhas_duplicadas_ignoradas"] = sum(
-                len(group) for group in duplicate_cpfs.values()
-            )
+        duplicate_cpfs = self._detect_duplicate_cpfs(linhas_por_cpf)
+        if duplicate_cpfs:
+            self._marcar_cpfs_duplicados(arquivo_retorno, duplicate_cpfs, logs)
+            logs.flush()
 
-            # Upsert PagamentoMensalidade (equivalente ao baixaUpload do PHP)
-            resumo_pm = self._upsert_pagamentos_mensalidade(
-                arquivo_retorno=arquivo_retorno,
-                items=parsed.items,
-                import_uuid=import_uuid,
-                user=arquivo_retorno.uploaded_by,
-                ignored_cpfs=set(duplicate_cpfs),
-            )
-            resumo.update(resumo_pm)
-
-            arquivo_retorno.total_registros = len(parsed.items)
-            arquivo_retorno.processados = arquivo_retorno.itens.filter(processado=True).count()
-            arquivo_retorno.nao_encontrados = resumo["nao_encontrado"]
-            arquivo_retorno.erros = resumo["erro"] + len(parsed.warnings)
-            arquivo_retorno.resultado_resumo = resumo
-            arquivo_retorno.status = ArquivoRetorno.Status.CONCLUIDO
-            arquivo_retorno.processado_em = timezone.now()
-            arquivo_retorno.save(
-                update_fields=[
-                    "total_registros",
-                    "processados",
-                    "nao_encontrados",
-                    "erros",
-                    "resultado_resumo",
-                    "status",
-                    "processado_em",
-                    "updated_at",
-                ]
-            )
-            ImportacaoLog.objects.create(
-                arquivo_retorno=arquivo_retorno,
-                tipo=ImportacaoLog.Tipo.BAIXA,
-                mensagem=(
-                    f"Importação concluída: {resumo_pm['pm_criados']} lançamentos, "
-                    f"{resumo_pm['pm_duplicados']} duplicados ignorados, "
-                    f"{resumo_pm['pm_cpfs_duplicados_arquivo']} CPFs duplicados no arquivo isolados, "
-                    f"{resumo_pm['pm_vinculados']} vinculados a associados, "
-                    f"{resumo_pm['pm_nao_encontrados']} não encontrados."
-                ),
-                dados=resumo,
-            )
-        except Exception as exc:
-            arquivo_retorno.status = ArquivoRetorno.Status.ERRO
-            arquivo_retorno.processado_em = timezone.now()
-            arquivo_retorno.resultado_resumo = {
-                **arquivo_retorno.resultado_resumo,
-                "erro": arquivo_retorno.resultado_resumo.get("erro", 0) + 1,
-                "mensagem": str(exc),
-            }
-            arquivo_retorno.save(
-                update_fields=["status", "processado_em", "resultado_resumo", "updated_at"]
-            )
-            ImportacaoLog.objects.create(
-                arquivo_retorno=arquivo_retorno,
-                tipo=ImportacaoLog.Tipo.ERRO,
-                mensagem="Falha ao processar o arquivo retorno.",
-                dados={"erro": str(exc)},
-            )
-            raise
+        meta = stream.meta
+        arquivo_retorno.total_registros = total_itens
+        # Linhas de CPF duplicado já saem daqui processadas.
+        arquivo_retorno.processados = arquivo_retorno.itens.filter(processado=True).count()
+        self._iniciar_etapa(arquivo_retorno, ArquivoRetorno.Etapa.RECONCILIACAO)
+        arquivo_retorno.checkpoint_linha = 0
+        arquivo_retorno.checkpoint_dados = {
+            "meta": {
+                "competencia": meta.competencia,
+                "data_geracao": meta.data_geracao,
+                "entidade": meta.entidade,
+                "sistema_origem": meta.sistema_origem,
+            },
+            "total_itens": total_itens,
+            "total_warnings": total_warnings,
+            "cpfs_duplicados": duplicate_cpfs,
+        }
+        arquivo_retorno.save(
+            update_fields=[
+                "etapa",
+                "etapa_iniciada_em",
+                "etapa_processados_inicio",
+                "checkpoint_linha",
+                "checkpoint_dados",
+                "total_registros",
+                "processados",
+                "updated_at",
+            ]
+        )
 
-        return arquivo_retorno
+    def _etapa_reconciliacao(
+        self,
+        arquivo_retorno: ArquivoRetorno,
+        motor: MotorReconciliacao,
+        logs: ImportacaoLogBuffer,
+    ) -> None:
+        """Reconcilia trecho a trecho, gravando checkpoint e progresso junto de cada um."""
+        while True:
+            with transaction.atomic():
+                self._pulsar(arquivo_retorno)
+                itens = motor.reconciliar_trecho(
+                    apos_linha=arquivo_retorno.checkpoint_linha, limite=self.chunk_size
+                )
+                logs.flush()
+                if itens:
+                    arquivo_retorno.checkpoint_linha = itens[-1].linha_numero
+                    arquivo_retorno.processados += len(itens)
+                else:
+                    self._iniciar_etapa(arquivo_retorno, ArquivoRetorno.Etapa.PAGAMENTOS)
+                arquivo_retorno.save(
+                    update_fields=[
+                        "etapa",
+                        "etapa_iniciada_em",
+                        "etapa_processados_inicio",
+                        "checkpoint_linha",
+                        "processados",
+                        "updated_at",
+                    ]
+                )
+            if not itens:
+                return
+
+    @transaction.atomic
+    def _etapa_pagamentos(
+        self,
+        arquivo_retorno: ArquivoRetorno,
+        arquivo_path: str,
+        digest: str,
+        matcher: AssociadoMatcher,
+    ) -> None:
+        # Upsert PagamentoMensalidade (equivalente ao baixaUpload do PHP).
+        # Segunda passada em streaming sobre o artefato: nada fica retido em memória.
+        self._pulsar(arquivo_retorno)
+        resumo_pm = self._upsert_pagamentos_mensalidade(
+            arquivo_retorno=arquivo_retorno,
+            items=self._pulsando(
+                arquivo_retorno, self.artifacts.open_stream(arquivo_path, digest).iter_items()
+            ),
+            import_uuid=str(uuid4()),
+            user=arquivo_retorno.uploaded_by,
+            ignored_cpfs=set(arquivo_retorno.checkpoint_dados["cpfs_duplicados"]),
+            matcher=matcher,
+        )
+        self._iniciar_etapa(arquivo_retorno, ArquivoRetorno.Etapa.CONCLUIDA)
+        arquivo_retorno.checkpoint_dados = {
+            **arquivo_retorno.checkpoint_dados,
+            "pagamentos": resumo_pm,
+        }
+        arquivo_retorno.save(
+            update_fields=[
+                "etapa",
+                "etapa_iniciada_em",
+                "etapa_processados_inicio",
+                "checkpoint_dados",
+                "updated_at",
+            ]
+        )
+
+    @transaction.atomic
+    def _concluir_processamento(
+        self,
+        arquivo_retorno: ArquivoRetorno,
+        motor: MotorReconciliacao,
+        logs: ImportacaoLogBuffer,
+    ) -> None:
+        self._pulsar(arquivo_retorno)
+        dados = arquivo_retorno.checkpoint_dados
+        duplicate_cpfs = dados["cpfs_duplicados"]
+        resumo_pm = dados["pagamentos"]
+
+        resumo = motor.resumir()
+        resumo.update(dados["meta"])
+        resumo["cpfs_duplicados_arquivo"] = len(duplicate_cpfs)
+        resumo["linhas_duplicadas_ignoradas"] = sum(
+            len(linhas) for linhas in duplicate_cpfs.values()
+        )
+        resumo.update(resumo_pm)
+        if "itens_por_particao" in dados:
+            resumo["itens_por_particao"] = dados["itens_por_particao"]
+        logs.fechar()
+
+        arquivo_retorno.total_registros = dados["total_itens"]
+        arquivo_retorno.processados = arquivo_retorno.itens.filter(processado=True).count()
+        arquivo_retorno.nao_encontrados = resumo["nao_encontrado"]
+        arquivo_retorno.erros = resumo["erro"] + dados["total_warnings"]
+        arquivo_retorno.resultado_resumo = resumo
+        arquivo_retorno.status = ArquivoRetorno.Status.CONCLUIDO
+        arquivo_retorno.processado_em = timezone.now()
+        arquivo_retorno.save(
+            update_fields=[
+                "total_registros",
+                "processados",
+                "nao_encontrados",
+                "erros",
+                "resultado_resumo",
+                "status",
+                "processado_em",
+                "updated_at",
+            ]
+        )
+        ImportacaoLog.objects.create(
+            arquivo_retorno=arquivo_retorno,
+            tipo=ImportacaoLog.Tipo.BAIXA,
+            mensagem=(
+                f"Importação concluída: {resumo_pm['pm_criados']} lançamentos, "
+                f"{resumo_pm['pm_duplicados']} duplicados ignorados, "
+                f"{resumo_pm['pm_cpfs_duplicados_arquivo']} CPFs duplicados no arquivo isolados, "
+                f"{resumo_pm['pm_vinculados']} vinculados a associados, "
+                f"{resumo_pm['pm_nao_encontrados']} não encontrados."
+            ),
+            dados=resumo,
+        )
 
     def _upsert_pagamentos_mensalidade(
         self,
         arquivo_retorno: ArquivoRetorno,
-        items: list[dict],
+        items: Iterable[Mapping],
         import_uuid: str,
         user,
         ignored_cpfs: set[str] | None = None,
+        matcher: AssociadoMatcher | None = None,
     ) -> dict:
         """Cria ou atualiza registros de PagamentoMensalidade com lógica de upsert.
         Equivalente ao baixaUpload do PHP AdminController.
@@ -224,6 +1215,10 @@ class ArquivoRetornoService:
         - Upsert por (cpf_cnpj, referencia_month)
         - Duplicado: mantém registro; backfill de associado se não tiver vínculo
         - Novo: cria com todos os campos
+        - Pares existentes da competência são lidos de uma vez; novos entram via
+          bulk_create e backfills via bulk_update, protegidos pela constraint única.
+          Linhas recusadas pelo banco contam em pm_erros; pares inseridos antes
+          por uma importação concorrente contam como duplicados
         - Se cadastro tiver 3+ pagamentos com status_code in ['1','4'] → campo não existe aqui
           (lógica de conclusão de contrato é responsabilidade da reconciliação)
 
@@ -236,6 +1231,7 @@ class ArquivoRetornoService:
         erros_list: list[dict] = []
         ignored_cpfs = ignored_cpfs or set()
         ignored_lines = 0
+        matcher = matcher or AssociadoMatcher.carregar()
 
         # referencia_month vem da competencia do arquivo (MM/YYYY → YYYY-MM-01)
         competencia = arquivo_retorno.resultado_resumo.get("competencia", "")
@@ -246,79 +1242,124 @@ class ArquivoRetornoService:
 
         source_path = arquivo_retorno.arquivo_url
 
-        for i, item in enumerate(items):
-            cpf = re.sub(r"\D", "", item.get("cpf_cnpj", ""))
-            if not cpf:
-                continue
-            if cpf in ignored_cpfs:
-                ignored_lines += 1
-                continue
+        # Todos os pares (cpf_cnpj, referencia_month) da competência em uma consulta.
+        # Inclui registros com soft delete: a constraint única também os considera.
+        existentes: dict[str, tuple[int, int | None]] = {
+            cpf: (pk, associado_id)
+            for pk, cpf, associado_id in PagamentoMensalidade.all_objects.filter(
+                referencia_month=ref_date
+            ).values_list("pk", "cpf_cnpj", "associado_id")
+        }
+        vistos: set[str] = set()
+        backfills: list[PagamentoMensalidade] = []
 
-            valor = item.get("valor_descontado", item.get("valor"))
-            status = item.get("status_codigo", item.get("status_code", ""))
-            matricula = item.get("matricula_servidor", item.get("matricula", ""))
-            nome = item.get("nome_servidor", item.get("nome", ""))
-            orgao = (
-                item.get("orgao_pagto_nome")
-                or item.get("orgao_pagto")
-                or item.get("orgao_pagto_codigo", "")
-            )
-            orgao_codigo = item.get("orgao_pagto_codigo", "")
-            orgao_interno = item.get("orgao_codigo", "")
-            linha = item.get("linha_numero", i + 1)
+        linhas = enumerate(items)
+        for lote in iter(lambda: list(islice(linhas, self.chunk_size)), []):
+            novos: list[tuple[PagamentoMensalidade, dict]] = []
+            for i, item in lote:
+                cpf = re.sub(r"\D", "", item.get("cpf_cnpj", ""))
+                if not cpf:
+                    continue
+                if cpf in ignored_cpfs:
+                    ignored_lines += 1
+                    continue
 
-            try:
-                assoc = find_associado(
-                    cpf=cpf,
-                    matricula=matricula,
-                    nome=nome,
-                    orgao=orgao,
-                    orgao_alternativo=orgao_codigo,
-                    orgao_codigo=orgao_interno,
+                valor = item.get("valor_descontado", item.get("valor"))
+                status = item.get("status_codigo", item.get("status_code", ""))
+                matricula = item.get("matricula_servidor", item.get("matricula", ""))
+                nome = item.get("nome_servidor", item.get("nome", ""))
+                orgao = (
+                    item.get("orgao_pagto_nome")
+                    or item.get("orgao_pagto")
+                    or item.get("orgao_pagto_codigo", "")
                 )
+                orgao_codigo = item.get("orgao_pagto_codigo", "")
+                orgao_interno = item.get("orgao_codigo", "")
+                linha = item.get("linha_numero", i + 1)
 
-                existing = PagamentoMensalidade.objects.filter(
-                    cpf_cnpj=cpf,
-                    referencia_month=ref_date,
-                ).first()
+                try:
+                    associado_id, _regra = matcher.resolver(
+                        cpf=cpf,
+                        matricula=matricula,
+                        nome=nome,
+                        orgao=orgao,
+                        orgao_alternativo=orgao_codigo,
+                        orgao_codigo=orgao_interno,
+                    )
+                except Exception as exc:
+                    erros_list.append({
+                        "linha": linha, "cpf": cpf, "nome": nome, "motivo": str(exc),
+                    })
+                    logger.warning(
+                        "[RETORNO] erro ao upsert PagamentoMensalidade linha=%s: %s", linha, exc
+                    )
+                    continue
 
-                if existing:
+                if cpf in existentes or cpf in vistos:
                     # Duplicado: backfill do vínculo se não tiver
                     duplicados += 1
-                    if not existing.associado_id and assoc:
-                        existing.associado = assoc
-                        existing.save(update_fields=["associado", "updated_at"])
+                    pk, existente_associado_id = existentes.get(cpf, (None, None))
+                    if pk and not existente_associado_id and associado_id:
+                        existentes[cpf] = (pk, associado_id)
+                        backfills.append(
+                            PagamentoMensalidade(
+                                pk=pk, associado_id=associado_id, updated_at=timezone.now()
+                            )
+                        )
                         vinculados += 1
                     continue
 
                 # Novo lançamento
-                PagamentoMensalidade.objects.create(
-                    created_by=user,
-                    import_uuid=import_uuid,
-                    referencia_month=ref_date,
-                    status_code=status,
-                    matricula=matricula,
-                    orgao_pagto=orgao,
-                    nome_relatorio=nome,
-                    cpf_cnpj=cpf,
-                    valor=valor,
-                    source_file_path=source_path,
-                    associado=assoc,
+                vistos.add(cpf)
+                novos.append(
+                    (
+                        PagamentoMensalidade(
+                            created_by=user,
+                            import_uuid=import_uuid,
+                            referencia_month=ref_date,
+                            status_code=status,
+                            matricula=matricula,
+                            orgao_pagto=orgao,
+                            nome_relatorio=nome,
+                            cpf_cnpj=cpf,
+                            valor=valor,
+                            source_file_path=source_path,
+                            associado_id=associado_id,
+                        ),
+                        {
+                            "linha": linha, "cpf": cpf, "nome": nome,
+                            "valor": str(valor), "status": status,
+                        },
+                    )
                 )
+
+            _, recusados = self._bulk_criar_pagamentos(
+                [pagamento for pagamento, _ in novos], ref_date
+            )
+            for pagamento, detalhe in novos:
+                if pagamento.cpf_cnpj in recusados:
+                    motivo = recusados[pagamento.cpf_cnpj]
+                    if motivo is None:
+                        # Inserido por outra importação concorrente.
+                        duplicados += 1
+                        continue
+                    erros_list.append({**detalhe, "motivo": motivo})
+                    logger.warning(
+                        "[RETORNO] erro ao upsert PagamentoMensalidade linha=%s: %s",
+                        detalhe["linha"],
+                        motivo,
+                    )
+                    continue
                 criados += 1
-                if assoc:
+                if pagamento.associado_id:
                     vinculados += 1
                 else:
-                    nao_encontrados_list.append({
-                        "linha": linha, "cpf": cpf, "nome": nome,
-                        "valor": str(valor), "status": status,
-                    })
+                    nao_encontrados_list.append(detalhe)
 
-            except Exception as exc:
-                erros_list.append({
-                    "linha": linha, "cpf": cpf, "nome": nome, "motivo": str(exc),
-                })
-                logger.warning("[RETORNO] erro ao upsert PagamentoMensalidade linha=%s: %s", linha, exc)
+        if backfills:
+            PagamentoMensalidade.all_objects.bulk_update(
+                backfills, ["associado", "updated_at"], batch_size=self.chunk_size
+            )
 
         resumo_pagamentos = {
             "pm_criados": criados,
@@ -335,67 +1376,100 @@ class ArquivoRetornoService:
         )
         return resumo_pagamentos
 
-    def _detect_duplicate_cpfs(self, items: list[dict]) -> dict[str, list[dict]]:
-        contagem = Counter(
-            re.sub(r"\D", "", str(item.get("cpf_cnpj", "")))
-            for item in items
-            if item.get("cpf_cnpj")
-        )
-        duplicados = {
-            cpf: []
-            for cpf, total in contagem.items()
-            if cpf and total > 1
+    def _bulk_criar_pagamentos(
+        self, pagamentos: list[PagamentoMensalidade], ref_date
+    ) -> tuple[set[str], dict[str, str | None]]:
+        """Insere em lote; devolve os CPFs inseridos e os recusados com o motivo.
+
+        O lote entra num bulk_create simples (sem ``ignore_conflicts``, que no
+        MySQL vira INSERT IGNORE e esconde truncamentos e FKs inválidas). Se o
+        banco recusa o lote, ele é refeito linha a linha, cada uma na própria
+        savepoint. Uma violação de unicidade cujo par agora existe veio de outra
+        importação e tem motivo ``None``; as demais falhas trazem a mensagem.
+        """
+        if not pagamentos:
+            return set(), {}
+        try:
+            with transaction.atomic():
+                PagamentoMensalidade.objects.bulk_create(pagamentos)
+            return {pagamento.cpf_cnpj for pagamento in pagamentos}, {}
+        except DatabaseError:
+            pass
+
+        inseridos: set[str] = set()
+        recusados: dict[str, str | None] = {}
+        for pagamento in pagamentos:
+            pagamento.pk = None
+            try:
+                with transaction.atomic():
+                    PagamentoMensalidade.objects.bulk_create([pagamento])
+            except IntegrityError as exc:
+                concorrente = PagamentoMensalidade.all_objects.filter(
+                    cpf_cnpj=pagamento.cpf_cnpj, referencia_month=ref_date
+                ).exists()
+                recusados[pagamento.cpf_cnpj] = None if concorrente else str(exc)
+            except DatabaseError as exc:
+                recusados[pagamento.cpf_cnpj] = str(exc)
+            else:
+                inseridos.add(pagamento.cpf_cnpj)
+        return inseridos, recusados
+
+    def _detect_duplicate_cpfs(
+        self, linhas_por_cpf: dict[str, list[int]]
+    ) -> dict[str, list[int]]:
+        return {
+            cpf: linhas
+            for cpf, linhas in linhas_por_cpf.items()
+            if cpf and len(linhas) > 1
         }
-        if not duplicados:
-            return {}
-        for item in items:
-            cpf = re.sub(r"\D", "", str(item.get("cpf_cnpj", "")))
-            if cpf in duplicados:
-                duplicados[cpf].append(item)
-        return duplicados
 
     def _marcar_cpfs_duplicados(
-        self, arquivo_retorno: ArquivoRetorno, duplicate_cpfs: dict[str, list[dict]]
+        self,
+        arquivo_retorno: ArquivoRetorno,
+        duplicate_cpfs: dict[str, list[int]],
+        logs: ImportacaoLogBuffer,
     ) -> None:
-        observacao = (
-            "CPF duplicado no mesmo arquivo retorno. "
-            "As linhas foram isoladas da baixa automática para revisão manual."
-        )
-        for cpf, itens in duplicate_cpfs.items():
-            linhas = [item.get("linha_numero") for item in itens]
+        for cpf, linhas in duplicate_cpfs.items():
             arquivo_retorno.itens.filter(cpf_cnpj=cpf).update(
                 processado=True,
                 resultado_processamento=ArquivoRetornoItem.ResultadoProcessamento.PENDENCIA_MANUAL,
-                observacao=observacao,
+                observacao=OBSERVACAO_CPF_DUPLICADO,
                 associado=None,
                 parcela=None,
             )
-            ImportacaoLog.objects.create(
-                arquivo_retorno=arquivo_retorno,
-                tipo=ImportacaoLog.Tipo.VALIDACAO,
-                mensagem="CPF duplicado isolado da conciliação automática.",
-                dados={"cpf_cnpj": cpf, "linhas": linhas},
+            logs.add(
+                ImportacaoLog.Tipo.VALIDACAO,
+                "CPF duplicado isolado da conciliação automática.",
+                {"cpf_cnpj": cpf, "linhas": linhas},
             )
 
-    def _persistir_itens(self, arquivo_retorno: ArquivoRetorno, items: list[dict]) -> None:
+    def _persistir_itens(
+        self,
+        arquivo_retorno: ArquivoRetorno,
+        items: Iterable[Mapping],
+        logs: ImportacaoLogBuffer,
+    ) -> None:
         objetos: list[ArquivoRetornoItem] = []
         for item in items:
             try:
                 ArquivoRetornoValidator.validar_item(item)
             except ValidationError as exc:
-                ImportacaoLog.objects.create(
-                    arquivo_retorno=arquivo_retorno,
-                    tipo=ImportacaoLog.Tipo.VALIDACAO,
-                    mensagem="Item inválido ignorado durante a persistência.",
-                    dados={
+                logs.add(
+                    ImportacaoLog.Tipo.VALIDACAO,
+                    "Item inválido ignorado durante a persistência.",
+                    {
                         "linha_numero": item.get("linha_numero"),
                         "erros": exc.detail,
                     },
                 )
                 continue
             objetos.append(ArquivoRetornoItem(arquivo_retorno=arquivo_retorno, **item))
+            if len(objetos) >= self.chunk_size:
+                ArquivoRetornoItem.objects.bulk_create(objetos)
+                objetos = []
 
-        ArquivoRetornoItem.objects.bulk_create(objetos)
+        if objetos:
+            ArquivoRetornoItem.objects.bulk_create(objetos)
 
     def _arquivo_path(self, arquivo_retorno: ArquivoRetorno) -> str:
         return default_storage.path(arquivo_retorno.arquivo_url)
@@ -410,4 +1484,51 @@ class ArquivoRetornoService:
         try:
             processar_arquivo_retorno.delay(arquivo_retorno_id)
         except Exception:
-            self.processar(arquivo_retorno_id)
+            if not settings.IMPORTACAO_FILA_LOCAL:
+                self.processar(arquivo_retorno_id)
+                return
+            self._enfileirar_localmente(arquivo_retorno_id)
+
+    def _dispatch_lote(self, arquivo_retorno_ids: list[int]) -> None:
+        from .tasks import processar_lote_retorno
+
+        if not arquivo_retorno_ids:
+            return
+        if getattr(settings, "CELERY_TASK_ALWAYS_EAGER", False):
+            self.processar_lote(arquivo_retorno_ids)
+            return
+
+        try:
+            processar_lote_retorno.delay(arquivo_retorno_ids)
+        except Exception:
+            if not settings.IMPORTACAO_FILA_LOCAL:
+                self.processar_lote(arquivo_retorno_ids)
+                return
+            # A fila local tem um único consumidor: a ordem do lote se mantém.
+            for arquivo_retorno_id in arquivo_retorno_ids:
+                self._enfileirar_localmente(arquivo_retorno_id)
+
+    def _enfileirar_localmente(self, arquivo_retorno_id: int) -> None:
+        """Broker fora: o processamento vai para a fila em processo, sem prender a request."""
+        from .fila_local import fila_local
+
+        if fila_local().enfileirar(arquivo_retorno_id):
+            ImportacaoLog.objects.create(
+                arquivo_retorno_id=arquivo_retorno_id,
+                tipo=ImportacaoLog.Tipo.UPLOAD,
+                mensagem="Broker indisponível; processamento enviado à fila local.",
+            )
+            return
+
+        logger.error(
+            "[RETORNO] broker indisponível e fila local cheia; arquivo %s aguardando",
+            arquivo_retorno_id,
+        )
+        ImportacaoLog.objects.create(
+            arquivo_retorno_id=arquivo_retorno_id,
+            tipo=ImportacaoLog.Tipo.ERRO,
+            mensagem=(
+                "Broker indisponível e fila local cheia; "
+                "o arquivo segue pendente até ser reprocessado."
+            ),
+        )
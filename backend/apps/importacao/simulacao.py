@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from itertools import islice
+
+from apps.contratos.models import Ciclo
+
+from .matching import AssociadoMatcher
+from .models import ArquivoRetorno, ArquivoRetornoItem
+from .reconciliacao import _PlanoEncerramento
+from .reconciliacao_lote import MotorReconciliacaoEmLote
+
+
+class LogsDescartados:
+    """Substitui o ImportacaoLogBuffer quando nada pode ser gravado."""
+
+    def add(self, tipo: str, mensagem: str, dados: dict | None = None) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def fechar(self) -> None:
+        pass
+
+
+class MotorSimulacao(MotorReconciliacaoEmLote):
+    """Prévia da reconciliação: as regras do motor em lote, sem gravar nada.
+
+    Os itens não precisam estar no banco e o retrato é lido sem travas. Como
+    nenhum trecho é gravado, o retrato vale para o arquivo inteiro: baixas,
+    encerramentos e ciclos criados em um trecho seguem visíveis nos seguintes,
+    como estariam no banco em uma importação de verdade.
+    """
+
+    travar_parcelas = False
+
+    def __init__(self, arquivo_retorno: ArquivoRetorno, matcher: AssociadoMatcher | None = None):
+        super().__init__(arquivo_retorno, matcher=matcher, logs=LogsDescartados())
+        self._contratos_carregados: set[int] = set()
+
+    def simular(self, itens: list[ArquivoRetornoItem]) -> list[ArquivoRetornoItem]:
+        """Reconcilia ``itens`` em memória, em ordem de linha e por trechos."""
+        restantes = iter(itens)
+        for trecho in iter(lambda: list(islice(restantes, self.chunk_size)), []):
+            self._reconciliar_itens(trecho)
+        return itens
+
+    def _carregar(self, itens: list[ArquivoRetornoItem]) -> None:
+        # Só contratos ainda fora do retrato; os já carregados guardam o estado simulado.
+        contrato_ids = set(self._contratos_de(self._resolver_matches(itens)))
+        contrato_ids -= self._contratos_carregados
+        self._contratos_carregados |= contrato_ids
+        self._carregar_ciclos(contrato_ids)
+
+    def _registrar_baixa(
+        self, ciclo: Ciclo, item: ArquivoRetornoItem, *, baixou: bool
+    ) -> None:
+        # Ciclos criados na simulação não têm pk; no retrato cada ciclo é um só objeto.
+        registrado = self._baixas.get(id(ciclo))
+        if registrado is None or baixou:
+            self._baixas[id(ciclo)] = (ciclo, item, baixou)
+
+    def _salvar(self, obj, update_fields: list[str] | None = None) -> None:
+        pass
+
+    def _gravar_encerramentos(self, plano: _PlanoEncerramento) -> None:
+        pass
+
+    def _gravar(self, itens: list[ArquivoRetornoItem]) -> None:
+        pass
+
@@ -0,0 +1,243 @@
+"""Arquivos retorno ETIPI sintéticos para medir parser e importação.
+
+O layout segue o que ETIPITxtRetornoParser espera: cabeçalho por página, seções
+por status com blocos de órgão pagador, ``Total do Status`` ao fim de cada
+seção, quebras de página (form feed) entre blocos e a legenda no final. Tudo é
+determinístico a partir do índice da linha e da semente, então o mesmo arquivo
+pode ser regenerado e os associados correspondentes semeados no banco.
+"""
+
+from __future__ import annotations
+
+import random
+from collections.abc import Iterator
+from dataclasses import dataclass
+from decimal import Decimal
+from pathlib import Path
+from typing import TextIO
+
+# Proporção aproximada dos status em um retorno mensal real.
+STATUS_PESOS = (
+    ("1", 85),
+    ("2", 6),
+    ("3", 3),
+    ("4", 2),
+    ("5", 1),
+    ("6", 1),
+    ("S", 2),
+)
+
+ORGAOS = (
+    ("002", "SEC. EST. ADMIN. E PREVIDEN."),
+    ("012", "SEC DE SAUDE"),
+    ("019", "SEC. DA EDUCACAO"),
+    ("021", "POLICIA MILITAR"),
+    ("034", "SEC. DA FAZENDA"),
+    ("090", "PIAUIPREV PENSIONISTAS"),
+    ("091", "PIAUIPREV APOSENTADOS"),
+)
+
+CARGOS = (
+    "-",
+    "1-AGENTE OPERACIONAL DE SERVIC",
+    "2-AGENTE TECNICO DE SERVICO",
+    "PROFESSOR",
+    "SOLDADO PM",
+    "AUXILIAR DE ENFERMAGEM",
+)
+
+PRENOMES = (
+    "MARIA", "JOSE", "ANTONIO", "FRANCISCA", "FRANCISCO", "ANA", "JOAO",
+    "RAIMUNDA", "PEDRO", "LUCIA", "CARLOS", "TERESA", "PAULO", "JOANA",
+)
+SOBRENOMES = (
+    "SILVA", "SOUSA", "COSTA", "OLIVEIRA", "SANTOS", "PEREIRA", "ARAUJO",
+    "RODRIGUES", "ALVES", "LIMA", "CARVALHO", "GOMES", "BATISTA", "NASCIMENTO",
+)
+
+LEGENDA = (
+    " 1 - Lançado e Efetivado",
+    " 2 - Não Lançado por Falta de Margem Temporariamente",
+    " 3 - Não Lançado por Outros Motivos",
+    " 4 - Lançado com Valor Diferente",
+    " 5 - Não Lançado por Problemas Técnicos",
+    " 6 - Lançamento com Erros",
+    " S - Não Lançado: Compra de Dívida ou Suspensão SEAD",
+)
+
+VALOR_MENSALIDADE = Decimal("30.00")
+
+
+def cpf_sintetico(indice: int) -> str:
+    """CPF válido (com dígitos verificadores) e único para cada índice."""
+    base = [int(digito) for digito in f"{indice + 100_000_000:09d}"[-9:]]
+    for tamanho in (9, 10):
+        soma = sum(digito * peso for digito, peso in zip(base, range(tamanho + 1, 1, -1)))
+        resto = soma * 10 % 11
+        base.append(0 if resto == 10 else resto)
+    return "".join(map(str, base))
+
+
+def nome_sintetico(indice: int) -> str:
+    prenome = PRENOMES[indice % len(PRENOMES)]
+    meio = SOBRENOMES[indice // len(PRENOMES) % len(SOBRENOMES)]
+    fim = SOBRENOMES[indice // (len(PRENOMES) * len(SOBRENOMES)) % len(SOBRENOMES)]
+    return f"{prenome} {meio} {fim}"[:30]
+
+
+def matricula_sintetica(indice: int) -> str:
+    return f"{indice % 1_000_000:06d}-{indice % 10}"
+
+
+@dataclass(frozen=True, slots=True)
+class LinhaSintetica:
+    indice: int
+    status: str
+    orgao_codigo: str
+    cargo: str
+
+    @property
+    def cpf(self) -> str:
+        return cpf_sintetico(self.indice)
+
+    @property
+    def nome(self) -> str:
+        return nome_sintetico(self.indice)
+
+    @property
+    def matricula(self) -> str:
+        return matricula_sintetica(self.indice)
+
+    @property
+    def valor(self) -> Decimal:
+        # Status 4 é "lançado com valor diferente".
+        return VALOR_MENSALIDADE - 5 if self.status == "4" else VALOR_MENSALIDADE
+
+    def formatar(self) -> str:
+        return (
+            f"{self.status:>3}    "
+            f"{self.matricula:<10}"
+            f"{self.nome:<31}"
+            f"{self.cargo[:30]:<31}"
+            f"{'6580':>5}"
+            f"{self.orgao_codigo:>6}"
+            f"{'999':>7}"
+            f"{'001':>12}"
+            f"{self.valor:>13}"
+            f"{self.orgao_codigo:>12}"
+            f"{self.cpf}"
+        )
+
+
+class GeradorRetornoETIPI:
+    """Gera um retorno ETIPI com ``itens`` linhas de detalhe."""
+
+    def __init__(
+        self,
+        itens: int,
+        *,
+        competencia: str = "05/2025",
+        data_geracao: str = "23/05/2025",
+        semente: int = 0,
+        linhas_por_pagina: int = 60,
+        bloco_maximo: int = 40,
+    ):
+        self.itens = itens
+        self.competencia = competencia
+        self.data_geracao = data_geracao
+        self.semente = semente
+        self.linhas_por_pagina = linhas_por_pagina
+        self.bloco_maximo = bloco_maximo
+
+    def linhas(self) -> Iterator[LinhaSintetica]:
+        """Linhas de detalhe na ordem do arquivo: por status, depois por bloco."""
+        for status, indices in self._secoes():
+            for inicio, fim in self._blocos(indices, status):
+                orgao_codigo, _ = self._orgao(inicio)
+                for indice in range(inicio, fim):
+                    yield self._linha(indice, status, orgao_codigo)
+
+    def escrever(self, destino: TextIO) -> int:
+        pagina = 1
+        linhas_na_pagina = self._cabecalho(destino, pagina)
+        total = 0
+        for status, indices in self._secoes():
+            quantidade = 0
+            for inicio, fim in self._blocos(indices, status):
+                if linhas_na_pagina + (fim - inicio) + 2 > self.linhas_por_pagina:
+                    # Quebra só entre blocos: o parser fecha o bloco no cabeçalho.
+                    destino.write("\x0c\n")
+                    pagina += 1
+                    linhas_na_pagina = self._cabecalho(destino, pagina)
+                orgao_codigo, orgao_nome = self._orgao(inicio)
+                for indice in range(inicio, fim):
+                    destino.write(self._linha(indice, status, orgao_codigo).formatar() + "\n")
+                bloco = fim - inicio
+                destino.write(
+                    f"       Órgão Pagamento:  {orgao_codigo}-{orgao_nome:<32}-  "
+                    f"{bloco} Lançamento(s)  -  Total R$ {VALOR_MENSALIDADE * bloco}\n\n"
+                )
+                linhas_na_pagina += bloco + 2
+                quantidade += bloco
+            destino.write(
+                f"              Total do Status:  {status}  -  {quantidade} Lançamento(s)  "
+                f"-  Total R$ {VALOR_MENSALIDADE * quantidade}\n\n"
+            )
+            linhas_na_pagina += 2
+            total += quantidade
+
+        destino.write("\nLegenda do Status\n" + "-" * 81 + "\n")
+        destino.write("\n".join(LEGENDA) + "\n")
+        return total
+
+    def salvar(self, caminho: str | Path, encoding: str = "latin-1") -> int:
+        with open(caminho, "w", encoding=encoding, newline="\n") as destino:
+            return self.escrever(destino)
+
+    def _secoes(self) -> Iterator[tuple[str, range]]:
+        peso_total = sum(peso for _, peso in STATUS_PESOS)
+        inicio = 0
+        for posicao, (status, peso) in enumerate(STATUS_PESOS):
+            if posicao == len(STATUS_PESOS) - 1:
+                fim = self.itens
+            else:
+                fim = min(self.itens, inicio + round(self.itens * peso / peso_total))
+            if fim > inicio:
+                yield status, range(inicio, fim)
+            inicio = fim
+
+    def _blocos(self, indices: range, status: str) -> Iterator[tuple[int, int]]:
+        rng = random.Random(f"{self.semente}:{status}")
+        inicio = indices.start
+        while inicio < indices.stop:
+            fim = min(indices.stop, inicio + rng.randint(1, self.bloco_maximo))
+            yield inicio, fim
+            inicio = fim
+
+    def _orgao(self, indice: int) -> tuple[str, str]:
+        return ORGAOS[(indice * 7 + self.semente) % len(ORGAOS)]
+
+    def _linha(self, indice: int, status: str, orgao_codigo: str) -> LinhaSintetica:
+        return LinhaSintetica(
+            indice=indice,
+            status=status,
+            orgao_codigo=orgao_codigo,
+            cargo=CARGOS[(indice + self.semente) % len(CARGOS)],
+        )
+
+    def _cabecalho(self, destino: TextIO, pagina: int) -> int:
+        destino.write(
+            f"{'Governo do Estado do Piauí':<136}Pág: {pagina:>4}\n"
+            "Empresa de Tecnologia da Informação do Estado do Piauí - ETIPI\n"
+            "Relatório dos Lançamentos da Folha de Pagamento - iNETConsig\n"
+            "\n"
+            "Entidade: 2102-Assoc. Benef. e Assist. dos Serv. Públicos - ABASE"
+            f"             Referência: {self.competencia}"
+            f"   Data da Geração: {self.data_geracao}\n"
+            "\n"
+            "STATUS MATRICULA NOME                           CARGO                          "
+            "FIN. ORGAO LANC.  TOTAL PAGO  VALOR        ORGAO PAGTO CPF\n"
+            "====== ========= ============================== ============================== "
+            "==== ============ ===== ===== ============ =========== ===========\n"
+        )
+        return 8
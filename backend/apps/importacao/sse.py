@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+import time
+from collections.abc import Iterator
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+from .models import ArquivoRetorno
+from .serializers import ArquivoRetornoProgressoSerializer
+
+
+def evento(nome: str, dados) -> str:
+    return f"event: {nome}\ndata: {json.dumps(dados, cls=DjangoJSONEncoder)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Permite negociar ``text/event-stream``.
+
+    O corpo de sucesso é um StreamingHttpResponse montado pela view; este
+    renderer só formata respostas de erro (404, 403) como um evento ``erro``.
+    """
+
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return evento("erro", data).encode(self.charset)
+
+
+def eventos_progresso(
+    arquivo_retorno_id: int,
+    *,
+    intervalo: float | None = None,
+    duracao_maxima: int | None = None,
+) -> Iterator[str]:
+    """Emite o progresso do arquivo até ele terminar ou a duração máxima vencer.
+
+    Cada consulta lê só as colunas de progresso. Sem mudança, sai um comentário
+    de keep-alive. Ao estourar a duração o stream fecha e o EventSource do
+    navegador reconecta sozinho após ``retry``.
+    """
+    intervalo = intervalo if intervalo is not None else settings.IMPORTACAO_PROGRESSO_SSE_INTERVALO
+    duracao_maxima = (
+        duracao_maxima
+        if duracao_maxima is not None
+        else settings.IMPORTACAO_PROGRESSO_SSE_DURACAO_MAXIMA
+    )
+    limite = time.monotonic() + duracao_maxima
+    campos = ArquivoRetornoProgressoSerializer.CAMPOS_MODELO
+
+    yield f"retry: {max(int(intervalo * 1000), 1000)}\n\n"
+    anterior = None
+    while True:
+        arquivo = ArquivoRetorno.objects.only(*campos).filter(pk=arquivo_retorno_id).first()
+        if arquivo is None:
+            yield evento("erro", {"detail": "Arquivo retorno não encontrado."})
+            return
+
+        dados = ArquivoRetornoProgressoSerializer(arquivo).data
+        if dados != anterior:
+            yield evento("progresso", dados)
+            anterior = dados
+        else:
+            yield ": keep-alive\n\n"
+
+        if arquivo.status in {ArquivoRetorno.Status.CONCLUIDO, ArquivoRetorno.Status.ERRO}:
+            yield evento("fim", {"status": arquivo.status})
+            return
+        if time.monotonic() >= limite:
+            return
+        time.sleep(intervalo)
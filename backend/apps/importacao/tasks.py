@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from celery import shared_task
+from celery import chord, shared_task
+from celery.signals import worker_ready
+from django.conf import settings
 
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
@@ -9,6 +11,75 @@ def processar_arquivo_retorno(self, arquivo_retorno_id: int):
 
     service = ArquivoRetornoService()
     try:
+        if settings.IMPORTACAO_RECONCILIACAO_PARTICOES > 1:
+            return disparar_particoes(service, arquivo_retorno_id)
         return service.processar(arquivo_retorno_id)
     except Exception as exc:
+        # A nova tentativa retoma do checkpoint gravado por esta.
         raise self.retry(exc=exc)
+
+
+@shared_task
+def processar_lote_retorno(arquivo_retorno_ids: list[int]) -> list[int]:
+    from .services import ArquivoRetornoService
+
+    # Sem retry do lote: cada arquivo registra a própria falha e pode ser reprocessado.
+    return ArquivoRetornoService().processar_lote(arquivo_retorno_ids)
+
+
+@shared_task
+def recuperar_processamentos_retorno() -> list[int]:
+    from .services import ArquivoRetornoService
+
+    return ArquivoRetornoService().recuperar_parados()
+
+
+@shared_task
+def limpar_artefatos_parse() -> int:
+    from .services import ArquivoRetornoService
+
+    return ArquivoRetornoService().limpar_artefatos()
+
+
+@worker_ready.connect
+def recuperar_ao_iniciar_worker(sender=None, **kwargs):
+    # Jobs perdidos num deploy ou restart voltam assim que um worker sobe.
+    recuperar_processamentos_retorno.delay()
+
+
+def disparar_particoes(service, arquivo_retorno_id: int) -> list[int]:
+    """Grava e reparte os itens, reconcilia cada partição em uma task e fecha no chord."""
+    particoes = service.preparar_particoes(
+        arquivo_retorno_id, settings.IMPORTACAO_RECONCILIACAO_PARTICOES
+    )
+    fechamento = concluir_arquivo_retorno.s(arquivo_retorno_id)
+    if particoes:
+        chord(
+            reconciliar_particao_retorno.s(arquivo_retorno_id, particao)
+            for particao in particoes
+        )(fechamento)
+    else:
+        fechamento.delay([])
+    return particoes
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def reconciliar_particao_retorno(self, arquivo_retorno_id: int, particao: int) -> int:
+    from .services import ArquivoRetornoService
+
+    try:
+        return ArquivoRetornoService().reconciliar_particao(arquivo_retorno_id, particao)
+    except Exception as exc:
+        # Trechos já commitados ficam; a nova tentativa segue dos pendentes.
+        raise self.retry(exc=exc)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def concluir_arquivo_retorno(self, itens_por_particao: list[int], arquivo_retorno_id: int):
+    from .services import ArquivoRetornoService
+
+    try:
+        ArquivoRetornoService().concluir_particoes(arquivo_retorno_id, itens_por_particao)
+    except Exception as exc:
+        raise self.retry(exc=exc)
+    return arquivo_retorno_id
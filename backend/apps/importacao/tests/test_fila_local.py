@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import threading
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from ..fila_local import FilaLocalProcessamento
+from ..services import ArquivoRetornoService
+from ..tasks import processar_arquivo_retorno
+
+
+class FilaLocalProcessamentoTestCase(SimpleTestCase):
+    def test_processa_localmente_enquanto_broker_esta_fora_e_escoa_quando_volta(self):
+        fila = FilaLocalProcessamento(tamanho_maximo=2)
+        iniciou = threading.Event()
+        liberar = threading.Event()
+        processados = []
+
+        def processar(service, arquivo_retorno_id):
+            iniciou.set()
+            liberar.wait(timeout=5)
+            processados.append(arquivo_retorno_id)
+
+        with (
+            patch.object(
+                processar_arquivo_retorno,
+                "apply_async",
+                side_effect=[ConnectionError("broker fora"), None, None],
+            ) as apply_async,
+            patch.object(ArquivoRetornoService, "processar", autospec=True, side_effect=processar),
+        ):
+            self.assertTrue(fila.enfileirar(1))
+            self.assertTrue(iniciou.wait(timeout=5))
+            # O primeiro está preso no processamento local; cabem mais dois na fila.
+            self.assertTrue(fila.enfileirar(2))
+            self.assertTrue(fila.enfileirar(3))
+            self.assertFalse(fila.enfileirar(4))
+
+            liberar.set()
+            fila.aguardar()
+
+        self.assertEqual(processados, [1])
+        self.assertEqual(
+            [chamada.args[0] for chamada in apply_async.call_args_list],
+            [(1,), (2,), (3,)],
+        )
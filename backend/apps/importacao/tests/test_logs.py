@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from .base import ImportacaoBaseTestCase
+from ..logs import ImportacaoLogBuffer
+from ..models import ImportacaoLog
+
+
+class ImportacaoLogBufferTestCase(ImportacaoBaseTestCase):
+    def test_grava_em_lote_e_resume_o_excedente(self):
+        arquivo = self.create_arquivo_retorno()
+        logs = ImportacaoLogBuffer(arquivo, flush_size=2, limite_por_mensagem=3)
+
+        for linha in range(1, 11):
+            logs.add(
+                ImportacaoLog.Tipo.PARSE,
+                "Linha malformada ignorada durante o parse.",
+                {"linha_numero": linha},
+            )
+        logs.add(ImportacaoLog.Tipo.ERRO, "Status ETIPI desconhecido: 9", {"linha_numero": 11})
+
+        self.assertEqual(arquivo.logs.count(), 4)
+
+        logs.fechar()
+
+        self.assertEqual(arquivo.logs.count(), 5)
+        self.assertEqual(
+            arquivo.logs.filter(mensagem="Linha malformada ignorada durante o parse.").count(),
+            3,
+        )
+        resumo = arquivo.logs.get(mensagem__contains="ocorrências adicionais omitidas")
+        self.assertEqual(resumo.tipo, ImportacaoLog.Tipo.PARSE)
+        self.assertEqual(resumo.dados["ocorrencias_omitidas"], 7)
+        self.assertEqual(resumo.dados["primeira_linha_omitida"], 4)
+        self.assertEqual(resumo.dados["ultima_linha_omitida"], 10)
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.associados.models import Associado
+
+from .base import ImportacaoBaseTestCase
+from ..matching import AssociadoMatcher, find_associado_match
+from ..models import ArquivoRetornoItem
+from ..reconciliacao import MotorReconciliacao
+
+RegraCasamento = ArquivoRetornoItem.RegraCasamento
+
+
+class AssociadoMatcherTestCase(ImportacaoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.maria, _, _ = self.create_associado_com_contrato(
+            cpf="23993596315",
+            nome="Maria de Jesus Santana Costa",
+            matricula_orgao="030.759-9",
+            orgao_publico="SEC. EST. ADMIN. E PREVIDEN.",
+        )
+        self.jose, _, _ = self.create_associado_com_contrato(
+            cpf="21819424391",
+            nome="Jose Araujo Lima",
+            matricula_orgao="112233-4",
+            orgao_publico="Secretaria de Saude",
+        )
+        self.jose_homonimo, _, _ = self.create_associado_com_contrato(
+            cpf="04463004360",
+            nome="Jose Araujo Lima",
+            matricula_orgao="998877-6",
+            orgao_publico="Secretaria de Educacao",
+        )
+
+    def assertMesmoResultado(self, esperado_id, esperada_regra, **criterios):
+        matcher = AssociadoMatcher.carregar()
+        associado_id, regra = matcher.resolver(**criterios)
+        match = find_associado_match(**criterios)
+
+        self.assertEqual(associado_id, esperado_id)
+        self.assertEqual(regra, esperada_regra)
+        self.assertEqual(match.associado.pk if match.associado else None, esperado_id)
+        self.assertEqual(match.regra, esperada_regra)
+
+    def test_indice_em_memoria_segue_a_precedencia_do_casamento_por_banco(self):
+        self.assertMesmoResultado(self.maria.pk, RegraCasamento.CPF, cpf="239.935.963-15")
+        self.assertMesmoResultado(
+            self.maria.pk,
+            RegraCasamento.MATRICULA,
+            cpf="00000000000",
+            matricula="030759-9",
+        )
+        self.assertMesmoResultado(
+            self.jose.pk,
+            RegraCasamento.MATRICULA_DIGITOS,
+            matricula="SEAD 1122334",
+        )
+        self.assertMesmoResultado(
+            self.jose.pk,
+            RegraCasamento.NOME_ORGAO,
+            nome="JOSE ARAUJO LIMA",
+            orgao="SAUDE",
+        )
+        self.assertMesmoResultado(
+            self.maria.pk,
+            RegraCasamento.NOME,
+            nome="maria de jesus",
+            orgao="Órgão inexistente",
+        )
+        self.assertMesmoResultado(None, "", nome="JOSE ARAUJO LIMA")
+
+    def test_nome_casa_pela_mesma_regra_no_indice_e_no_banco(self):
+        self.assertMesmoResultado(self.maria.pk, RegraCasamento.NOME, nome="MARIA DE JESÚS SANT")
+        self.assertMesmoResultado(self.maria.pk, RegraCasamento.NOME, nome="santana")
+        self.assertMesmoResultado(None, "", nome="aria de jesus")
+        self.assertMesmoResultado(None, "", nome="maria de jes santana")
+        self.assertMesmoResultado(None, "", nome="araujo li")
+        self.assertMesmoResultado(
+            self.jose_homonimo.pk, RegraCasamento.NOME_ORGAO, nome="araujo li", orgao="educação"
+        )
+
+    def test_reconciliacao_registra_regra_de_casamento(self):
+        arquivo = self.create_arquivo_retorno()
+        item = ArquivoRetornoItem.objects.create(
+            arquivo_retorno=arquivo,
+            linha_numero=1,
+            cpf_cnpj="",
+            matricula_servidor="030759-9",
+            nome_servidor="MARIA DE JESUS SANTANA COSTA",
+            cargo="-",
+            competencia="05/2025",
+            valor_descontado=Decimal("30.00"),
+            status_codigo="1",
+            status_desconto=ArquivoRetornoItem.StatusDesconto.EFETIVADO,
+            status_descricao="Lançado e Efetivado",
+        )
+
+        MotorReconciliacao(arquivo, matcher=AssociadoMatcher.carregar()).reconciliar_item(item)
+
+        item.refresh_from_db()
+        self.assertEqual(item.associado_id, self.maria.pk)
+        self.assertEqual(item.regra_casamento, RegraCasamento.MATRICULA)
+
+    def test_colunas_normalizadas_acompanham_save_parcial_e_bulk_update(self):
+        self.jose.matricula_orgao = "55.667/7"
+        self.jose.save(update_fields=["matricula_orgao", "updated_at"])
+        self.jose_homonimo.matricula_orgao = "abc-123"
+        Associado.objects.bulk_update([self.jose_homonimo], ["matricula_orgao"])
+
+        self.jose.refresh_from_db()
+        self.jose_homonimo.refresh_from_db()
+        self.assertEqual(self.jose.matricula_orgao_norm, "556677")
+        self.assertEqual(self.jose.matricula_orgao_digitos, "556677")
+        self.assertEqual(self.jose_homonimo.matricula_orgao_norm, "ABC123")
+        self.assertEqual(self.jose_homonimo.matricula_orgao_digitos, "123")
+        self.assertEqual(self.jose.matricula_norm, f"MAT{self.jose.pk:05d}")
+
+    def test_busca_por_nome_usa_tokens_dobrados(self):
+        encontrados = Associado.objects.buscar_por_nome("MARIA DE JESÚS SANT")
+        self.assertEqual([associado.pk for associado in encontrados], [self.maria.pk])
+        self.assertEqual(Associado.objects.buscar_por_nome("jesus maria"), [])
+        # Prefixo de palavra, não substring: a busca começa e segue em palavras inteiras.
+        self.assertEqual(Associado.objects.buscar_por_nome("aria de jesus"), [])
+        self.assertEqual(Associado.objects.buscar_por_nome("maria de jes santana"), [])
+        self.assertEqual(
+            [associado.pk for associado in Associado.objects.buscar_por_nome("araujo li")],
+            [self.jose.pk, self.jose_homonimo.pk],
+        )
+        self.assertEqual(
+            [
+                associado.pk
+                for associado in Associado.objects.buscar_por_nome("jose araujo", limite=1)
+            ],
+            [self.jose.pk],
+        )
+        self.assertEqual(
+            [
+                associado.pk
+                for associado in Associado.objects.buscar_por_nome(
+                    "jose araujo", orgao="EDUCAÇÃO", limite=2
+                )
+            ],
+            [self.jose_homonimo.pk],
+        )
+
+        self.maria.nome_completo = "Maria Aparecida Souza"
+        self.maria.save(update_fields=["nome_completo", "updated_at"])
+        self.assertEqual(Associado.objects.buscar_por_nome("maria de jesus"), [])
+        self.assertEqual(
+            [associado.pk for associado in Associado.objects.buscar_por_nome("aparecida")],
+            [self.maria.pk],
+        )
+
+        # Sem mudança no nome, um save completo não reescreve os tokens.
+        associado = Associado.objects.get(pk=self.maria.pk)
+        associado.orgao_publico = "Outro Órgão"
+        with CaptureQueriesContext(connection) as queries:
+            associado.save()
+        self.assertFalse(any("nometoken" in query["sql"] for query in queries))
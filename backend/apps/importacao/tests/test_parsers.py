@@ -1,9 +1,21 @@
 from __future__ import annotations
 
+import json
 import tempfile
 
 from .base import ImportacaoBaseTestCase
-from ..parsers import ETIPITxtRetornoParser
+from ..parsers import (
+    ENTRY_ITEM,
+    LINHA_CABECALHO,
+    LINHA_DETALHE,
+    LINHA_FRONTEIRA,
+    LINHA_LEGENDA,
+    LINHA_ORGAO,
+    LINHA_OUTRA,
+    LINHA_RUIDO,
+    ETIPITxtRetornoParser,
+    ItemRetorno,
+)
 
 
 def build_detail_line(
@@ -50,6 +62,56 @@ class ETIPITxtRetornoParserTestCase(ImportacaoBaseTestCase):
         self.assertEqual(parsed.items[2]["orgao_pagto_nome"], "")
         self.assertEqual(parsed.warnings, [])
 
+    def test_iter_parse_entrega_os_mesmos_itens_em_chunks(self):
+        parser = ETIPITxtRetornoParser()
+
+        parsed = parser.parse(str(self.fixture_path()))
+        stream = parser.iter_parse(str(self.fixture_path()))
+        chunks = list(stream.chunks(size=3))
+
+        self.assertEqual(stream.meta, parsed.meta)
+        self.assertEqual([len(items) for items, _warnings in chunks], [3, 1])
+        self.assertEqual([item for items, _ in chunks for item in items], parsed.items)
+        self.assertEqual(
+            [kind for kind, _ in parser.iter_parse(str(self.fixture_path()))],
+            [ENTRY_ITEM] * 4,
+        )
+
+    def test_sniff_encoding_inspeciona_apenas_o_prefixo(self):
+        raw_bytes = self.fixture_bytes()
+        # Bytes inválidos em UTF-8 depois do prefixo não alteram a escolha.
+        conteudo = raw_bytes + b"\n" + b" " * ETIPITxtRetornoParser.SNIFF_BYTES + b"\xff\n"
+
+        sniff = ETIPITxtRetornoParser.sniff_encoding(conteudo)
+        text, encoding = ETIPITxtRetornoParser.decode_bytes(conteudo)
+
+        self.assertEqual(sniff.encoding, "utf-8")
+        self.assertEqual(sniff.confidence, 1.0)
+        self.assertEqual(encoding, "utf-8")
+        self.assertIn("Referência: 05/2025", text)
+
+    def test_parse_avisa_bytes_invalidos_apos_o_prefixo(self):
+        parser = ETIPITxtRetornoParser()
+        # Prefixo UTF-8 válido e, depois dele, texto em Latin-1 que o sniff não viu.
+        conteudo = (
+            self.fixture_bytes()
+            + b"\n" * 2
+            + b" " * ETIPITxtRetornoParser.SNIFF_BYTES
+            + "\nJOÃO\nCONCEIÇÃO\n".encode("latin-1")
+        )
+
+        with tempfile.NamedTemporaryFile(suffix=".txt") as temp_file:
+            temp_file.write(conteudo)
+            temp_file.flush()
+
+            parsed = parser.parse(temp_file.name)
+
+        self.assertEqual(parsed.encoding, "utf-8")
+        self.assertEqual(len(parsed.items), 4)
+        self.assertEqual(len(parsed.warnings), 1)
+        self.assertIn("Caracteres inválidos", parsed.warnings[0]["erro"])
+        self.assertEqual(parsed.warnings[0]["conteudo"], "JO\ufffdO")
+
     def test_parse_arquivo_latin1_com_acentos(self):
         parser = ETIPITxtRetornoParser()
         conteudo = """
@@ -67,6 +129,7 @@ STATUS MATRICULA NOME                           CARGO                          F
             parsed = parser.parse(temp_file.name)
 
         self.assertEqual(parsed.encoding, "latin-1")
+        self.assertEqual(parsed.encoding_confidence, 1.0)
         self.assertEqual(parsed.items[0]["nome_servidor"], "JOÃO DA SILVA")
         self.assertEqual(parsed.items[0]["orgao_pagto_nome"], "SECRETARIA DE TESTE")
 
@@ -199,3 +262,135 @@ STATUS MATRICULA NOME                           CARGO                          F
         self.assertEqual(len(parsed.items), 1)
         self.assertEqual(len(parsed.warnings), 1)
         self.assertIn("Valor inválido", parsed.warnings[0]["erro"])
+
+    def test_classificar_linha_usa_colunas_brutas_e_so_dobra_o_resto(self):
+        parser = ETIPITxtRetornoParser()
+        detalhe = build_detail_line(
+            "S",
+            "030759-9",
+            "MARIA DE JESUS",
+            "-",
+            "6580",
+            "002",
+            "001",
+            "30.00",
+            "30.00",
+            "002",
+            "123.456.789-01",
+        )
+
+        casos = {
+            detalhe: LINHA_DETALHE,
+            "              Total do Status:  1  -  2 Lançamento(s)": LINHA_FRONTEIRA,
+            "-" * 81: LINHA_FRONTEIRA,
+            "Governo do Estado do Piauí                Pág:    2": LINHA_CABECALHO,
+            "STATUS MATRICULA NOME": LINHA_CABECALHO,
+            "Legenda do Status": LINHA_LEGENDA,
+            "Relatório dos Lançamentos da Folha de Pagamento - iNETConsig": LINHA_RUIDO,
+            " S - Não Lançado: Compra de Dívida ou Suspensão SEAD": LINHA_RUIDO,
+            "====== ==========": LINHA_OUTRA,
+            "==========": LINHA_RUIDO,
+            "       ÓRGÃO PAGAMENTO:  002-SEC DE SAUDE  -  1 Lançamento(s)": LINHA_ORGAO,
+            detalhe[:-3]: LINHA_OUTRA,
+        }
+
+        for linha, esperado in casos.items():
+            with self.subTest(linha=linha):
+                self.assertEqual(parser._classificar_linha(linha)[0], esperado)
+
+        self.assertEqual(
+            parser._classificar_linha("       Órgão Pagamento:  012-SEC DE SAÚDE")[1],
+            "orgao pagamento:  012-sec de saude",
+        )
+
+    def test_item_retorno_guarda_a_linha_e_monta_o_payload_sob_demanda(self):
+        parser = ETIPITxtRetornoParser()
+
+        item = parser.parse(str(self.fixture_path())).items[0]
+
+        self.assertIsInstance(item, ItemRetorno)
+        self.assertFalse(hasattr(item, "__dict__"))
+        campos = dict(item)
+        self.assertEqual(list(campos), list(ItemRetorno.CAMPOS))
+        self.assertEqual(campos["orgao_pagto_codigo"], "002")
+        self.assertEqual(campos["payload_bruto"]["orgao_pagto_bloco"]["codigo"], "002")
+        self.assertEqual(campos["payload_bruto"]["cpf"], campos["cpf_cnpj"])
+        self.assertIsNone(item.get("inexistente"))
+
+        restaurado = ItemRetorno.de_compacto(json.loads(json.dumps(item.compacto())))
+        self.assertEqual(restaurado, item)
+        self.assertIs(restaurado.colunas, item.colunas)
+        self.assertEqual(restaurado["valor_descontado"], item["valor_descontado"])
+
+    def test_parse_le_o_layout_da_linha_de_titulos_de_cada_pagina(self):
+        parser = ETIPITxtRetornoParser()
+        cabecalho = (
+            "STATUS MATRICULA NOME                           CARGO                          "
+            "FIN. ORGAO LANC.  TOTAL PAGO  VALOR        ORGAO PAGTO CPF"
+        )
+
+        def deslocar(linha: str) -> str:
+            # Dois espaços a mais depois da matrícula empurram todas as colunas seguintes.
+            return linha[:17] + "  " + linha[17:]
+
+        def linha(matricula: str, nome: str, cpf: str) -> str:
+            return build_detail_line(
+                "1",
+                matricula,
+                nome,
+                "AGENTE",
+                "6580",
+                "002",
+                "999",
+                "001",
+                "30.00",
+                "002",
+                cpf,
+            )
+
+        conteudo = "\n".join(
+            [
+                "Entidade: 2102-ABASE                                                 "
+                "Referência: 05/2025   Data da Geração: 23/05/2025",
+                cabecalho,
+                linha("000001-0", "JOÃO DA SILVA", "12345678901"),
+                "       Órgão Pagamento:  002-SECRETARIA DE TESTE          -  1 Lançamento(s)",
+                "\x0cGoverno do Estado do Piauí",
+                deslocar(cabecalho),
+                deslocar(linha("000002-0", "MARIA DE SOUSA", "12345678902")),
+                "       Órgão Pagamento:  019-SEC. DA EDUCACAO             -  1 Lançamento(s)",
+            ]
+        )
+
+        with tempfile.NamedTemporaryFile(suffix=".txt") as temp_file:
+            temp_file.write(conteudo.encode("latin-1"))
+            temp_file.flush()
+
+            parsed = parser.parse(temp_file.name)
+
+        self.assertEqual(parsed.warnings, [])
+        self.assertEqual(
+            [
+                (item["cpf_cnpj"], item["nome_servidor"], item["cargo"], item["orgao_pagto_nome"])
+                for item in parsed.items
+            ],
+            [
+                ("12345678901", "JOÃO DA SILVA", "AGENTE", "SECRETARIA DE TESTE"),
+                ("12345678902", "MARIA DE SOUSA", "AGENTE", "SEC. DA EDUCACAO"),
+            ],
+        )
+        self.assertIsInstance(parsed.items[1], ItemRetorno)
+        self.assertEqual(parsed.items[1].colunas.cpf, slice(136, None))
+
+        # Sem linha de títulos, o layout não herda o do arquivo lido antes.
+        sem_titulos = "\n".join(
+            [conteudo.splitlines()[0], linha("000003-0", "ANA", "12345678903")]
+        )
+        with tempfile.NamedTemporaryFile(suffix=".txt") as temp_file:
+            temp_file.write(sem_titulos.encode("latin-1"))
+            temp_file.flush()
+
+            seguinte = parser.parse(temp_file.name)
+
+        self.assertEqual([item["cpf_cnpj"] for item in seguinte.items], ["12345678903"])
+        self.assertIs(seguinte.items[0].colunas, ETIPITxtRetornoParser.LAYOUT_PADRAO)
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.utils import timezone
+
+from .base import ImportacaoBaseTestCase
+from ..models import ArquivoRetorno
+from ..services import ArquivoRetornoService
+
+
+class ProgressoArquivoRetornoTestCase(ImportacaoBaseTestCase):
+    def _upload(self) -> ArquivoRetorno:
+        return ArquivoRetornoService().upload(
+            SimpleUploadedFile(
+                "retorno_etipi_052025.txt",
+                self.fixture_bytes(),
+                content_type="text/plain",
+            ),
+            self.tesoureiro,
+        )
+
+    def test_progresso_calcula_vazao_e_eta_durante_a_reconciliacao(self):
+        arquivo = self._upload()
+        agora = timezone.now()
+        ArquivoRetorno.objects.filter(pk=arquivo.pk).update(
+            status=ArquivoRetorno.Status.PROCESSANDO,
+            etapa=ArquivoRetorno.Etapa.RECONCILIACAO,
+            total_registros=1000,
+            processados=400,
+            etapa_processados_inicio=100,
+            etapa_iniciada_em=agora - timedelta(seconds=30),
+            updated_at=agora,
+        )
+
+        # Permissão do usuário + uma leitura só das colunas de progresso.
+        with self.assertNumQueries(2):
+            response = self.tes_client.get(
+                f"/api/v1/importacao/arquivo-retorno/{arquivo.pk}/progresso/"
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["etapa"], ArquivoRetorno.Etapa.RECONCILIACAO)
+        self.assertEqual(response.data["percentual"], 40.0)
+        self.assertEqual(response.data["itens_por_segundo"], 10.0)
+        self.assertAlmostEqual(response.data["eta_segundos"], 60, delta=2)
+
+        response = self.agent_client.get(
+            f"/api/v1/importacao/arquivo-retorno/{arquivo.pk}/progresso/"
+        )
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(IMPORTACAO_PROGRESSO_SSE=True, IMPORTACAO_PROGRESSO_SSE_INTERVALO=0)
+    def test_stream_de_progresso_emite_eventos_ate_o_fim(self):
+        arquivo = self._upload()
+
+        response = self.tes_client.get(
+            f"/api/v1/importacao/arquivo-retorno/{arquivo.pk}/progresso/stream/",
+            HTTP_ACCEPT="text/event-stream",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        corpo = b"".join(response.streaming_content).decode()
+        self.assertIn("event: progresso", corpo)
+        self.assertIn('"percentual": 100.0', corpo)
+        self.assertTrue(corpo.endswith('event: fim\ndata: {"status": "concluido"}\n\n'))
+
+        response = self.tes_client.get(
+            "/api/v1/importacao/arquivo-retorno/999999/progresso/stream/",
+            HTTP_ACCEPT="text/event-stream",
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_stream_de_progresso_desligado_por_padrao(self):
+        arquivo = self._upload()
+
+        response = self.tes_client.get(
+            f"/api/v1/importacao/arquivo-retorno/{arquivo.pk}/progresso/stream/",
+            HTTP_ACCEPT="text/event-stream",
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("event: erro", response.content.decode())
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
+from datetime import date
 from decimal import Decimal
 
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
 from apps.associados.models import Associado
 from apps.contratos.models import Ciclo, Parcela
 
 from .base import ImportacaoBaseTestCase
-from ..models import ArquivoRetornoItem
-from ..reconciliacao import MotorReconciliacao
+from ..logs import ImportacaoLogBuffer
+from ..models import ArquivoRetornoItem, ImportacaoLog
+from ..reconciliacao import MotorReconciliacao, SeletorParcela
+from ..reconciliacao_lote import MotorReconciliacaoEmLote
 
 
 class MotorReconciliacaoTestCase(ImportacaoBaseTestCase):
@@ -252,3 +258,224 @@ class MotorReconciliacaoTestCase(ImportacaoBaseTestCase):
         self.assertEqual(outcome["resultado"], ArquivoRetornoItem.ResultadoProcessamento.BAIXA_EFETUADA)
         self.assertIsNotNone(item.associado_id)
         self.assertEqual(ciclo.parcelas.get(numero=3).status, Parcela.Status.DESCONTADO)
+
+
+class SeletorParcelaTestCase(ImportacaoBaseTestCase):
+    def test_escolhe_por_prioridade_de_status_em_uma_consulta(self):
+        maria, _, ciclo = self.create_associado_com_contrato(
+            cpf="23993596315",
+            nome="Maria de Jesus Santana Costa",
+            status_ultima_parcela=Parcela.Status.DESCONTADO,
+        )
+        jose, _, _ = self.create_associado_com_contrato(
+            cpf="21819424391",
+            nome="Jose Araujo Lima",
+            status_ultima_parcela=Parcela.Status.NAO_DESCONTADO,
+        )
+        competencia = date(2025, 5, 1)
+        descontada = ciclo.parcelas.get(referencia_mes=competencia)
+        em_aberto = Parcela.objects.create(
+            ciclo=ciclo,
+            numero=4,
+            referencia_mes=competencia,
+            valor=Decimal("30.00"),
+            data_vencimento=competencia,
+            status=Parcela.Status.EM_ABERTO,
+        )
+
+        with self.assertNumQueries(1):
+            self.assertEqual(SeletorParcela.escolher(maria, competencia), em_aberto)
+
+        em_aberto.status = Parcela.Status.CANCELADO
+        em_aberto.save(update_fields=["status", "updated_at"])
+        with self.assertNumQueries(1):
+            escolhidas = SeletorParcela.escolher_muitos([maria.pk, jose.pk], [competencia])
+
+        self.assertEqual(escolhidas[(maria.pk, competencia)], descontada)
+        self.assertEqual(
+            escolhidas[(jose.pk, competencia)].status, Parcela.Status.NAO_DESCONTADO
+        )
+        self.assertEqual(
+            min(
+                filter(SeletorParcela.elegivel, ciclo.parcelas.filter(referencia_mes=competencia)),
+                key=SeletorParcela.chave,
+            ),
+            descontada,
+        )
+
+
+class MotorReconciliacaoEmLoteTestCase(ImportacaoBaseTestCase):
+    def _criar_item(self, arquivo, linha, cpf, status, valor="30.00", **extra):
+        return ArquivoRetornoItem.objects.create(
+            arquivo_retorno=arquivo,
+            linha_numero=linha,
+            cpf_cnpj=cpf,
+            matricula_servidor=extra.pop("matricula", ""),
+            nome_servidor=extra.pop("nome", f"SERVIDOR {linha}"),
+            cargo="-",
+            competencia=extra.pop("competencia", "05/2025"),
+            valor_descontado=Decimal(valor),
+            status_codigo=status,
+            status_desconto=ArquivoRetornoItem.StatusDesconto.EFETIVADO,
+            status_descricao=extra.pop("descricao", f"Status {status}"),
+            **extra,
+        )
+
+    def _cenario(self):
+        _, contrato_proximo, _ = self.create_associado_com_contrato(
+            cpf="55566677788", nome="Servidor Proximo Futuro"
+        )
+        proximo = Ciclo.objects.create(
+            contrato=contrato_proximo,
+            numero=2,
+            data_inicio=date(2025, 6, 1),
+            data_fim=date(2025, 8, 1),
+            status=Ciclo.Status.FUTURO,
+            valor_total=Decimal("90.00"),
+        )
+        for numero, mes in enumerate((6, 7, 8), start=1):
+            Parcela.objects.create(
+                ciclo=proximo,
+                numero=numero,
+                referencia_mes=date(2025, mes, 1),
+                valor=Decimal("30.00"),
+                data_vencimento=date(2025, mes, 1),
+                status=Parcela.Status.FUTURO,
+            )
+        self.create_associado_com_contrato(cpf="11111111111", nome="Servidor Baixa")
+        self.create_associado_com_contrato(cpf="22222222222", nome="Servidor Divergente")
+        self.create_associado_com_contrato(cpf="33333333333", nome="Servidor Rejeitado")
+        self.create_associado_com_contrato(
+            cpf="44444444444",
+            nome="Servidor Pendente",
+            status_ultima_parcela=Parcela.Status.FUTURO,
+        )
+        self.create_associado_com_contrato(
+            cpf="66666666666",
+            nome="Servidor Sem Parcela",
+            competencia_final=date(2025, 4, 1),
+        )
+        self.create_associado_com_contrato(cpf="77777777777", nome="Servidor Status Estranho")
+
+        arquivo = self.create_arquivo_retorno()
+        self._criar_item(arquivo, 1, "11111111111", "1")
+        self._criar_item(arquivo, 2, "22222222222", "1", valor="99.00")
+        self._criar_item(arquivo, 3, "33333333333", "2", descricao="Falta de margem")
+        self._criar_item(arquivo, 4, "44444444444", "5")
+        self._criar_item(arquivo, 5, "55566677788", "4", valor="31.00")
+        self._criar_item(arquivo, 6, "00000000000", "1", nome="NINGUEM")
+        self._criar_item(arquivo, 7, "66666666666", "1")
+        self._criar_item(arquivo, 8, "77777777777", "9")
+        self._criar_item(arquivo, 9, "", "1", nome="SERVIDOR BAIXA")
+        self._criar_item(
+            arquivo,
+            10,
+            "88888888888",
+            "1",
+            processado=True,
+            resultado_processamento=ArquivoRetornoItem.ResultadoProcessamento.PENDENCIA_MANUAL,
+        )
+        return arquivo
+
+    def _retrato(self, arquivo):
+        def parcela_chave(parcela):
+            if parcela is None:
+                return None
+            return (parcela.ciclo.contrato_id, parcela.ciclo.numero, parcela.numero)
+
+        return {
+            "itens": [
+                (
+                    item.linha_numero,
+                    item.associado_id,
+                    parcela_chave(item.parcela),
+                    item.processado,
+                    item.resultado_processamento,
+                    item.observacao,
+                    item.regra_casamento,
+                    item.motivo_rejeicao,
+                    item.gerou_encerramento,
+                    item.gerou_novo_ciclo,
+                )
+                for item in arquivo.itens.select_related("parcela__ciclo").order_by("linha_numero")
+            ],
+            "parcelas": sorted(
+                (
+                    parcela_chave(parcela),
+                    parcela.status,
+                    parcela.data_pagamento,
+                    parcela.observacao,
+                    parcela.referencia_mes,
+                )
+                for parcela in Parcela.objects.select_related("ciclo")
+            ),
+            "ciclos": sorted(
+                (ciclo.contrato_id, ciclo.numero, ciclo.status, ciclo.data_inicio, ciclo.data_fim)
+                for ciclo in Ciclo.objects.all()
+            ),
+            "associados": sorted(
+                Associado.objects.values_list("id", "status", "observacao")
+            ),
+            "logs": list(
+                ImportacaoLog.objects.order_by("id").values_list("tipo", "mensagem", "dados")
+            ),
+        }
+
+    def test_motor_em_lote_reproduz_o_caminho_item_a_item(self):
+        arquivo = self._cenario()
+
+        with transaction.atomic():
+            resumo_item = MotorReconciliacao(arquivo).reconciliar()
+            retrato_item = self._retrato(arquivo)
+            transaction.set_rollback(True)
+
+        with CaptureQueriesContext(connection) as queries:
+            resumo_lote = MotorReconciliacaoEmLote(
+                arquivo, logs=ImportacaoLogBuffer(arquivo)
+            ).reconciliar()
+
+        self.assertEqual(resumo_lote, resumo_item)
+        self.assertEqual(self._retrato(arquivo), retrato_item)
+        self.assertEqual(resumo_lote["baixa_efetuada"], 3)
+        self.assertEqual(resumo_lote["encerramentos"], 2)
+        self.assertEqual(resumo_lote["novos_ciclos"], 2)
+        # Número fixo de consultas, independente da quantidade de itens.
+        self.assertLessEqual(len(queries), 20)
+
+    def test_salvar_exige_update_fields_fora_dos_itens(self):
+        _, _, ciclo = self.create_associado_com_contrato(
+            cpf="23993596315", nome="Maria de Jesus Santana Costa"
+        )
+        motor = MotorReconciliacaoEmLote(self.create_arquivo_retorno())
+
+        with self.assertRaises(ValueError):
+            motor._salvar(ciclo.parcelas.first())
+
+    def test_encerramento_marca_o_item_que_completou_o_ciclo(self):
+        _, contrato, ciclo = self.create_associado_com_contrato(
+            cpf="23993596315", nome="Maria de Jesus Santana Costa"
+        )
+        ciclo.parcelas.filter(numero=2).update(status=Parcela.Status.EM_ABERTO)
+        arquivo = self.create_arquivo_retorno()
+        self._criar_item(arquivo, 1, "23993596315", "1", competencia="04/2025")
+        self._criar_item(arquivo, 2, "23993596315", "1")
+        self._criar_item(arquivo, 3, "23993596315", "1")
+
+        for motor_class in (MotorReconciliacao, MotorReconciliacaoEmLote):
+            with self.subTest(motor=motor_class.__name__), transaction.atomic():
+                resumo = motor_class(arquivo).reconciliar()
+
+                self.assertEqual(resumo["baixa_efetuada"], 3)
+                self.assertEqual(resumo["encerramentos"], 1)
+                self.assertEqual(resumo["novos_ciclos"], 1)
+                self.assertEqual(
+                    list(
+                        arquivo.itens.order_by("linha_numero").values_list(
+                            "gerou_encerramento", "gerou_novo_ciclo"
+                        )
+                    ),
+                    [(False, False), (True, True), (False, False)],
+                )
+                novo_ciclo = contrato.ciclos.get(numero=2)
+                self.assertEqual(novo_ciclo.parcelas.count(), 3)
+                transaction.set_rollback(True)
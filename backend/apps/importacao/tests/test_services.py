@@ -1,12 +1,28 @@
 from __future__ import annotations
 
-from datetime import date
+import gzip
+import hashlib
+import io
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from unittest.mock import patch
 
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
 from django.test import override_settings
+from django.utils import timezone
+
+from apps.contratos.models import Ciclo, Parcela
 
 from .base import ImportacaoBaseTestCase
-from ..models import ArquivoRetorno, ArquivoRetornoItem, ImportacaoLog
+from ..artifacts import digest_file
+from ..logs import ImportacaoLogBuffer
+from ..models import ArquivoRetorno, ArquivoRetornoItem, ImportacaoLog, PagamentoMensalidade
+from ..parsers import ETIPITxtRetornoParser
+from ..reconciliacao import MotorReconciliacao
 from ..services import ArquivoRetornoService
 
 
@@ -169,6 +185,654 @@ class ArquivoRetornoServiceTestCase(ImportacaoBaseTestCase):
         self.assertEqual(contrato.ciclos.count(), 2)
         self.assertEqual(contrato.ciclos.get(numero=2).parcelas.count(), 3)
 
+    def test_reprocessamento_reaproveita_artefato_de_parse(self):
+        service = ArquivoRetornoService()
+        artifact_name = service.artifacts.artifact_name(digest_file(self.fixture_path()))
+        if default_storage.exists(artifact_name):
+            default_storage.delete(artifact_name)
+
+        with patch.object(
+            ETIPITxtRetornoParser,
+            "iter_parse",
+            autospec=True,
+            side_effect=ETIPITxtRetornoParser.iter_parse,
+        ) as iter_parse:
+            arquivo = service.upload(
+                SimpleUploadedFile(
+                    "retorno_etipi_052025.txt",
+                    self.fixture_bytes(),
+                    content_type="text/plain",
+                ),
+                self.tesoureiro,
+            )
+            service.processar(arquivo.id)
+
+        self.assertEqual(iter_parse.call_count, 1)
+        self.assertTrue(default_storage.exists(artifact_name))
+        arquivo.refresh_from_db()
+        self.assertEqual(arquivo.status, ArquivoRetorno.Status.CONCLUIDO)
+        self.assertEqual(arquivo.total_registros, 4)
+        self.assertEqual(arquivo.resultado_resumo["pm_criados"], 0)
+        self.assertEqual(arquivo.resultado_resumo["pm_duplicados"], 4)
+
+    def test_artefatos_de_outras_versoes_e_orfaos_saem_na_limpeza(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            service = ArquivoRetornoService()
+            store = service.artifacts
+            digest = digest_file(self.fixture_path())
+            atual = store.artifact_name(digest)
+            antigo = f"{store.prefix}/{digest}.v1.jsonl.gz"
+            orfao = f"{store.prefix}/{'0' * 64}.v{ETIPITxtRetornoParser.VERSION}.jsonl.gz"
+            for name in (antigo, orfao):
+                default_storage.save(name, ContentFile(b"antigo"))
+
+            arquivo = service.upload(
+                SimpleUploadedFile(
+                    "retorno_etipi_052025.txt", self.fixture_bytes(), content_type="text/plain"
+                ),
+                self.tesoureiro,
+            )
+
+            self.assertTrue(default_storage.exists(atual))
+            # A gravação não mexe em outras versões: alguém pode estar lendo.
+            self.assertTrue(default_storage.exists(antigo))
+            # Uma segunda gravação reaproveita o nome, sem alternativo nem temporário.
+            self.assertEqual(store._build(str(self.fixture_path()), atual), atual)
+            self.assertEqual(sorted(store._artefatos(f"{digest}.")), sorted([antigo, atual]))
+
+            self.assertEqual(service.limpar_artefatos(), 0)
+            self.assertEqual(store.limpar([arquivo.sha256], idade_minima=timedelta(0)), 2)
+            self.assertFalse(default_storage.exists(antigo))
+            self.assertFalse(default_storage.exists(orfao))
+            self.assertTrue(default_storage.exists(atual))
+
+    def test_artefato_corrompido_no_meio_da_leitura_segue_do_arquivo(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            store = ArquivoRetornoService().artifacts
+            arquivo_path = str(self.fixture_path())
+            digest = digest_file(arquivo_path)
+            name = store.artifact_name(digest)
+            esperado = [dict(item) for item in store.open_stream(arquivo_path, digest).iter_items()]
+            with default_storage.open(name, "rb") as handle:
+                linhas = gzip.decompress(handle.read()).splitlines(keepends=True)
+            default_storage.delete(name)
+            # Cabeçalho e duas entradas íntegros, depois uma linha cortada.
+            default_storage.save(
+                name, ContentFile(gzip.compress(b"".join(linhas[:3]) + b'["item", {"li'))
+            )
+
+            itens = [dict(item) for item in store.open_stream(arquivo_path, digest).iter_items()]
+
+            self.assertEqual(len(esperado), 4)
+            self.assertEqual(itens, esperado)
+            self.assertFalse(default_storage.exists(name))
+
+    def test_upsert_pagamentos_em_lote_faz_backfill_de_vinculo(self):
+        service = ArquivoRetornoService()
+        arquivo = service.upload(
+            SimpleUploadedFile(
+                "retorno_etipi_052025.txt",
+                self.fixture_bytes(),
+                content_type="text/plain",
+            ),
+            self.tesoureiro,
+        )
+        arquivo.refresh_from_db()
+        self.assertEqual(arquivo.resultado_resumo["pm_criados"], 4)
+        self.assertEqual(arquivo.resultado_resumo["pm_vinculados"], 0)
+        self.assertEqual(arquivo.resultado_resumo["pm_nao_encontrados"], 4)
+
+        associado, _, _ = self.create_associado_com_contrato(
+            cpf="23993596315",
+            nome="Maria de Jesus Santana Costa",
+        )
+        service.processar(arquivo.id)
+
+        arquivo.refresh_from_db()
+        self.assertEqual(arquivo.resultado_resumo["pm_criados"], 0)
+        self.assertEqual(arquivo.resultado_resumo["pm_duplicados"], 4)
+        self.assertEqual(arquivo.resultado_resumo["pm_vinculados"], 1)
+        self.assertEqual(arquivo.resultado_resumo["pm_nao_encontrados"], 0)
+        self.assertEqual(PagamentoMensalidade.objects.count(), 4)
+        self.assertEqual(
+            PagamentoMensalidade.objects.get(cpf_cnpj="23993596315").associado_id,
+            associado.id,
+        )
+
+    def test_bulk_criar_pagamentos_separa_concorrentes_de_erros(self):
+        referencia = date(2025, 5, 1)
+
+        def pagamento(cpf, **extra):
+            return PagamentoMensalidade(
+                import_uuid=extra.pop("import_uuid", "uuid"),
+                referencia_month=referencia,
+                cpf_cnpj=cpf,
+                **extra,
+            )
+
+        # Par gravado por outra importação depois da leitura dos existentes.
+        PagamentoMensalidade.objects.create(
+            import_uuid="outro", referencia_month=referencia, cpf_cnpj="111"
+        )
+
+        inseridos, recusados = ArquivoRetornoService()._bulk_criar_pagamentos(
+            [pagamento("111"), pagamento("222"), pagamento("333", import_uuid=None)],
+            referencia,
+        )
+
+        self.assertEqual(inseridos, {"222"})
+        self.assertIsNone(recusados["111"])
+        self.assertIn("import_uuid", recusados["333"])
+        self.assertEqual(
+            sorted(PagamentoMensalidade.objects.values_list("cpf_cnpj", "import_uuid")),
+            [("111", "outro"), ("222", "uuid")],
+        )
+
+    def test_processar_retoma_do_checkpoint_apos_falha(self):
+        self.create_associado_com_contrato(
+            cpf="23993596315",
+            nome="Maria de Jesus Santana Costa",
+        )
+        service = ArquivoRetornoService()
+        arquivo = service.upload(
+            SimpleUploadedFile(
+                "retorno_etipi_052025.txt",
+                self.fixture_bytes(),
+                content_type="text/plain",
+            ),
+            self.tesoureiro,
+        )
+        resumo_esperado = arquivo.resultado_resumo
+        service.reprocessar(arquivo.id)
+
+        service.chunk_size = 2
+        reconciliar_item = MotorReconciliacao._reconciliar_item
+        chamadas = []
+
+        def falha_no_terceiro_item(motor, item):
+            chamadas.append(item.linha_numero)
+            if len(chamadas) == 3:
+                raise RuntimeError("queda simulada")
+            return reconciliar_item(motor, item)
+
+        with patch.object(
+            MotorReconciliacao,
+            "_reconciliar_item",
+            autospec=True,
+            side_effect=falha_no_terceiro_item,
+        ):
+            with self.assertRaises(RuntimeError):
+                service.processar(arquivo.id)
+
+        arquivo.refresh_from_db()
+        self.assertEqual(arquivo.status, ArquivoRetorno.Status.ERRO)
+        self.assertEqual(arquivo.etapa, ArquivoRetorno.Etapa.RECONCILIACAO)
+        self.assertEqual(arquivo.metricas["status"], ArquivoRetorno.Status.ERRO)
+        self.assertIn("reconciliacao", arquivo.metricas["etapas"])
+        self.assertEqual(arquivo.checkpoint_linha, chamadas[1])
+        self.assertEqual(arquivo.itens.filter(processado=True).count(), 2)
+        itens_antes = set(arquivo.itens.values_list("id", flat=True))
+
+        with patch.object(
+            ETIPITxtRetornoParser,
+            "iter_parse",
+            autospec=True,
+            side_effect=ETIPITxtRetornoParser.iter_parse,
+        ) as iter_parse:
+            service.processar(arquivo.id)
+
+        arquivo.refresh_from_db()
+        self.assertEqual(iter_parse.call_count, 0)
+        self.assertEqual(set(arquivo.itens.values_list("id", flat=True)), itens_antes)
+        # A retomada soma suas medições às da execução que falhou.
+        self.assertEqual(arquivo.metricas["execucoes"], 2)
+        self.assertEqual(arquivo.metricas["status"], ArquivoRetorno.Status.CONCLUIDO)
+        self.assertTrue({"parse", "reconciliacao", "conclusao"} <= set(arquivo.metricas["etapas"]))
+        self.assertEqual(arquivo.status, ArquivoRetorno.Status.CONCLUIDO)
+        self.assertEqual(arquivo.etapa, ArquivoRetorno.Etapa.CONCLUIDA)
+        self.assertEqual(arquivo.processados, 4)
+        for chave in ("baixa_efetuada", "nao_encontrado", "erro"):
+            self.assertEqual(arquivo.resultado_resumo[chave], resumo_esperado[chave])
+        self.assertTrue(
+            arquivo.logs.filter(mensagem="Processamento retomado a partir do último checkpoint.")
+            .exists()
+        )
+
+    def test_reprocessamento_incremental_preserva_baixas_ja_gravadas(self):
+        self.create_associado_com_contrato(
+            cpf="23993596315",
+            nome="Maria de Jesus Santana Costa",
+        )
+        arquivo = ArquivoRetornoService().upload(
+            SimpleUploadedFile(
+                "retorno_etipi_052025.txt",
+                self.fixture_bytes(),
+                content_type="text/plain",
+            ),
+            self.tesoureiro,
+        )
+        baixa = arquivo.itens.get(cpf_cnpj="23993596315")
+        self.assertEqual(
+            baixa.resultado_processamento,
+            ArquivoRetornoItem.ResultadoProcessamento.BAIXA_EFETUADA,
+        )
+        pendente = arquivo.itens.get(cpf_cnpj="48204773315")
+        self.assertEqual(
+            pendente.resultado_processamento,
+            ArquivoRetornoItem.ResultadoProcessamento.NAO_ENCONTRADO,
+        )
+        itens_antes = set(arquivo.itens.values_list("id", flat=True))
+
+        associado, _, _ = self.create_associado_com_contrato(
+            cpf="48204773315",
+            nome="Maria de Jesus Araujo Goncalves",
+        )
+        with patch.object(ETIPITxtRetornoParser, "iter_parse") as iter_parse:
+            response = self.tes_client.post(
+                f"/api/v1/importacao/arquivo-retorno/{arquivo.id}/reprocessar/",
+                {"incremental": True},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        iter_parse.assert_not_called()
+
+        arquivo.refresh_from_db()
+        self.assertEqual(arquivo.status, ArquivoRetorno.Status.CONCLUIDO)
+        self.assertEqual(set(arquivo.itens.values_list("id", flat=True)), itens_antes)
+        self.assertEqual(arquivo.itens.get(pk=baixa.pk).updated_at, baixa.updated_at)
+        pendente.refresh_from_db()
+        self.assertEqual(pendente.associado_id, associado.id)
+        self.assertEqual(
+            pendente.resultado_processamento,
+            ArquivoRetornoItem.ResultadoProcessamento.BAIXA_EFETUADA,
+        )
+        self.assertEqual(arquivo.processados, 4)
+        self.assertEqual(arquivo.resultado_resumo["baixa_efetuada"], 2)
+        self.assertEqual(
+            arquivo.logs.get(
+                mensagem="Reprocessamento incremental solicitado manualmente."
+            ).dados["itens_reabertos"],
+            3,
+        )
+
+    def test_processar_registra_metricas_por_etapa(self):
+        self.create_associado_com_contrato(
+            cpf="23993596315",
+            nome="Maria de Jesus Santana Costa",
+        )
+        service = ArquivoRetornoService()
+        arquivo = service.upload(
+            SimpleUploadedFile(
+                "retorno_etipi_052025.txt",
+                self.fixture_bytes(),
+                content_type="text/plain",
+            ),
+            self.tesoureiro,
+        )
+        with self.assertLogs("apps.importacao.services", level="INFO") as captured:
+            service.processar(arquivo.id)
+
+        arquivo.refresh_from_db()
+        metricas = arquivo.metricas
+        self.assertEqual(metricas["status"], ArquivoRetorno.Status.CONCLUIDO)
+        self.assertEqual(
+            set(metricas["etapas"]),
+            {"parse", "persistir_itens", "matcher", "reconciliacao", "pagamentos", "conclusao"},
+        )
+        for etapa, medida in metricas["etapas"].items():
+            self.assertEqual(
+                set(medida), {"segundos", "consultas", "segundos_db", "memoria_pico_kb"}, etapa
+            )
+        self.assertGreater(metricas["etapas"]["persistir_itens"]["consultas"], 0)
+        self.assertGreaterEqual(
+            metricas["total"]["consultas"],
+            sum(medida["consultas"] for medida in metricas["etapas"].values()),
+        )
+        registro = next(
+            record for record in captured.records if hasattr(record, "metricas")
+        )
+        self.assertEqual(registro.arquivo_retorno_id, arquivo.id)
+        self.assertEqual(registro.metricas, metricas)
+
+    def test_pipeline_em_particoes_reproduz_o_processamento_serial(self):
+        for cpf, nome in (
+            ("23993596315", "Maria de Jesus Santana Costa"),
+            ("21819424391", "Francisco Crisostomo Batista"),
+            ("48204773315", "Maria de Jesus Araujo Goncalves"),
+        ):
+            self.create_associado_com_contrato(cpf=cpf, nome=nome)
+        service = ArquivoRetornoService()
+        with patch.object(ArquivoRetornoService, "_dispatch_processamento"):
+            arquivo = service.upload(
+                SimpleUploadedFile(
+                    "retorno_etipi_052025.txt",
+                    self.fixture_bytes(),
+                    content_type="text/plain",
+                ),
+                self.tesoureiro,
+            )
+
+        def retrato():
+            return list(
+                arquivo.itens.order_by("linha_numero").values_list(
+                    "linha_numero",
+                    "associado_id",
+                    "resultado_processamento",
+                    "gerou_encerramento",
+                    "gerou_novo_ciclo",
+                )
+            )
+
+        with transaction.atomic():
+            service.processar(arquivo.id)
+            arquivo.refresh_from_db()
+            resumo_serial = arquivo.resultado_resumo
+            retrato_serial = retrato()
+            transaction.set_rollback(True)
+
+        particoes = service.preparar_particoes(arquivo.id, 3)
+        for associado_id, particao in arquivo.itens.exclude(associado=None).values_list(
+            "associado_id", "particao"
+        ):
+            self.assertEqual(particao, associado_id % 3)
+        with patch.object(
+            ImportacaoLogBuffer,
+            "fechar",
+            autospec=True,
+            side_effect=ImportacaoLogBuffer.fechar,
+        ) as fechar:
+            itens_por_particao = [
+                service.reconciliar_particao(arquivo.id, particao) for particao in particoes
+            ]
+        # Cada partição fecha o próprio buffer: o resumo dos logs suprimidos não se perde.
+        self.assertEqual(fechar.call_count, len(particoes))
+        service.concluir_particoes(arquivo.id, itens_por_particao)
+
+        arquivo.refresh_from_db()
+        self.assertEqual(arquivo.status, ArquivoRetorno.Status.CONCLUIDO)
+        self.assertEqual(retrato(), retrato_serial)
+        self.assertEqual(sum(itens_por_particao), arquivo.processados)
+        self.assertEqual(arquivo.resultado_resumo["itens_por_particao"], itens_por_particao)
+        # Preparo, cada partição e o fecho entram nas métricas do arquivo.
+        self.assertEqual(arquivo.metricas["execucoes"], len(particoes) + 2)
+        self.assertTrue(
+            {"parse", "particionar", "reconciliacao", "pagamentos", "conclusao"}
+            <= set(arquivo.metricas["etapas"])
+        )
+        for chave, valor in resumo_serial.items():
+            self.assertEqual(arquivo.resultado_resumo[chave], valor, chave)
+
+    def test_upload_identico_reaproveita_resultado_e_force_reprocessa(self):
+        def enviar(**extra):
+            return self.tes_client.post(
+                "/api/v1/importacao/arquivo-retorno/upload/",
+                {
+                    "arquivo": SimpleUploadedFile(
+                        "retorno_etipi_052025.txt",
+                        self.fixture_bytes(),
+                        content_type="text/plain",
+                    ),
+                    **extra,
+                },
+                format="multipart",
+            )
+
+        primeiro = enviar()
+        self.assertEqual(primeiro.status_code, 201, primeiro.json())
+
+        repetido = enviar()
+        self.assertEqual(repetido.status_code, 200, repetido.json())
+        self.assertEqual(repetido.json()["id"], primeiro.json()["id"])
+        self.assertEqual(ArquivoRetorno.objects.count(), 1)
+
+        forcado = enviar(force="true")
+        self.assertEqual(forcado.status_code, 201, forcado.json())
+        self.assertNotEqual(forcado.json()["id"], primeiro.json()["id"])
+        self.assertEqual(forcado.json()["status"], ArquivoRetorno.Status.CONCLUIDO)
+        self.assertEqual(forcado.json()["arquivo_url"], primeiro.json()["arquivo_url"])
+        digest = ArquivoRetorno.objects.get(pk=primeiro.json()["id"]).sha256
+        self.assertEqual(digest, digest_file(self.fixture_path()))
+        self.assertEqual(ArquivoRetorno.objects.filter(sha256=digest).count(), 2)
+
+    def test_upload_grava_em_chunks_e_calcula_digest_no_caminho(self):
+        conteudo = self.fixture_bytes() + b"\n" * (2 * ETIPITxtRetornoParser.SNIFF_BYTES)
+        leituras: list[int] = []
+
+        class LeituraRegistrada(io.BytesIO):
+            def read(self, size=-1):
+                leituras.append(size)
+                return super().read(size)
+
+        arquivo = SimpleUploadedFile(
+            "retorno_etipi_052025.txt", b"", content_type="text/plain"
+        )
+        arquivo.file = LeituraRegistrada(conteudo)
+        arquivo.size = len(conteudo)
+
+        arquivo_retorno = ArquivoRetornoService().upload(arquivo, self.tesoureiro)
+
+        self.assertEqual(arquivo_retorno.sha256, hashlib.sha256(conteudo).hexdigest())
+        with default_storage.open(arquivo_retorno.arquivo_url, "rb") as armazenado:
+            self.assertEqual(armazenado.read(), conteudo)
+        self.assertNotIn(-1, leituras)
+        self.assertNotIn(None, leituras)
+        self.assertEqual(arquivo_retorno.status, ArquivoRetorno.Status.CONCLUIDO)
+        self.assertEqual(arquivo_retorno.total_registros, 4)
+
+    @override_settings(IMPORTACAO_LOTE_PROCESSOS=2)
+    def test_upload_lote_zip_deduplica_e_processa_em_ordem(self):
+        original = self.fixture_bytes()
+        correcao = original.replace(b"23/05/2025", b"28/05/2025")
+        pacote = io.BytesIO()
+        with zipfile.ZipFile(pacote, "w") as zip_file:
+            # O nome não decide a ordem: a correção tem data de geração posterior.
+            zip_file.writestr("lote/a_correcao.txt", correcao)
+            zip_file.writestr("lote/b_retorno.txt", original)
+            zip_file.writestr("lote/copia.txt", original)
+            zip_file.writestr("lote/leia-me.txt", b"sem cabecalho ETIPI")
+            zip_file.writestr("__MACOSX/lote/._b_retorno.txt", b"x")
+
+        response = self.tes_client.post(
+            "/api/v1/importacao/arquivo-retorno/upload-lote/",
+            {
+                "arquivos": [
+                    SimpleUploadedFile(
+                        "retornos.zip", pacote.getvalue(), content_type="application/zip"
+                    )
+                ]
+            },
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, 201, response.json())
+        payload = response.json()
+        self.assertEqual(payload["status"], ArquivoRetorno.Status.CONCLUIDO)
+        self.assertEqual(
+            [arquivo["arquivo_nome"] for arquivo in payload["arquivos"]],
+            ["b_retorno.txt", "a_correcao.txt"],
+        )
+        self.assertEqual(
+            payload["duplicados"], [{"arquivo_nome": "copia.txt", "duplicado_de": "b_retorno.txt"}]
+        )
+        self.assertEqual([item["arquivo_nome"] for item in payload["rejeitados"]], ["leia-me.txt"])
+        self.assertEqual(payload["totais"]["total_registros"], 8)
+
+        arquivos = list(ArquivoRetorno.objects.order_by("lote_ordem"))
+        self.assertEqual([arquivo.lote_ordem for arquivo in arquivos], [1, 2])
+        self.assertEqual({str(arquivo.lote) for arquivo in arquivos}, {payload["lote"]})
+        self.assertLess(arquivos[0].processado_em, arquivos[1].processado_em)
+        service = ArquivoRetornoService()
+        for arquivo in arquivos:
+            self.assertTrue(default_storage.exists(service.artifacts.artifact_name(arquivo.sha256)))
+
+        resumo = self.tes_client.get(
+            f"/api/v1/importacao/arquivo-retorno/lotes/{payload['lote']}/"
+        )
+        self.assertEqual(resumo.status_code, 200)
+        self.assertEqual(resumo.json()["totais"], payload["totais"])
+        self.assertNotIn("duplicados", resumo.json())
+
+    def test_upload_lote_aceita_arquivo_sem_data_de_geracao(self):
+        original = self.fixture_bytes()
+        sem_data = original.replace("   Data da Geração: 23/05/2025".encode(), b"")
+        self.assertNotEqual(sem_data, original)
+        pacote = io.BytesIO()
+        with zipfile.ZipFile(pacote, "w") as zip_file:
+            zip_file.writestr("retorno.txt", original)
+            zip_file.writestr("sem_data.txt", sem_data)
+
+        response = self.tes_client.post(
+            "/api/v1/importacao/arquivo-retorno/upload-lote/",
+            {
+                "arquivos": [
+                    SimpleUploadedFile(
+                        "retornos.zip", pacote.getvalue(), content_type="application/zip"
+                    )
+                ]
+            },
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, 201, response.json())
+        payload = response.json()
+        self.assertEqual(
+            sorted(arquivo["arquivo_nome"] for arquivo in payload["arquivos"]),
+            ["retorno.txt", "sem_data.txt"],
+        )
+        self.assertEqual(payload["rejeitados"], [])
+
+    def test_recuperar_parados_despacha_de_novo_arquivos_sem_atualizacao(self):
+        parado = self.create_arquivo_retorno(nome="parado.txt")
+        interrompido = self.create_arquivo_retorno(nome="interrompido.txt")
+        interrompido.status = ArquivoRetorno.Status.PROCESSANDO
+        interrompido.etapa = ArquivoRetorno.Etapa.RECONCILIACAO
+        interrompido.checkpoint_linha = 1000
+        interrompido.save(update_fields=["status", "etapa", "checkpoint_linha", "updated_at"])
+        recente = self.create_arquivo_retorno(nome="recente.txt")
+        antigo = timezone.now() - timedelta(hours=1)
+        ArquivoRetorno.objects.filter(pk__in=[parado.pk, interrompido.pk]).update(
+            updated_at=antigo
+        )
+
+        with patch.object(
+            ArquivoRetornoService, "_dispatch_processamento", autospec=True
+        ) as dispatch:
+            recuperados = ArquivoRetornoService().recuperar_parados()
+
+        self.assertEqual(sorted(recuperados), sorted([parado.pk, interrompido.pk]))
+        self.assertEqual(
+            sorted(chamada.args[1] for chamada in dispatch.call_args_list),
+            sorted(recuperados),
+        )
+        interrompido.refresh_from_db()
+        self.assertEqual(interrompido.status, ArquivoRetorno.Status.PENDENTE)
+        self.assertEqual(interrompido.etapa, ArquivoRetorno.Etapa.RECONCILIACAO)
+        self.assertEqual(interrompido.checkpoint_linha, 1000)
+        self.assertEqual(recente.logs.count(), 0)
+        self.assertEqual(interrompido.logs.get().dados["status_anterior"], "processando")
+
+        # Com updated_at renovado, uma nova varredura não despacha de novo.
+        self.assertEqual(ArquivoRetornoService().recuperar_parados(), [])
+
+    def test_recuperar_parados_so_assume_execucao_sem_heartbeat(self):
+        service = ArquivoRetornoService()
+        with patch.object(ArquivoRetornoService, "_dispatch_processamento", autospec=True):
+            arquivo = service.upload(
+                SimpleUploadedFile(
+                    "retorno_etipi_052025.txt",
+                    self.fixture_bytes(),
+                    content_type="text/plain",
+                ),
+                self.tesoureiro,
+            )
+        service.chunk_size = 1
+        reconciliar_item = MotorReconciliacao._reconciliar_item
+        varreduras = []
+
+        def varrer_durante_a_execucao(motor, item):
+            if not varreduras:
+                # O heartbeat do trecho acabou de renovar updated_at: nada a assumir.
+                varreduras.append(ArquivoRetornoService().recuperar_parados())
+                # Sem heartbeat há uma hora a execução é dada como perdida.
+                ArquivoRetorno.objects.filter(pk=arquivo.pk).update(
+                    updated_at=timezone.now() - timedelta(hours=1)
+                )
+                varreduras.append(ArquivoRetornoService().recuperar_parados())
+            return reconciliar_item(motor, item)
+
+        with (
+            patch.object(
+                MotorReconciliacao,
+                "_reconciliar_item",
+                autospec=True,
+                side_effect=varrer_durante_a_execucao,
+            ) as reconciliar,
+            patch.object(
+                ArquivoRetornoService, "_dispatch_processamento", autospec=True
+            ) as dispatch,
+        ):
+            service.processar(arquivo.id)
+
+        self.assertEqual(varreduras, [[], [arquivo.pk]])
+        self.assertEqual([chamada.args[1] for chamada in dispatch.call_args_list], [arquivo.pk])
+        # A execução antiga para no heartbeat do trecho seguinte, sem marcar falha.
+        self.assertEqual(reconciliar.call_count, 1)
+        arquivo.refresh_from_db()
+        self.assertEqual(arquivo.status, ArquivoRetorno.Status.PENDENTE)
+        self.assertEqual(arquivo.etapa, ArquivoRetorno.Etapa.RECONCILIACAO)
+        self.assertFalse(arquivo.logs.filter(tipo=ImportacaoLog.Tipo.ERRO).exists())
+
+    def test_simular_preve_o_processamento_sem_gravar(self):
+        for cpf, nome in (
+            ("23993596315", "Maria de Jesus Santana Costa"),
+            ("21819424391", "Francisco Crisostomo Batista"),
+        ):
+            self.create_associado_com_contrato(cpf=cpf, nome=nome)
+
+        def retrato_banco():
+            return (
+                list(Parcela.objects.order_by("pk").values_list("pk", "status")),
+                list(Ciclo.objects.order_by("pk").values_list("pk", "status")),
+                ArquivoRetorno.objects.count(),
+                ImportacaoLog.objects.count(),
+                PagamentoMensalidade.objects.count(),
+            )
+
+        antes = retrato_banco()
+        response = self.tes_client.post(
+            "/api/v1/importacao/arquivo-retorno/simular/",
+            {
+                "arquivo": SimpleUploadedFile(
+                    "retorno_etipi_052025.txt",
+                    self.fixture_bytes(),
+                    content_type="text/plain",
+                )
+            },
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 200, response.json())
+        self.assertEqual(retrato_banco(), antes)
+        simulacao = response.json()
+
+        arquivo = ArquivoRetornoService().upload(
+            SimpleUploadedFile(
+                "retorno_etipi_052025.txt",
+                self.fixture_bytes(),
+                content_type="text/plain",
+            ),
+            self.tesoureiro,
+        )
+        arquivo.refresh_from_db()
+        self.assertEqual(simulacao["total_registros"], arquivo.total_registros)
+        self.assertEqual(simulacao["erros"], arquivo.erros)
+        for chave, valor in simulacao["resumo"].items():
+            self.assertEqual(arquivo.resultado_resumo[chave], valor, chave)
+        campos = ("linha_numero", "resultado_processamento", "gerou_encerramento", "gerou_novo_ciclo")
+        self.assertEqual(
+            [tuple(item[campo] for campo in campos) for item in simulacao["itens"]],
+            list(arquivo.itens.order_by("linha_numero").values_list(*campos)),
+        )
+
     def test_processar_registra_warning_de_parse_e_continua(self):
         self.create_associado_com_contrato(
             cpf="12345678901",
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import json
+import tempfile
+from collections import Counter
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+
+from apps.associados.models import Associado
+
+from .base import ImportacaoBaseTestCase
+from ..parsers import ETIPITxtRetornoParser
+from ..sintetico import GeradorRetornoETIPI, cpf_sintetico
+from ..validators import ArquivoRetornoValidator
+
+
+class RetornoSinteticoTestCase(ImportacaoBaseTestCase):
+    def test_gerador_produz_layout_lido_pelo_parser(self):
+        gerador = GeradorRetornoETIPI(1200, linhas_por_pagina=50)
+        with tempfile.TemporaryDirectory() as diretorio:
+            caminho = Path(diretorio) / "retorno.txt"
+            self.assertEqual(gerador.salvar(caminho), 1200)
+            conteudo = caminho.read_bytes()
+            parsed = ETIPITxtRetornoParser().parse(str(caminho))
+
+        self.assertIn(b"\x0c", conteudo)
+        self.assertIn("Legenda do Status".encode("latin-1"), conteudo)
+        self.assertEqual(parsed.meta.competencia, "05/2025")
+        self.assertEqual(parsed.encoding, "latin-1")
+        self.assertEqual(parsed.warnings, [])
+        self.assertEqual(len(parsed.items), 1200)
+        self.assertEqual(set(Counter(item["status_codigo"] for item in parsed.items)), set("123456S"))
+        esperadas = list(gerador.linhas())
+        for item, linha in zip(parsed.items, esperadas):
+            ArquivoRetornoValidator.validar_item(item)
+            self.assertEqual(item["cpf_cnpj"], linha.cpf)
+            self.assertEqual(item["valor_descontado"], linha.valor)
+            self.assertTrue(item["orgao_pagto_nome"])
+
+    def test_cpf_sintetico_tem_digitos_verificadores(self):
+        # 100000000-19 é o primeiro da sequência (índice 0).
+        self.assertEqual(cpf_sintetico(0), "10000000019")
+        self.assertEqual(len({cpf_sintetico(indice) for indice in range(5000)}), 5000)
+
+    def test_benchmark_mede_etapas_e_desfaz_os_dados(self):
+        saida = StringIO()
+        call_command("benchmark_importacao", "--itens", "300", stdout=saida)
+
+        resultado = json.loads(saida.getvalue())
+        self.assertEqual(resultado["itens"], 300)
+        self.assertEqual(
+            set(resultado["etapas"]),
+            {
+                "gerar_arquivo",
+                "seed",
+                "parse",
+                "persistir_itens",
+                "matching",
+                "reconciliacao",
+                "pagamentos",
+            },
+        )
+        self.assertGreater(resultado["resumo"]["baixa_efetuada"], 0)
+        self.assertGreater(resultado["resumo"]["nao_encontrado"], 0)
+        self.assertFalse(Associado.objects.exists())
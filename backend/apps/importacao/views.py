@@ -1,12 +1,18 @@
 from __future__ import annotations
 
 from datetime import datetime
+from uuid import UUID
 
-from drf_spectacular.utils import OpenApiParameter, extend_schema
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema
 from rest_framework import mixins, permissions
 from rest_framework.decorators import action
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.throttling import UserRateThrottle
 from rest_framework.viewsets import GenericViewSet
@@ -19,9 +25,16 @@ from .serializers import (
     ArquivoRetornoDetailSerializer,
     ArquivoRetornoItemSerializer,
     ArquivoRetornoListSerializer,
+    ArquivoRetornoLoteSerializer,
+    ArquivoRetornoProgressoSerializer,
+    ArquivoRetornoReprocessarSerializer,
+    ArquivoRetornoSimulacaoSerializer,
+    ArquivoRetornoSimularSerializer,
+    ArquivoRetornoUploadLoteSerializer,
     ArquivoRetornoUploadSerializer,
 )
 from .services import ArquivoRetornoService
+from .sse import EventStreamRenderer, eventos_progresso
 
 
 class UploadArquivoRetornoRateThrottle(UserRateThrottle):
@@ -32,6 +45,12 @@ class ReprocessarArquivoRetornoRateThrottle(UserRateThrottle):
     rate = "30/hour"
 
 
+class SimularArquivoRetornoRateThrottle(UserRateThrottle):
+    # Escopo próprio: prévias não consomem a cota de upload.
+    scope = "importacao_simular"
+    rate = "30/hour"
+
+
 def parse_competencia_query(value: str | None):
     if not value:
         return None
@@ -93,13 +112,18 @@ class ArquivoRetornoViewSet(
             return ArquivoRetornoItemSerializer
         if self.action == "upload":
             return ArquivoRetornoUploadSerializer
+        if self.action == "upload_lote":
+            return ArquivoRetornoUploadLoteSerializer
         if self.action == "retrieve":
             return ArquivoRetornoDetailSerializer
         return ArquivoRetornoListSerializer
 
     def get_throttles(self):
-        if self.action == "upload":
+        # Um lote conta como um envio, seja quantos arquivos tiver.
+        if self.action in {"upload", "upload_lote"}:
             return [UploadArquivoRetornoRateThrottle()]
+        if self.action == "simular":
+            return [SimularArquivoRetornoRateThrottle()]
         if self.action == "reprocessar":
             return [ReprocessarArquivoRetornoRateThrottle()]
         return super().get_throttles()
@@ -135,8 +159,63 @@ class ArquivoRetornoViewSet(
         arquivo_retorno = ArquivoRetornoService().upload(
             serializer.validated_data["arquivo"],
             request.user,
+            force=serializer.validated_data["force"],
+        )
+        return Response(
+            ArquivoRetornoDetailSerializer(arquivo_retorno).data,
+            status=200 if arquivo_retorno.reaproveitado else 201,
+        )
+
+    @extend_schema(
+        request=ArquivoRetornoUploadLoteSerializer,
+        responses=ArquivoRetornoLoteSerializer,
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="upload-lote",
+        parser_classes=[MultiPartParser],
+    )
+    def upload_lote(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        resumo = ArquivoRetornoService().upload_lote(
+            serializer.validated_data["arquivos"],
+            request.user,
+            force=serializer.validated_data["force"],
+        )
+        reaproveitados = all(arquivo.reaproveitado for arquivo in resumo["arquivos"])
+        return Response(
+            ArquivoRetornoLoteSerializer(resumo).data,
+            status=200 if reaproveitados else 201,
         )
-        return Response(ArquivoRetornoDetailSerializer(arquivo_retorno).data, status=201)
+
+    @extend_schema(responses=ArquivoRetornoLoteSerializer)
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path=r"lotes/(?P<lote>[0-9a-fA-F-]{32,36})",
+    )
+    def lote(self, request, lote=None):
+        try:
+            lote = UUID(lote)
+        except ValueError as exc:
+            raise ValidationError("Lote inválido.") from exc
+        resumo = ArquivoRetornoService().resumo_lote(lote)
+        if resumo is None:
+            return Response(status=404)
+        return Response(ArquivoRetornoLoteSerializer(resumo).data)
+
+    @extend_schema(
+        request=ArquivoRetornoSimularSerializer,
+        responses=ArquivoRetornoSimulacaoSerializer,
+    )
+    @action(detail=False, methods=["post"], parser_classes=[MultiPartParser])
+    def simular(self, request):
+        serializer = ArquivoRetornoSimularSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        simulacao = ArquivoRetornoService().simular(serializer.validated_data["arquivo"])
+        return Response(ArquivoRetornoSimulacaoSerializer(simulacao).data)
 
     @extend_schema(responses=ArquivoRetornoDetailSerializer)
     @action(detail=False, methods=["get"])
@@ -146,12 +225,60 @@ class ArquivoRetornoViewSet(
             return Response(status=404)
         return Response(ArquivoRetornoDetailSerializer(arquivo).data)
 
-    @extend_schema(responses=ArquivoRetornoDetailSerializer)
+    @extend_schema(
+        request=ArquivoRetornoReprocessarSerializer,
+        responses=ArquivoRetornoDetailSerializer,
+    )
     @action(detail=True, methods=["post"])
     def reprocessar(self, request, pk=None):
-        arquivo = ArquivoRetornoService().reprocessar(int(pk))
+        serializer = ArquivoRetornoReprocessarSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        arquivo = ArquivoRetornoService().reprocessar(
+            int(pk), incremental=serializer.validated_data["incremental"]
+        )
         return Response(ArquivoRetornoDetailSerializer(arquivo).data)
 
+    @extend_schema(responses=ArquivoRetornoProgressoSerializer)
+    @action(detail=True, methods=["get"])
+    def progresso(self, request, pk=None):
+        return Response(ArquivoRetornoProgressoSerializer(self._get_progresso(pk)).data)
+
+    @extend_schema(
+        responses={
+            (200, "text/event-stream"): OpenApiResponse(
+                response=OpenApiTypes.STR,
+                description=(
+                    "Eventos 'progresso' com o payload do endpoint progresso e um "
+                    "evento 'fim' quando o arquivo conclui ou falha."
+                ),
+            )
+        }
+    )
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path="progresso/stream",
+        renderer_classes=[EventStreamRenderer, JSONRenderer],
+    )
+    def progresso_stream(self, request, pk=None):
+        # Cada cliente prende um worker síncrono enquanto o stream está aberto;
+        # o caminho suportado é o polling de progresso, o SSE é opt-in.
+        if not settings.IMPORTACAO_PROGRESSO_SSE:
+            raise NotFound("Stream de progresso desabilitado; consulte o endpoint progresso.")
+        arquivo = self._get_progresso(pk)
+        response = StreamingHttpResponse(
+            eventos_progresso(arquivo.pk), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    def _get_progresso(self, pk: str) -> ArquivoRetorno:
+        return get_object_or_404(
+            ArquivoRetorno.objects.only(*ArquivoRetornoProgressoSerializer.CAMPOS_MODELO),
+            pk=pk,
+        )
+
     @extend_schema(responses=ArquivoRetornoItemSerializer(many=True))
     @action(detail=True, methods=["get"])
     def descontados(self, request, pk=None):
@@ -169,3 +169,53 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    "importacao-recuperar-processamentos": {
+        "task": "apps.importacao.tasks.recuperar_processamentos_retorno",
+        "schedule": 10 * 60,
+    },
+    "importacao-limpar-artefatos-parse": {
+        "task": "apps.importacao.tasks.limpar_artefatos_parse",
+        "schedule": 24 * 60 * 60,
+    },
+}
+
+# Importação de arquivo retorno
+# O upload é gravado em chunks; a memória da request não cresce com o limite.
+IMPORTACAO_UPLOAD_LIMITE_MB = config("IMPORTACAO_UPLOAD_LIMITE_MB", default=20, cast=int)
+IMPORTACAO_LOG_FLUSH_SIZE = config("IMPORTACAO_LOG_FLUSH_SIZE", default=500, cast=int)
+IMPORTACAO_LOG_LIMITE_POR_MENSAGEM = config(
+    "IMPORTACAO_LOG_LIMITE_POR_MENSAGEM", default=200, cast=int
+)
+# Motor de reconciliação em lote (MotorReconciliacaoEmLote); desligado até a
+# paridade com o caminho item a item ser confirmada em produção.
+IMPORTACAO_RECONCILIACAO_EM_LOTE = config(
+    "IMPORTACAO_RECONCILIACAO_EM_LOTE", default=False, cast=bool
+)
+# Acima de 1, a reconciliação é repartida por associado em tasks paralelas.
+IMPORTACAO_RECONCILIACAO_PARTICOES = config(
+    "IMPORTACAO_RECONCILIACAO_PARTICOES", default=0, cast=int
+)
+# Com o broker fora, o upload enfileira o processamento em uma thread local
+# (limitada a IMPORTACAO_FILA_LOCAL_TAMANHO arquivos) em vez de processar na request.
+IMPORTACAO_FILA_LOCAL = config("IMPORTACAO_FILA_LOCAL", default=True, cast=bool)
+IMPORTACAO_FILA_LOCAL_TAMANHO = config("IMPORTACAO_FILA_LOCAL_TAMANHO", default=8, cast=int)
+# Arquivos PENDENTE/PROCESSANDO sem atualização há mais que isso são despachados de
+# novo (job perdido num restart); a varredura roda ao subir um worker e no beat.
+IMPORTACAO_RECUPERAR_APOS_MINUTOS = config(
+    "IMPORTACAO_RECUPERAR_APOS_MINUTOS", default=30, cast=int
+)
+# O stream SSE de progresso prende um worker WSGI por cliente; fica desligado e o
+# polling do endpoint progresso é o caminho suportado. Ligado, cada stream dura no
+# máximo IMPORTACAO_PROGRESSO_SSE_DURACAO_MAXIMA segundos e o navegador reconecta.
+IMPORTACAO_PROGRESSO_SSE = config("IMPORTACAO_PROGRESSO_SSE", default=False, cast=bool)
+IMPORTACAO_PROGRESSO_SSE_INTERVALO = config(
+    "IMPORTACAO_PROGRESSO_SSE_INTERVALO", default=1.0, cast=float
+)
+IMPORTACAO_PROGRESSO_SSE_DURACAO_MAXIMA = config(
+    "IMPORTACAO_PROGRESSO_SSE_DURACAO_MAXIMA", default=25, cast=int
+)
+# Upload em lote (ZIP ou vários arquivos): limite de arquivos por envio e processos
+# usados para o parse paralelo antes da reconciliação em ordem.
+IMPORTACAO_LOTE_MAX_ARQUIVOS = config("IMPORTACAO_LOTE_MAX_ARQUIVOS", default=20, cast=int)
+IMPORTACAO_LOTE_PROCESSOS = config("IMPORTACAO_LOTE_PROCESSOS", default=4, cast=int)
@@ -16,6 +16,8 @@ if (
     INSTALLED_APPS.remove("rest_framework_simplejwt.token_blacklist")
 SIMPLE_JWT["ROTATE_REFRESH_TOKENS"] = JWT_ENABLE_TOKEN_BLACKLIST
 SIMPLE_JWT["BLACKLIST_AFTER_ROTATION"] = JWT_ENABLE_TOKEN_BLACKLIST
+# Sem broker nos testes: o fallback processa na hora, dentro da transação do teste.
+IMPORTACAO_FILA_LOCAL = False
 
 DATABASES["default"]["USER"] = config("TEST_DATABASE_USER", default="root")
 DATABASES["default"]["PASSWORD"] = config(
@@ -0,0 +1,24 @@
+import re
+import unicodedata
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+
+def fold_text(value: str) -> str:
+    normalized = unicodedata.normalize("NFKD", value or "")
+    return "".join(char for char in normalized if not unicodedata.combining(char)).lower()
+
+
+def fold_tokens(value: str) -> list[str]:
+    """Tokens alfanuméricos do texto já dobrado (sem acento, minúsculo)."""
+    return _TOKEN_RE.findall(fold_text(value))
+
+
+def fold_words(value: str) -> str:
+    """Tokens dobrados, cada um precedido de espaço: a forma da busca por nome.
+
+    ``fold_words(busca) in fold_words(nome)`` vale quando os tokens da busca
+    aparecem seguidos no nome, inteiros, exceto o último, que pode ser só o
+    começo de uma palavra.
+    """
+    return "".join(f" {token}" for token in fold_tokens(value))